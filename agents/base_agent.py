@@ -1,13 +1,31 @@
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+from concurrent.futures import CancelledError, FIRST_COMPLETED, TimeoutError as FutureTimeoutError, wait
+import asyncio
 import time
 import random
 
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage
 from langchain_core.prompts import ChatPromptTemplate
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 from utils.config import Config
+from utils.llm_cache import ResponseCache, get_response_cache
+from utils.semantic_cache import get_semantic_cache
+from utils.rate_limiter import RateLimiter, get_rate_limiter, is_rate_limit_error, retry_after_from_error
+from utils.tokens import estimate_tokens, estimate_message_tokens
+from utils.tracing import get_tracer
+from utils.key_pool import KeyLease
+from utils.dag import run_in_thread
+from utils.resilience import CircuitOpenError, Deadline, DeadlineExceededError, FallbackResponse, get_circuit_breaker, get_hedge_stats
+from utils.single_flight import get_single_flight
+from utils.patient_encoding import PatientEncoding
+from utils.triage_rules import TriageDecision
+from utils.priority import current_priority
+from utils.streaming import StreamSink, TokenStream, active_sinks, streaming_to
+
+from .memory import ConversationMemory, current_session
+from .batching import get_classification_batcher
 
 class BaseAgent(BaseModel):
     """Base agent class for the Agentic Doctor system."""
@@ -16,7 +34,13 @@ class BaseAgent(BaseModel):
     role: str = Field(..., description="Role of the agent in the system")
     llm: BaseChatModel = Field(..., description="Language model for the agent")
     system_prompt: str = Field(..., description="System prompt for the agent")
-    memory: List[Dict[str, Any]] = Field(default_factory=list, description="Memory of the agent's conversations")
+    memory: ConversationMemory = Field(default_factory=ConversationMemory, description="Memory of the agent's conversations outside a patient session")
+    cache_responses: bool = Field(default=False, description="Serve repeated prompts from the shared response cache")
+    semantic_cache_thresholds: Dict[str, float] = Field(default_factory=dict, description="Similarity threshold per method for serving near-duplicate prompts from the semantic cache")
+    call_deadlines: Dict[str, float] = Field(default_factory=dict, description="Deadline in seconds per method for a call including its retries and waits")
+    hedged_methods: List[str] = Field(default_factory=list, description="Latency-critical methods that race a duplicate request on a second key when the first is slow")
+    
+    model_config = ConfigDict(arbitrary_types_allowed=True)
     
     def __init__(self, **data):
         super().__init__(**data)
@@ -33,13 +57,29 @@ class BaseAgent(BaseModel):
             ("human", "{input}")
         ])
     
-    def process_input(self, input_text: str, context: Optional[Dict[str, Any]] = None) -> str:
-        """Process input and generate a response with rate limiting and error handling."""
+    @property
+    def active_memory(self) -> ConversationMemory:
+        """Get the memory in use: the current patient session's, or the agent's own outside a session."""
+        session = current_session()
+        if session is not None:
+            return session.memory_for(self.name)
+        return self.memory
+    
+    def _build_messages(self, input_text: str, use_memory: bool = True) -> List[BaseMessage]:
+        """Build the message list for an LLM call from the system prompt, memory and input."""
         messages = [SystemMessage(content=self.system_prompt)]
+        if not use_memory:
+            messages.append(HumanMessage(content=input_text))
+            return messages
+        memory = self.active_memory
+        
+        # Carry over the gist of turns that no longer fit the memory window
+        if memory.summary:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation: {memory.summary}"))
         
         # Add memory context if available
-        if self.memory:
-            for message in self.memory:
+        if memory:
+            for message in memory:
                 if message["role"] == "human":
                     messages.append(HumanMessage(content=message["content"]))
                 elif message["role"] == "ai":
@@ -47,42 +87,645 @@ class BaseAgent(BaseModel):
         
         # Add current input
         messages.append(HumanMessage(content=input_text))
+        return messages
+    
+    def _record(self, *messages: Dict[str, Any]):
+        """Record messages in the memory in use (see active_memory)."""
+        session = current_session()
+        if session is not None:
+            session.record(self.name, *messages)
+            return
+        for message in messages:
+            self.memory.append(message)
+    
+    def _remember(self, input_text: str, response_text: str):
+        """Record an exchange in the agent's memory."""
+        self._record({"role": "human", "content": input_text}, {"role": "ai", "content": response_text})
+    
+    def _fallback_response(self, input_text: str, error: Exception, attempts: int, use_memory: bool = True,
+                           stream: Optional[TokenStream] = None) -> str:
+        """Build, log and remember the fallback response used once all retries are exhausted
+        (or when no attempt could be made at all)."""
+        error_msg = f"Error after {attempts} attempts: {str(error)}" if attempts else f"Call not attempted: {str(error)}"
+        print(f"[{self.name}] {error_msg}")
         
-        # Add rate limiting with exponential backoff
-        max_retries = 5
-        base_delay = 1  # Base delay in seconds
+        fallback_response = FallbackResponse(f"I apologize, but I'm currently experiencing technical difficulties. {error_msg}",
+                                             str(error))
+        if use_memory:
+            self._remember(input_text, fallback_response)
+        if stream is not None:
+            stream.write(fallback_response)
+            stream.finish(fallback_response)
+        return fallback_response
+    
+    def _cache_key(self, messages: List[BaseMessage], use_cache: bool) -> Optional[str]:
+        """Get the response cache key for a call, or None if the call should not be cached."""
+        if not (self.cache_responses and use_cache and Config.is_cache_enabled()):
+            return None
+        return ResponseCache.make_key(self._model_name(), messages)
+    
+    def _model_name(self) -> str:
+        """Get the name of the model behind this agent."""
+        return getattr(self.llm, "model_name", None) or self.llm._llm_type
+    
+    def _semantic_namespace(self, method: Optional[str], use_memory: bool, use_cache: bool) -> Optional[str]:
+        """Get the semantic cache namespace for a call, or None if it should not use the semantic cache.
+        
+        Only stateless calls qualify, since the prompt text alone must determine the answer.
+        """
+        if not method or use_memory or not use_cache or self._semantic_threshold(method) is None:
+            return None
+        if not Config.is_semantic_cache_enabled():
+            return None
+        return f"{self._model_name()}:{self.name}:{method}"
+    
+    def _semantic_threshold(self, method: str) -> Optional[float]:
+        """Get the similarity threshold for a method; environment overrides win over agent defaults."""
+        return Config.get_semantic_cache_thresholds().get(method, self.semantic_cache_thresholds.get(method))
+    
+    def _cached_response(self, input_text: str, cache_key: Optional[str], semantic_namespace: Optional[str],
+                         method: Optional[str]) -> Optional[str]:
+        """Look a call up in the exact and then the semantic cache, unless caching is bypassed."""
+        if Config.is_cache_bypassed():
+            return None
+        if cache_key is not None:
+            cached = get_response_cache().get(cache_key)
+            if cached is not None:
+                return cached
+        if semantic_namespace is not None:
+            return get_semantic_cache().lookup(semantic_namespace, input_text, self._semantic_threshold(method))
+        return None
+    
+    def _complete(self, input_text: str, response_text: str, use_memory: bool, cache_key: Optional[str] = None,
+                  semantic_namespace: Optional[str] = None, stream: Optional[TokenStream] = None) -> str:
+        """Record a successful response in memory and the caches and return it."""
+        if stream is not None:
+            stream.finish(response_text)
+        if cache_key is not None:
+            get_response_cache().set(cache_key, response_text)
+        if semantic_namespace is not None:
+            get_semantic_cache().add(semantic_namespace, input_text, response_text)
+        if use_memory:
+            self._remember(input_text, response_text)
+        return response_text
+    
+    def _flight_key(self, messages: List[BaseMessage]) -> Optional[str]:
+        """Get the key under which identical concurrent calls are coalesced, or None if coalescing is off."""
+        if not Config.is_coalescing_enabled():
+            return None
+        return ResponseCache.make_key(self._model_name(), messages)
+    
+    def _open_stream(self, method: Optional[str]) -> Optional[TokenStream]:
+        """Start streaming a response to the active sinks, or return None if there are none."""
+        sinks = active_sinks()
+        if not sinks:
+            return None
+        return TokenStream(self.name, method or "process_input", sinks)
+    
+    @staticmethod
+    def _replay(stream: Optional[TokenStream], text: str):
+        """Send a response that was not generated token by token (cached or fallback) to the sinks at once."""
+        if stream is not None:
+            stream.write(text)
+    
+    @staticmethod
+    def _call_model(llm: Any, messages: List[BaseMessage], stream: Optional[TokenStream], timeout: Optional[float] = None) -> Any:
+        """Call the model, forwarding tokens to `stream` as they arrive when streaming.
+        
+        `timeout` is passed on as the provider's request timeout.
+        """
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        if stream is None:
+            return llm.invoke(messages, **kwargs)
+        response = None
+        for chunk in llm.stream(messages, **kwargs):
+            stream.write(str(chunk.content))
+            response = chunk if response is None else response + chunk
+        return response
+    
+    @staticmethod
+    async def _acall_model(llm: Any, messages: List[BaseMessage], stream: Optional[TokenStream],
+                           timeout: Optional[float] = None) -> Any:
+        """Async twin of _call_model."""
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        if stream is None:
+            return await llm.ainvoke(messages, **kwargs)
+        response = None
+        async for chunk in llm.astream(messages, **kwargs):
+            stream.write(str(chunk.content))
+            response = chunk if response is None else response + chunk
+        return response
+    
+    def _lease(self, tokens: int, priority: Optional[int] = None, exclude: Sequence[KeyLease] = ()) -> KeyLease:
+        """Get the model client, rate limiter and circuit breaker for one attempt.
+        
+        Pooled models lease the healthiest key with the most headroom for every attempt,
+        so a retry can move away from a throttled key (and a hedged request away from
+        the keys of `exclude`); other models use their own key.
+        """
+        if hasattr(self.llm, "lease"):
+            return self.llm.lease(tokens, priority, [lease.key for lease in exclude])
+        return KeyLease(self.llm, self._rate_limiter(), breaker=get_circuit_breaker(self._api_key()))
+    
+    def _api_key(self) -> Optional[str]:
+        """Get the API key behind this agent's LLM, if it has one."""
+        api_key = getattr(self.llm, "groq_api_key", None)
+        if api_key is not None and hasattr(api_key, "get_secret_value"):
+            api_key = api_key.get_secret_value()
+        return api_key
+    
+    def _rate_limiter(self) -> RateLimiter:
+        """Get the shared rate limiter for the API key behind this agent's LLM."""
+        return get_rate_limiter(self._api_key())
+    
+    def _deadline(self, method: Optional[str]) -> Deadline:
+        """Start the deadline of a call; environment overrides win over agent defaults."""
+        seconds = Config.get_llm_method_deadlines().get(method, self.call_deadlines.get(method))
+        return Deadline(seconds if seconds is not None else Config.get_llm_deadline_seconds())
+    
+    def _is_hedged(self, method: Optional[str], stream: Optional[TokenStream]) -> bool:
+        """Check if a call races a duplicate request when slow; streamed calls are never hedged."""
+        return Config.is_hedging_enabled() and method in self.hedged_methods and stream is None
+    
+    @staticmethod
+    def _blocked(lease: KeyLease, tokens: int, priority: Optional[int], deadline: Deadline) -> Optional[Exception]:
+        """Get the reason an attempt must not be made: its rate-limit wait would overrun the deadline,
+        or the key's circuit is open. None if the attempt may go ahead."""
+        wait_seconds = lease.limiter.estimated_wait(tokens, priority)
+        if not deadline.allows(wait_seconds):
+            return DeadlineExceededError(f"Waiting {wait_seconds:.1f}s for key {lease.limiter.label} would leave less "
+                                         f"than {deadline.min_call_seconds:g}s of the {deadline.seconds:g}s deadline for the call")
+        if not lease.allow():
+            return lease.breaker.error()
+        return None
+    
+    def _open_lease(self, tokens: int, priority: Optional[int], deadline: Deadline) -> Tuple[KeyLease, Optional[Exception]]:
+        """Lease a key for an attempt, moving on to the next pooled key while the leased key's circuit is open.
         
-        for attempt in range(max_retries):
+        Returns the lease and the reason the attempt must not be made (see _blocked), which is
+        only a CircuitOpenError once every key has been tried.
+        """
+        tried: List[KeyLease] = []
+        while True:
+            lease = self._lease(tokens, priority, exclude=tried)
+            blocked = self._blocked(lease, tokens, priority, deadline)
+            if (not isinstance(blocked, CircuitOpenError) or lease.key is None
+                    or any(lease.key is other.key for other in tried)):
+                for other in tried:
+                    other.abort()
+                return lease, blocked
+            tried.append(lease)
+    
+    @staticmethod
+    def _check_call_budget(lease: KeyLease, tokens: int, deadline: Deadline):
+        """Make sure the attempt still has its minimum call time after waiting for budget.
+        
+        The actual wait can run past the estimate; if it did, the reserved tokens are given
+        back and DeadlineExceededError is raised instead of sending a call that cannot finish.
+        """
+        if not deadline.allows(0.0):
+            lease.limiter.record_usage(tokens, 0)
+            raise DeadlineExceededError(f"Only {deadline.remaining():.1f}s of the {deadline.seconds:g}s deadline left "
+                                        f"after waiting for key {lease.limiter.label}")
+    
+    def _acquire(self, lease: KeyLease, tokens: int, priority: Optional[int], deadline: Deadline) -> float:
+        """Wait for the key's rate-limit budget, leaving the attempt its minimum call time.
+        
+        Returns the seconds waited; raises DeadlineExceededError if the deadline does not allow it.
+        """
+        try:
+            waited = lease.limiter.acquire(tokens, priority, deadline.wait_budget())
+        except TimeoutError as e:
+            raise DeadlineExceededError(f"{e} within the {deadline.seconds:g}s deadline") from e
+        self._check_call_budget(lease, tokens, deadline)
+        return waited
+    
+    async def _aacquire(self, lease: KeyLease, tokens: int, priority: Optional[int], deadline: Deadline) -> float:
+        """Async twin of _acquire."""
+        try:
+            waited = await lease.limiter.aacquire(tokens, priority, deadline.wait_budget())
+        except TimeoutError as e:
+            raise DeadlineExceededError(f"{e} within the {deadline.seconds:g}s deadline") from e
+        self._check_call_budget(lease, tokens, deadline)
+        return waited
+    
+    def _hedge_lease(self, lease: KeyLease, tokens: int, priority: Optional[int], deadline: Deadline) -> Optional[KeyLease]:
+        """Lease a second key for a hedged request, or None if no key can take it right away
+        or the deadline leaves the duplicate too little time."""
+        if not deadline.allows(0.0):
+            return None
+        hedge = self._lease(tokens, priority, exclude=[lease])
+        if hedge.limiter.estimated_wait(tokens, priority) > 0 or not hedge.allow():
+            hedge.abort()
+            return None
+        return hedge
+    
+    @staticmethod
+    def _reserved_tokens(messages: List[BaseMessage]) -> int:
+        """Estimate the tokens to reserve for a call: the prompt plus the expected completion."""
+        return estimate_message_tokens(messages) + Config.get_completion_token_estimate()
+    
+    @staticmethod
+    def _used_tokens(response: Any) -> Optional[int]:
+        """Get the total tokens reported for a response, if the model reports usage."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            return usage.get("total_tokens")
+        return None
+    
+    def _retry_delay(self, error: Exception, attempt: int, limiter: RateLimiter, deadline: Deadline) -> Optional[float]:
+        """Decide how long to wait before retrying a failed call, or return None if the deadline leaves no time.
+        
+        429s block the key in the shared limiter for the server's Retry-After, so the
+        next acquire waits exactly as long as needed and no extra sleep is added here.
+        Other errors fall back to exponential backoff with jitter.
+        """
+        if is_rate_limit_error(error):
+            retry_after = retry_after_from_error(error)
+            limiter.record_rate_limited(retry_after)
+            print(f"[{self.name}] Rate limited on key {limiter.label}. Retrying after {retry_after or 0:.2f} seconds...")
+            return 0.0
+        
+        delay = (2 ** attempt) + random.uniform(0, 1)
+        if not deadline.allows(delay):
+            print(f"[{self.name}] API call failed: {str(error)}. No time left to retry within the "
+                  f"{deadline.seconds:g}s deadline")
+            return None
+        print(f"[{self.name}] API call failed: {str(error)}. Retrying in {delay:.2f} seconds...")
+        return delay
+    
+    @staticmethod
+    def _token_counts(messages: List[BaseMessage], response: Any) -> Dict[str, int]:
+        """Get prompt and completion token counts, as reported by the model or else estimated."""
+        usage = getattr(response, "usage_metadata", None) or {}
+        return {
+            "prompt_tokens": usage.get("input_tokens") or estimate_message_tokens(messages),
+            "completion_tokens": usage.get("output_tokens") or estimate_tokens(str(response.content))
+        }
+    
+    def process_input(self, input_text: str, context: Optional[Dict[str, Any]] = None,
+                      use_memory: bool = True, use_cache: bool = True, method: Optional[str] = None) -> str:
+        """Process input and generate a response with rate limiting and error handling.
+        
+        Args:
+            input_text: Prompt for the agent
+            context: Optional additional context (unused by the base agent)
+            use_memory: Whether to replay and record the conversation memory; stateless
+                        prompts are fully determined by their text and cache well
+            use_cache: Set to False to skip the response caches for this call
+            method: Name of the calling agent method, used to pick its semantic cache threshold
+        """
+        with get_tracer().span(f"llm:{self.name}", kind="llm", agent=self.name, method=method or "process_input") as span:
+            messages = self._build_messages(input_text, use_memory)
+            cache_key = self._cache_key(messages, use_cache)
+            semantic_namespace = self._semantic_namespace(method, use_memory, use_cache)
+            cached = self._cached_response(input_text, cache_key, semantic_namespace, method)
+            stream = self._open_stream(method)
+            if cached is not None:
+                span.set(source="cache")
+                self._replay(stream, cached)
+                return self._complete(input_text, cached, use_memory, stream=stream)
+            
+            # Identical calls already in flight share one upstream request
+            flight_key = self._flight_key(messages)
+            flights = get_single_flight()
+            while flight_key is not None:
+                flight, leader = flights.join(flight_key)
+                if leader:
+                    break
+                try:
+                    response_text = flight.result()
+                except CancelledError:
+                    # The leader gave up without a response; lead a new flight or follow one
+                    continue
+                span.set(source="coalesced")
+                self._replay(stream, response_text)
+                return self._complete(input_text, response_text, use_memory, stream=stream)
+            
             try:
-                # Add a small random delay before API call to avoid simultaneous requests
-                time.sleep(random.uniform(0.1, 0.5))
-                
-                # Generate response
-                response = self.llm.invoke(messages)
-                
-                # Update memory
-                self.memory.append({"role": "human", "content": input_text})
-                self.memory.append({"role": "ai", "content": response.content})
-                
-                return response.content
+                response_text = self._generate(input_text, messages, use_memory, cache_key, semantic_namespace, stream, span,
+                                               method)
+            except BaseException:
+                if flight_key is not None:
+                    flights.abandon(flight_key, flight)
+                raise
+            if flight_key is not None:
+                flights.settle(flight_key, flight, response_text)
+            return response_text
+    
+    def _generate(self, input_text: str, messages: List[BaseMessage], use_memory: bool, cache_key: Optional[str],
+                  semantic_namespace: Optional[str], stream: Optional[TokenStream], span: Any,
+                  method: Optional[str] = None) -> str:
+        """Call the model with rate limiting and retries within the method's deadline, and record the
+        response (or the fallback)."""
+        reserved_tokens = self._reserved_tokens(messages)
+        # Calls draw on the rate-limit budget of the patient's priority class
+        priority = current_priority()
+        deadline = self._deadline(method)
+        hedged = self._is_hedged(method, stream)
+        max_retries = 5
+        waited = backoff = 0.0
+        rate_limited = 0
+        attempt = 0
+        span.set(deadline_seconds=deadline.seconds)
+        
+        try:
+            for attempt in range(max_retries):
+                # Fail fast rather than wait past the deadline or call a backend that keeps failing
+                # (on any key of the pool)
+                lease, blocked = self._open_lease(reserved_tokens, priority, deadline)
+                limiter = lease.limiter
+                span.set(api_key=limiter.label)
+                if blocked is not None:
+                    lease.abort()
+                    span.set(source="fallback", error=str(blocked))
+                    return self._fallback_response(input_text, blocked, attempt, use_memory, stream)
+                # Wait only if this key's request or token budget is exhausted, and only as long as
+                # the deadline still leaves time for the call itself
+                try:
+                    waited += self._acquire(lease, reserved_tokens, priority, deadline)
+                except DeadlineExceededError as e:
+                    lease.abort()
+                    span.set(source="fallback", error=str(e))
+                    return self._fallback_response(input_text, e, attempt, use_memory, stream)
+                try:
+                    # Generate response, streaming it to the active sinks if there are any
+                    if hedged:
+                        response = self._call_hedged(lease, messages, reserved_tokens, priority, deadline, span)
+                    else:
+                        response = self._call_leased(lease, messages, stream, reserved_tokens, deadline)
+                    span.set(source="llm", **self._token_counts(messages, response))
+                    if stream is not None:
+                        span.set(first_token_seconds=round(stream.first_token_seconds or 0.0, 3))
+                    
+                    # Update memory and cache
+                    return self._complete(input_text, response.content, use_memory, cache_key, semantic_namespace, stream)
                 
-            except Exception as e:
-                # Check if this is the last retry
-                if attempt == max_retries - 1:
-                    error_msg = f"Error after {max_retries} attempts: {str(e)}"
-                    print(f"[{self.name}] {error_msg}")
+                except Exception as e:
+                    rate_limited += is_rate_limit_error(e)
+                    if stream is not None:
+                        stream.discard()
+                    # Check if this is the last retry
+                    delay = self._retry_delay(e, attempt, limiter, deadline) if attempt < max_retries - 1 else None
+                    if delay is None:
+                        span.set(source="fallback", error=str(e))
+                        return self._fallback_response(input_text, e, attempt + 1, use_memory, stream)
                     
-                    # Return a fallback response
-                    fallback_response = f"I apologize, but I'm currently experiencing technical difficulties. {error_msg}"
-                    self.memory.append({"role": "human", "content": input_text})
-                    self.memory.append({"role": "ai", "content": fallback_response})
-                    return fallback_response
+                    if delay:
+                        backoff += delay
+                        time.sleep(delay)
+        finally:
+            span.set(retries=attempt, rate_limited=rate_limited,
+                     rate_limit_wait_seconds=round(waited, 3), backoff_seconds=round(backoff, 3))
+    
+    def _call_leased(self, lease: KeyLease, messages: List[BaseMessage], stream: Optional[TokenStream],
+                     reserved_tokens: int, deadline: Deadline) -> Any:
+        """Make one request on a leased key and release the lease with its outcome."""
+        try:
+            response = self._call_model(lease.llm, messages, stream, deadline.remaining())
+        except Exception as e:
+            lease.release(e)
+            raise
+        lease.release()
+        lease.limiter.record_usage(reserved_tokens, self._used_tokens(response))
+        return response
+    
+    def _call_hedged(self, lease: KeyLease, messages: List[BaseMessage], reserved_tokens: int,
+                     priority: Optional[int], deadline: Deadline, span: Any) -> Any:
+        """Make a request and, if it has not answered within the hedge delay, race a duplicate on a second key.
+        
+        The first successful response wins; the other request finishes in the background
+        and releases its own key. The duplicate is only sent if a key can take it without
+        waiting for rate-limit budget, and is skipped if that budget is gone by the time it
+        is reserved and would not come back within the deadline.
+        """
+        primary = run_in_thread(self._call_leased, lease, messages, None, reserved_tokens, deadline)
+        try:
+            return primary.result(timeout=Config.get_hedge_delay_ms() / 1000)
+        except FutureTimeoutError:
+            pass
+        hedge_lease = self._hedge_lease(lease, reserved_tokens, priority, deadline)
+        if hedge_lease is None:
+            return primary.result()
+        try:
+            hedge_lease.limiter.acquire(reserved_tokens, priority, deadline.wait_budget())
+        except TimeoutError:
+            hedge_lease.abort()
+            return primary.result()
+        get_hedge_stats().record_sent()
+        span.set(hedged=True, hedge_api_key=hedge_lease.limiter.label)
+        hedge = run_in_thread(self._call_leased, hedge_lease, messages, None, reserved_tokens, deadline)
+        
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        get_hedge_stats().record_won()
+                        span.set(hedge_won=True)
+                    return future.result()
+                error = future.exception()
+        raise error
+    
+    async def aprocess_input(self, input_text: str, context: Optional[Dict[str, Any]] = None,
+                             use_memory: bool = True, use_cache: bool = True, method: Optional[str] = None) -> str:
+        """Async twin of process_input built on ainvoke; waits without blocking the event loop."""
+        with get_tracer().span(f"llm:{self.name}", kind="llm", agent=self.name, method=method or "process_input") as span:
+            messages = self._build_messages(input_text, use_memory)
+            cache_key = self._cache_key(messages, use_cache)
+            semantic_namespace = self._semantic_namespace(method, use_memory, use_cache)
+            cached = self._cached_response(input_text, cache_key, semantic_namespace, method)
+            stream = self._open_stream(method)
+            if cached is not None:
+                span.set(source="cache")
+                self._replay(stream, cached)
+                return self._complete(input_text, cached, use_memory, stream=stream)
+            
+            flight_key = self._flight_key(messages)
+            flights = get_single_flight()
+            while flight_key is not None:
+                flight, leader = flights.join(flight_key)
+                if leader:
+                    break
+                try:
+                    # Shielded so cancelling this caller never cancels the shared flight
+                    response_text = await asyncio.shield(asyncio.wrap_future(flight))
+                except asyncio.CancelledError:
+                    if not flight.cancelled():
+                        raise
+                    continue
+                span.set(source="coalesced")
+                self._replay(stream, response_text)
+                return self._complete(input_text, response_text, use_memory, stream=stream)
+            
+            try:
+                response_text = await self._agenerate(input_text, messages, use_memory, cache_key, semantic_namespace,
+                                                      stream, span, method)
+            except BaseException:
+                if flight_key is not None:
+                    flights.abandon(flight_key, flight)
+                raise
+            if flight_key is not None:
+                flights.settle(flight_key, flight, response_text)
+            return response_text
+    
+    async def _agenerate(self, input_text: str, messages: List[BaseMessage], use_memory: bool, cache_key: Optional[str],
+                         semantic_namespace: Optional[str], stream: Optional[TokenStream], span: Any,
+                         method: Optional[str] = None) -> str:
+        """Async twin of _generate."""
+        reserved_tokens = self._reserved_tokens(messages)
+        priority = current_priority()
+        deadline = self._deadline(method)
+        hedged = self._is_hedged(method, stream)
+        max_retries = 5
+        waited = backoff = 0.0
+        rate_limited = 0
+        attempt = 0
+        span.set(deadline_seconds=deadline.seconds)
+        
+        try:
+            for attempt in range(max_retries):
+                lease, blocked = self._open_lease(reserved_tokens, priority, deadline)
+                limiter = lease.limiter
+                span.set(api_key=limiter.label)
+                if blocked is not None:
+                    lease.abort()
+                    span.set(source="fallback", error=str(blocked))
+                    return self._fallback_response(input_text, blocked, attempt, use_memory, stream)
+                try:
+                    waited += await self._aacquire(lease, reserved_tokens, priority, deadline)
+                except DeadlineExceededError as e:
+                    lease.abort()
+                    span.set(source="fallback", error=str(e))
+                    return self._fallback_response(input_text, e, attempt, use_memory, stream)
+                try:
+                    if hedged:
+                        response = await self._acall_hedged(lease, messages, reserved_tokens, priority, deadline, span)
+                    else:
+                        response = await self._acall_leased(lease, messages, stream, reserved_tokens, deadline)
+                    span.set(source="llm", **self._token_counts(messages, response))
+                    if stream is not None:
+                        span.set(first_token_seconds=round(stream.first_token_seconds or 0.0, 3))
+                    
+                    return self._complete(input_text, response.content, use_memory, cache_key, semantic_namespace, stream)
                 
-                # Calculate delay with exponential backoff and jitter
-                delay = base_delay * (2 ** attempt) + random.uniform(0, 1)
-                print(f"[{self.name}] API call failed: {str(e)}. Retrying in {delay:.2f} seconds...")
-                time.sleep(delay)
+                except Exception as e:
+                    rate_limited += is_rate_limit_error(e)
+                    if stream is not None:
+                        stream.discard()
+                    delay = self._retry_delay(e, attempt, limiter, deadline) if attempt < max_retries - 1 else None
+                    if delay is None:
+                        span.set(source="fallback", error=str(e))
+                        return self._fallback_response(input_text, e, attempt + 1, use_memory, stream)
+                    
+                    if delay:
+                        backoff += delay
+                        await asyncio.sleep(delay)
+        finally:
+            span.set(retries=attempt, rate_limited=rate_limited,
+                     rate_limit_wait_seconds=round(waited, 3), backoff_seconds=round(backoff, 3))
+    
+    async def _acall_leased(self, lease: KeyLease, messages: List[BaseMessage], stream: Optional[TokenStream],
+                            reserved_tokens: int, deadline: Deadline) -> Any:
+        """Async twin of _call_leased; a cancelled request gives its key back without an outcome."""
+        try:
+            response = await self._acall_model(lease.llm, messages, stream, deadline.remaining())
+        except asyncio.CancelledError:
+            lease.abort()
+            raise
+        except Exception as e:
+            lease.release(e)
+            raise
+        lease.release()
+        lease.limiter.record_usage(reserved_tokens, self._used_tokens(response))
+        return response
+    
+    async def _acall_hedged(self, lease: KeyLease, messages: List[BaseMessage], reserved_tokens: int,
+                            priority: Optional[int], deadline: Deadline, span: Any) -> Any:
+        """Async twin of _call_hedged; the losing request is cancelled."""
+        tasks = [asyncio.ensure_future(self._acall_leased(lease, messages, None, reserved_tokens, deadline))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=Config.get_hedge_delay_ms() / 1000)
+            if done:
+                return tasks[0].result()
+            hedge_lease = self._hedge_lease(lease, reserved_tokens, priority, deadline)
+            if hedge_lease is None:
+                return await tasks[0]
+            try:
+                await hedge_lease.limiter.aacquire(reserved_tokens, priority, deadline.wait_budget())
+            except TimeoutError:
+                hedge_lease.abort()
+                return await tasks[0]
+            get_hedge_stats().record_sent()
+            span.set(hedged=True, hedge_api_key=hedge_lease.limiter.label)
+            tasks.append(asyncio.ensure_future(self._acall_leased(hedge_lease, messages, None, reserved_tokens, deadline)))
+            
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            get_hedge_stats().record_won()
+                            span.set(hedge_won=True)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The slower request is no longer needed
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    def _decide(self, prompt: str, question: str, patient: PatientEncoding, method: str) -> TriageDecision:
+        """Ask a Yes/No triage question, batched with the same question for other patients when possible.
+        
+        `prompt` is the single-patient prompt, used when the question could not be batched.
+        """
+        batcher = get_classification_batcher()
+        if batcher is not None:
+            decision = batcher.submit(self, method, question, patient).result()
+            if decision is not None:
+                # Remember the exchange as if the question had been asked on its own
+                self._remember(prompt, decision.reason)
+                return decision
+        return self._llm_decision(self.process_input(prompt, method=method))
+    
+    async def _adecide(self, prompt: str, question: str, patient: PatientEncoding, method: str) -> TriageDecision:
+        """Async twin of _decide."""
+        batcher = get_classification_batcher()
+        if batcher is not None:
+            future = batcher.submit(self, method, question, patient)
+            decision = await asyncio.shield(asyncio.wrap_future(future))
+            if decision is not None:
+                self._remember(prompt, decision.reason)
+                return decision
+        return self._llm_decision(await self.aprocess_input(prompt, method=method))
+    
+    @staticmethod
+    def _llm_decision(response: str) -> TriageDecision:
+        """Parse a Yes/No answer; a fallback response is no answer and stays marked as one."""
+        decision = TriageDecision.from_llm(response)
+        if isinstance(response, FallbackResponse):
+            return decision._replace(source="fallback", reason=FallbackResponse(decision.reason, response.error))
+        return decision
+    
+    def stream_input(self, input_text: str, *sinks: StreamSink, **kwargs: Any) -> str:
+        """Like process_input, but forwards the response to `sinks` token by token as it is generated.
+        
+        Memory and the caches are still updated with the final text, which is also returned.
+        """
+        with streaming_to(*sinks):
+            return self.process_input(input_text, **kwargs)
+    
+    async def astream_input(self, input_text: str, *sinks: StreamSink, **kwargs: Any) -> str:
+        """Async twin of stream_input built on astream."""
+        with streaming_to(*sinks):
+            return await self.aprocess_input(input_text, **kwargs)
     
     def clear_memory(self):
         """Clear the agent's memory."""
-        self.memory = []
\ No newline at end of file
+        self.active_memory.clear()
\ No newline at end of file
@@ -0,0 +1,180 @@
+from typing import Dict, List, Any, Optional, Tuple
+from concurrent.futures import Future
+import json
+import threading
+import time
+
+from utils.config import Config
+from utils.patient_encoding import PatientEncoding
+from utils.priority import Ticket, current_ticket, scheduled
+from utils.triage_rules import TriageDecision
+
+from .prompts import PromptTemplate
+
+# One Yes/No question for several patients; each patient block is '### <id>' plus the clinical picture
+BATCH_CLASSIFICATION_PROMPT = PromptTemplate("batch_classification", """
+    {question}
+    Answer separately for each patient below.
+    
+    {patients}
+    
+    Respond with only a JSON array with one object per patient:
+    [{{"patient_id": "P1", "answer": "Yes or No", "reason": "brief explanation"}}]
+    """)
+
+class _Batch:
+    """Classification requests of one agent and question collected during a batching window."""
+    
+    def __init__(self, agent: Any, method: str, question: str):
+        self.agent = agent
+        self.method = method
+        self.question = question
+        # In-batch patient ID -> clinical picture and the futures waiting on its decision;
+        # identical clinical pictures share one entry
+        self.patients: Dict[str, Tuple[str, List[Future]]] = {}
+        self._ids: Dict[str, str] = {}
+        self.requests = 0
+        # The most urgent requester's ticket; the batched call draws on that class's budget
+        self.ticket: Optional[Ticket] = None
+        self.timer: Optional[threading.Timer] = None
+    
+    def add(self, clinical: str, ticket: Optional[Ticket] = None) -> Future:
+        """Add a patient's request and return the future of its decision."""
+        if ticket is not None and (self.ticket is None or ticket.priority < self.ticket.priority):
+            self.ticket = ticket
+        future = Future()
+        patient_id = self._ids.get(clinical)
+        if patient_id is None:
+            patient_id = self._ids[clinical] = f"P{len(self._ids) + 1}"
+            self.patients[patient_id] = (clinical, [])
+        self.patients[patient_id][1].append(future)
+        self.requests += 1
+        return future
+    
+    def __len__(self) -> int:
+        return len(self.patients)
+
+def parse_decisions(response: str, patient_ids: List[str]) -> Dict[str, TriageDecision]:
+    """Parse the JSON array answer of a batched prompt; patients with a missing or malformed entry are left out."""
+    start, end = response.find("["), response.rfind("]")
+    if start < 0 or end < start:
+        return {}
+    try:
+        items = json.loads(response[start:end + 1])
+    except ValueError:
+        return {}
+    
+    decisions = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict) or str(item.get("patient_id")) not in patient_ids:
+            continue
+        answer = item.get("answer")
+        if isinstance(answer, str) and answer.strip().lower() in ("yes", "no"):
+            value = answer.strip().lower() == "yes"
+        elif isinstance(answer, bool):
+            value = answer
+        else:
+            continue
+        reason = f"{'Yes' if value else 'No'}. {item.get('reason') or ''}".strip()
+        decisions[str(item["patient_id"])] = TriageDecision(value, "llm", reason[:200])
+    return decisions
+
+class ClassificationBatcher:
+    """Micro-batches the Yes/No triage questions of concurrent patients into one LLM call.
+
+    Requests for the same agent and question that arrive within a short window are
+    sent as one prompt that answers with a JSON array of decisions keyed by an
+    in-batch patient ID, and each caller gets its own decision back; identical
+    patients are listed once. A batch is sent when the window closes or when it
+    holds max_size patients. A window that collects a single patient (or only
+    duplicates of one), and any patient missing from the answer, resolve to None so
+    the caller asks its usual single-patient prompt instead.
+    
+    A question that arrives while nothing is pending for its agent and question, and
+    none was asked during the last window, resolves to None at once: without
+    concurrent patients it would only wait out the window alone.
+    """
+    
+    def __init__(self, window_seconds: Optional[float] = None, max_size: Optional[int] = None):
+        self.window_seconds = window_seconds if window_seconds is not None else Config.get_classification_batch_window_ms() / 1000
+        self.max_size = max_size or Config.get_classification_batch_size()
+        self._pending: Dict[Tuple[str, str], _Batch] = {}
+        # When each agent and question was last asked, to tell a quiet period from concurrent traffic
+        self._last_asked: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.batched = 0
+    
+    def submit(self, agent: Any, method: str, question: str, patient: PatientEncoding) -> Future:
+        """Queue a patient's Yes/No question; the future resolves to a TriageDecision, or None if it was not batched."""
+        key = (agent.name, method)
+        full = None
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            last_asked = self._last_asked.get(key)
+            self._last_asked[key] = now
+            batch = self._pending.get(key)
+            if batch is None and (last_asked is None or now - last_asked > self.window_seconds):
+                future = Future()
+                future.set_result(None)
+                return future
+            if batch is None:
+                batch = self._pending[key] = _Batch(agent, method, question)
+                batch.timer = threading.Timer(self.window_seconds, self._flush, (key, batch))
+                batch.timer.daemon = True
+                batch.timer.start()
+            future = batch.add(patient.clinical, current_ticket())
+            if len(batch) >= self.max_size:
+                full = self._pending.pop(key)
+                full.timer.cancel()
+        if full is not None:
+            threading.Thread(target=self._send, args=(full,), name="classification-batch", daemon=True).start()
+        return future
+    
+    def _flush(self, key: Tuple[str, str], batch: _Batch):
+        """Send a batch when its window closes, unless it was already sent because it was full."""
+        with self._lock:
+            if self._pending.get(key) is not batch:
+                return
+            del self._pending[key]
+        self._send(batch)
+    
+    def _send(self, batch: _Batch):
+        """Ask the batch's question for all of its patients in one call and hand each caller its decision."""
+        decisions: Dict[str, TriageDecision] = {}
+        try:
+            if len(batch.patients) > 1:
+                patients = "\n\n".join(f"### {patient_id}\n{clinical}" for patient_id, (clinical, _) in batch.patients.items())
+                prompt = BATCH_CLASSIFICATION_PROMPT.render(None, question=batch.question, patients=patients)
+                with scheduled(batch.ticket):
+                    response = batch.agent.process_input(prompt, use_memory=False, method=f"{batch.method}_batch")
+                decisions = parse_decisions(response, list(batch.patients))
+                with self._lock:
+                    self.batches += 1
+                    self.batched += sum(len(batch.patients[patient_id][1]) for patient_id in decisions)
+        except Exception as e:
+            print(f"[{batch.agent.name}] Batched {batch.method} call failed, asking each patient separately: {e}")
+        finally:
+            for patient_id, (_, futures) in batch.patients.items():
+                for future in futures:
+                    future.set_result(decisions.get(patient_id))
+    
+    def stats(self) -> Dict[str, int]:
+        """Get the number of questions submitted, batched calls made and questions answered by them."""
+        with self._lock:
+            return {"requests": self.requests, "batches": self.batches, "batched": self.batched}
+
+_batcher: Optional[ClassificationBatcher] = None
+_batcher_lock = threading.Lock()
+
+def get_classification_batcher() -> Optional[ClassificationBatcher]:
+    """Get the shared classification batcher, or None if batching is disabled."""
+    global _batcher
+    if not Config.is_classification_batching_enabled():
+        return None
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = ClassificationBatcher()
+        return _batcher
\ No newline at end of file
@@ -0,0 +1,165 @@
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+import re
+import threading
+
+from utils.config import Config
+from utils.dag import current_stage
+from utils.patient_encoding import PatientEncoding
+from utils.tokens import estimate_tokens, estimate_message_tokens
+
+class ConversationMemory:
+    """Token-budgeted sliding window over an agent's conversation.
+
+    Oldest messages are evicted once the window exceeds max_tokens. When rolling
+    summaries are enabled, the first sentence of each evicted reply is folded into
+    a short summary (itself capped at a quarter of the budget) so the gist of the
+    earlier conversation survives without replaying it.
+    """
+    
+    def __init__(self, max_tokens: Optional[int] = None, summarize: Optional[bool] = None):
+        self.max_tokens = max_tokens if max_tokens is not None else Config.get_memory_token_budget()
+        self.summarize = summarize if summarize is not None else Config.memory_summaries_enabled()
+        self.messages: List[Dict[str, Any]] = []
+        self.summary = ""
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.messages)
+    
+    def __len__(self) -> int:
+        return len(self.messages)
+    
+    def __bool__(self) -> bool:
+        return bool(self.messages) or bool(self.summary)
+    
+    def append(self, message: Dict[str, Any]):
+        """Add a message and evict the oldest ones if the window is over budget."""
+        self.messages.append(message)
+        self._trim()
+    
+    def token_count(self) -> int:
+        """Estimate the tokens the window adds to a prompt."""
+        return estimate_message_tokens(self.messages) + estimate_tokens(self.summary)
+    
+    def clear(self):
+        """Forget all messages and the summary."""
+        self.messages = []
+        self.summary = ""
+    
+    def _trim(self):
+        """Evict the oldest messages until the window fits the token budget."""
+        evicted = []
+        # Always keep the newest message, even if it alone exceeds the budget
+        while len(self.messages) > 1 and estimate_message_tokens(self.messages) > self.max_tokens:
+            evicted.append(self.messages.pop(0))
+        
+        if evicted and self.summarize:
+            self._fold_into_summary(evicted)
+    
+    def _fold_into_summary(self, evicted: List[Dict[str, Any]]):
+        """Append the first sentence of each evicted reply to the rolling summary."""
+        points = []
+        for message in evicted:
+            if message["role"] != "ai":
+                continue
+            text = " ".join(str(message["content"]).split())
+            first_sentence = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+            if first_sentence:
+                points.append(first_sentence[:200])
+        
+        if not points:
+            return
+        summary = " ".join(filter(None, [self.summary] + points))
+        
+        # Keep the summary within a quarter of the token budget (~4 chars per token)
+        max_chars = self.max_tokens
+        if len(summary) > max_chars:
+            summary = "..." + summary[-max_chars:]
+        self.summary = summary
+
+class PatientSession:
+    """Per-patient scope holding a separate conversation memory for every agent.
+    
+    Inside a workflow stage (see utils.dag.current_stage), an agent's memory holds the
+    exchanges recorded by the stages the running stage depends on, and the exchanges
+    the stage records are kept for the stages that depend on it. Concurrent stages
+    therefore never see each other's exchanges, and every prompt is the same whatever
+    order the stages finish in. Stages restored from a checkpoint recorded nothing.
+    """
+    
+    def __init__(self, patient_id: str):
+        self.patient_id = patient_id
+        self.memories: Dict[str, ConversationMemory] = {}
+        self.encodings: Dict[int, Any] = {}
+        # Exchanges recorded by each stage, keyed by (stage, agent)
+        self.stage_exchanges: Dict[Tuple[str, str], List[Tuple[Dict[str, Any], ...]]] = {}
+        self._lock = threading.Lock()
+    
+    def memory_for(self, agent_name: str) -> ConversationMemory:
+        """Get the memory of an agent within this session (or within the running stage), creating it on first use."""
+        stage = current_stage()
+        if stage is not None:
+            return self._stage_memory(stage.ancestors, agent_name)
+        if agent_name not in self.memories:
+            self.memories[agent_name] = ConversationMemory()
+        return self.memories[agent_name]
+    
+    def _stage_memory(self, stages: Tuple[str, ...], agent_name: str) -> ConversationMemory:
+        """Build an agent's memory from the exchanges of the given stages."""
+        memory = ConversationMemory()
+        with self._lock:
+            for stage in stages:
+                # Calls within one stage may run concurrently, so its exchanges are
+                # replayed in a fixed order rather than the order they finished in
+                for exchange in sorted(self.stage_exchanges.get((stage, agent_name), []), key=repr):
+                    for message in exchange:
+                        memory.append(message)
+        return memory
+    
+    def record(self, agent_name: str, *messages: Dict[str, Any]):
+        """Record an exchange of an agent; inside a stage it is kept for the stages that depend on it."""
+        stage = current_stage()
+        if stage is None:
+            memory = self.memory_for(agent_name)
+            for message in messages:
+                memory.append(message)
+            return
+        with self._lock:
+            self.stage_exchanges.setdefault((stage.name, agent_name), []).append(messages)
+    
+    def encoding_for(self, patient_data: Dict[str, Any]) -> PatientEncoding:
+        """Get the compact encoding of a patient record, computing it on first use in this session."""
+        # Keyed on identity: every stage of the workflow passes the same record. The record
+        # is kept alongside so its id cannot be reused while the session is open.
+        entry = self.encodings.get(id(patient_data))
+        if entry is None or entry[0] is not patient_data:
+            entry = self.encodings[id(patient_data)] = (patient_data, PatientEncoding(patient_data))
+        return entry[1]
+    
+    def close(self):
+        """Discard all agent memories of the session."""
+        for memory in self.memories.values():
+            memory.clear()
+        self.memories = {}
+        self.encodings = {}
+        self.stage_exchanges = {}
+
+# The active session is tracked per thread and per asyncio task, so concurrently
+# processed patients never see each other's conversations.
+_current_session: ContextVar[Optional[PatientSession]] = ContextVar("patient_session", default=None)
+
+def current_session() -> Optional[PatientSession]:
+    """Get the patient session active in the current thread or task, if any."""
+    return _current_session.get()
+
+@contextmanager
+def patient_session(patient_id: str):
+    """Scope agent memory to one patient; the memory is reset when the block exits."""
+    session = PatientSession(patient_id)
+    token = _current_session.set(session)
+    try:
+        yield session
+    finally:
+        _current_session.reset(token)
+        session.close()
\ No newline at end of file
@@ -1,8 +1,77 @@
 from typing import Dict, List, Any, Optional
+import asyncio
+
 from ..base_agent import BaseAgent
+from ..prompts import PromptTemplate, patient_encoding
+from ..schemas import CardiacAssessment, describe_fields, parse_structured
 from langchain_core.language_models import BaseChatModel
 from pydantic import Field
 
+from utils.config import Config
+from utils.dag import run_parallel
+from utils.triage_rules import TriageDecision, get_triage_engine
+
+CARDIAC_ASSESSMENT_PROMPT = PromptTemplate("cardiac_assessment", """
+    Provide urgent cardiac assessment for:
+    {p.clinical}
+    
+    Provide: 1. Cardiac risk level 2. Potential conditions 3. Immediate actions 4. Need for emergency services (Yes/No)
+    """)
+
+EMERGENCY_PROMPT = PromptTemplate("cardiac_emergency", """
+    Determine if this is a cardiac emergency requiring immediate medical attention:
+    {p.clinical}
+    
+    Respond with only 'Yes' or 'No' followed by a brief explanation.
+    """)
+
+# Single-call variant of the assessment, emergency and instructions prompts (STRUCTURED_ASSESSMENTS)
+STRUCTURED_ASSESSMENT_PROMPT = PromptTemplate("structured_cardiac_assessment", """
+    Provide urgent cardiac assessment for:
+    {p.clinical}
+    
+    Respond with only a JSON object with these fields:
+    {fields}
+    """)
+
+CARDIAC_ASSESSMENT_FIELDS = describe_fields(CardiacAssessment)
+
+# The emergency question alone, asked for several patients at once by the classification batcher
+EMERGENCY_QUESTION = "For each patient, determine if this is a cardiac emergency requiring immediate medical attention."
+
+INSTRUCTIONS_PROMPT = PromptTemplate("emergency_instructions", """
+    Provide clear emergency instructions for a patient with these cardiac symptoms: {p.symptoms}
+    
+    Include step-by-step instructions for the patient or caregiver until emergency services arrive.
+    """)
+
+CARE_PLAN_PROMPT = PromptTemplate("cardiac_care_plan", """
+    Generate a comprehensive cardiac care plan for:
+    {p.profile}{cardiologist_input}
+    
+    Include:
+    1. Cardiac monitoring recommendations
+    2. Medication management
+    3. Lifestyle modifications for heart health
+    4. Warning signs requiring immediate attention
+    5. Follow-up schedule with cardiology
+    """)
+
+EMERGENCY_RESPONSE_PROMPT = PromptTemplate("emergency_response", """
+    Provide emergency response coordination instructions for:
+    Name: {p.name}
+    Location: {p.location}
+    Patient: {p.demographics}
+    Symptoms: {p.symptoms}
+    Vitals: {p.vitals}
+    
+    Include:
+    1. Instructions for calling emergency services
+    2. Information to provide to emergency responders
+    3. Immediate actions while waiting for help
+    4. Preparation for hospital transport
+    """)
+
 class HeartPatientAgent(BaseAgent):
     """Agent for handling patients with cardiac conditions."""
     
@@ -10,105 +79,168 @@ class HeartPatientAgent(BaseAgent):
         """Initialize the heart patient agent with specialized system prompt."""
         self.system_prompt = f"You are {self.name}, a cardiac care specialist. Provide concise assessments of heart conditions, emergency response coordination, and cardiac care recommendations. Prioritize patient safety for life-threatening conditions."
     
-    def process_patient_data(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Process patient data and provide cardiac assessment with urgency rating."""
-        # Extract relevant cardiac information
-        symptoms = patient_data.get('symptoms', [])
-        vital_signs = patient_data.get('vital_signs', {})
-        medical_history = patient_data.get('medical_history', [])
-        medications = patient_data.get('medications', [])
-        
-        # Check for critical cardiac symptoms
-        cardiac_symptoms = ['chest pain', 'chest pressure', 'shortness of breath', 'palpitations', 
-                           'dizziness', 'fainting', 'sweating', 'nausea', 'jaw pain', 'arm pain']
-        
-        has_cardiac_symptoms = any(symptom in ' '.join(symptoms).lower() for symptom in cardiac_symptoms)
-        
-        # Generate cardiac assessment - more concise prompt
-        assessment_prompt = f"Provide urgent cardiac assessment for: {patient_data.get('age')}-year-old {patient_data.get('gender')} with symptoms: {', '.join(symptoms) if symptoms else 'None'}, vitals: BP {vital_signs.get('blood_pressure_systolic', 'N/A')}/{vital_signs.get('blood_pressure_diastolic', 'N/A')}, HR {vital_signs.get('heart_rate', 'N/A')}, history: {', '.join(medical_history[:2]) if medical_history else 'None'}. Provide: 1. Cardiac risk level 2. Potential conditions 3. Immediate actions 4. Need for emergency services (Yes/No)"
-        
-        cardiac_assessment = self.process_input(assessment_prompt)
-        
-        # Determine emergency status
-        emergency_prompt = f"""
-        Based on the following patient information, determine if this is a cardiac emergency requiring immediate medical attention:
-        
-        - Age: {patient_data.get('age', 'Unknown')}
-        - Gender: {patient_data.get('gender', 'Unknown')}
-        - Symptoms: {', '.join(symptoms) if symptoms else 'None reported'}
-        - Vital Signs: {vital_signs}
-        - Medical History: {', '.join(medical_history) if medical_history else 'None available'}
-        
-        Respond with only 'Yes' or 'No' followed by a brief explanation.
-        """
-        
-        emergency_response = self.process_input(emergency_prompt)
-        is_emergency = emergency_response.lower().startswith('yes')
-        
-        # Generate emergency instructions if needed
-        emergency_instructions = ""
-        if is_emergency:
-            instructions_prompt = f"""
-            Please provide clear emergency instructions for a patient with the following cardiac symptoms:
-            {', '.join(symptoms) if symptoms else 'None reported'}
-            
-            Include step-by-step instructions for the patient or caregiver until emergency services arrive.
-            """
-            emergency_instructions = self.process_input(instructions_prompt)
-        
+    def _assessment_prompt(self, patient_data: Dict[str, Any]) -> str:
+        """Build the urgent cardiac assessment prompt."""
+        return CARDIAC_ASSESSMENT_PROMPT.render(patient_encoding(patient_data))
+    
+    def _emergency_prompt(self, patient_data: Dict[str, Any]) -> str:
+        """Build the Yes/No cardiac emergency prompt."""
+        return EMERGENCY_PROMPT.render(patient_encoding(patient_data))
+    
+    def _decide_emergency(self, patient_data: Dict[str, Any]) -> TriageDecision:
+        """Ask the LLM whether the patient is a cardiac emergency."""
+        return self._decide(self._emergency_prompt(patient_data), EMERGENCY_QUESTION,
+                            patient_encoding(patient_data), "cardiac_emergency")
+    
+    async def _adecide_emergency(self, patient_data: Dict[str, Any]) -> TriageDecision:
+        """Async twin of _decide_emergency."""
+        return await self._adecide(self._emergency_prompt(patient_data), EMERGENCY_QUESTION,
+                                   patient_encoding(patient_data), "cardiac_emergency")
+    
+    def _instructions_prompt(self, patient_data: Dict[str, Any]) -> str:
+        """Build the emergency instructions prompt."""
+        return INSTRUCTIONS_PROMPT.render(patient_encoding(patient_data))
+    
+    @staticmethod
+    def _build_assessment(cardiac_assessment: str, decision: TriageDecision, emergency_instructions: str) -> Dict[str, Any]:
+        """Assemble the assessment dict consumed by process_patient."""
         return {
             "patient_status": "cardiac",
             "cardiac_assessment": cardiac_assessment,
-            "is_emergency": is_emergency,
+            "is_emergency": decision.value,
+            "emergency_decision": decision.to_dict(),
             "emergency_instructions": emergency_instructions,
             "requires_doctor_attention": True,
-            "follow_up_interval": "immediate" if is_emergency else "24 hours"
+            "follow_up_interval": "immediate" if decision.value else "24 hours"
         }
     
-    def generate_cardiac_care_plan(self, patient_data: Dict[str, Any], cardiologist_input: Optional[str] = None) -> str:
-        """Generate a cardiac care plan based on patient data and cardiologist input."""
-        care_plan_prompt = f"""
-        Please generate a comprehensive cardiac care plan for:
-        
-        Patient Information:
-        - Name: {patient_data.get('name', 'Unknown')}
-        - Age: {patient_data.get('age', 'Unknown')}
-        - Gender: {patient_data.get('gender', 'Unknown')}
-        - Cardiac Symptoms: {', '.join(patient_data.get('symptoms', [])) if patient_data.get('symptoms') else 'None reported'}
-        - Vital Signs: {patient_data.get('vital_signs', 'Not available')}
-        - Medical History: {', '.join(patient_data.get('medical_history', [])) if patient_data.get('medical_history') else 'None available'}
-        - Current Medications: {', '.join(patient_data.get('medications', [])) if patient_data.get('medications') else 'None reported'}
-        
-        {f'Cardiologist Input: {cardiologist_input}' if cardiologist_input else ''}
+    def _structured_prompt(self, patient_data: Dict[str, Any]) -> str:
+        """Build the single-call structured assessment prompt."""
+        return STRUCTURED_ASSESSMENT_PROMPT.render(patient_encoding(patient_data), fields=CARDIAC_ASSESSMENT_FIELDS)
+    
+    def _structured_decision(self, patient_data: Dict[str, Any], structured: CardiacAssessment) -> TriageDecision:
+        """Get the emergency decision of a structured assessment; clear-cut rule decisions still win."""
+        decision = self._rule_decision(patient_data)
+        if decision is None:
+            answer = "Yes" if structured.is_emergency else "No"
+            decision = TriageDecision(structured.is_emergency, "llm", f"{answer}. {structured.reason}"[:200])
+        return decision
+    
+    def _build_structured_assessment(self, structured: CardiacAssessment, decision: TriageDecision,
+                                     emergency_instructions: str) -> Dict[str, Any]:
+        """Assemble the assessment dict from a structured assessment."""
+        assessment = self._build_assessment(structured.assessment, decision, emergency_instructions)
+        assessment["risk_level"] = structured.risk_level
+        # The model's follow-up interval only holds if the rules did not overturn its decision
+        if decision.value == structured.is_emergency:
+            assessment["follow_up_interval"] = structured.follow_up_interval
+        return assessment
+    
+    @staticmethod
+    def _rule_decision(patient_data: Dict[str, Any]) -> Optional[TriageDecision]:
+        """Decide the emergency status locally, or return None when the LLM has to decide."""
+        engine = get_triage_engine()
+        return engine.cardiac_emergency(patient_data) if engine else None
+    
+    def process_patient_data(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Process patient data and provide cardiac assessment with urgency rating."""
+        if Config.is_structured_assessments_enabled():
+            # One call for the assessment, the emergency decision and the instructions
+            response = self.process_input(self._structured_prompt(patient_data), method="structured_assessment")
+            structured = parse_structured(response, CardiacAssessment)
+            if structured is not None:
+                decision = self._structured_decision(patient_data, structured)
+                emergency_instructions = structured.emergency_instructions if decision.value else ""
+                if decision.value and not emergency_instructions:
+                    emergency_instructions = self.process_input(self._instructions_prompt(patient_data),
+                                                                method="emergency_instructions")
+                return self._build_structured_assessment(structured, decision, emergency_instructions)
+            print(f"[{self.name}] Could not parse the structured assessment; falling back to separate calls")
+        
+        decision = self._rule_decision(patient_data)
+        emergency_instructions = ""
         
-        Include:
-        1. Cardiac monitoring recommendations
-        2. Medication management
-        3. Lifestyle modifications for heart health
-        4. Warning signs requiring immediate attention
-        5. Follow-up schedule with cardiology
-        """
+        if decision is None:
+            # Ambiguous case: generate cardiac assessment and ask for the emergency status;
+            # the two calls are independent, so they run concurrently
+            cardiac_assessment, decision = run_parallel(
+                lambda: self.process_input(self._assessment_prompt(patient_data)),
+                lambda: self._decide_emergency(patient_data)
+            )
+            
+            # Generate emergency instructions if needed
+            if decision.value:
+                emergency_instructions = self.process_input(self._instructions_prompt(patient_data),
+                                                            method="emergency_instructions")
+        elif decision.value:
+            # Emergency settled by the rules, so the instructions need not wait for the assessment
+            cardiac_assessment, emergency_instructions = run_parallel(
+                lambda: self.process_input(self._assessment_prompt(patient_data)),
+                lambda: self.process_input(self._instructions_prompt(patient_data), method="emergency_instructions")
+            )
+        else:
+            cardiac_assessment = self.process_input(self._assessment_prompt(patient_data))
+        
+        return self._build_assessment(cardiac_assessment, decision, emergency_instructions)
+    
+    async def aprocess_patient_data(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Async twin of process_patient_data."""
+        if Config.is_structured_assessments_enabled():
+            response = await self.aprocess_input(self._structured_prompt(patient_data), method="structured_assessment")
+            structured = parse_structured(response, CardiacAssessment)
+            if structured is not None:
+                decision = self._structured_decision(patient_data, structured)
+                emergency_instructions = structured.emergency_instructions if decision.value else ""
+                if decision.value and not emergency_instructions:
+                    emergency_instructions = await self.aprocess_input(self._instructions_prompt(patient_data),
+                                                                       method="emergency_instructions")
+                return self._build_structured_assessment(structured, decision, emergency_instructions)
+            print(f"[{self.name}] Could not parse the structured assessment; falling back to separate calls")
+        
+        decision = self._rule_decision(patient_data)
+        emergency_instructions = ""
         
-        return self.process_input(care_plan_prompt)
+        if decision is None:
+            cardiac_assessment, decision = await asyncio.gather(
+                self.aprocess_input(self._assessment_prompt(patient_data)),
+                self._adecide_emergency(patient_data)
+            )
+            
+            if decision.value:
+                emergency_instructions = await self.aprocess_input(self._instructions_prompt(patient_data),
+                                                                   method="emergency_instructions")
+        elif decision.value:
+            cardiac_assessment, emergency_instructions = await asyncio.gather(
+                self.aprocess_input(self._assessment_prompt(patient_data)),
+                self.aprocess_input(self._instructions_prompt(patient_data), method="emergency_instructions")
+            )
+        else:
+            cardiac_assessment = await self.aprocess_input(self._assessment_prompt(patient_data))
+        
+        return self._build_assessment(cardiac_assessment, decision, emergency_instructions)
+    
+    def _care_plan_prompt(self, patient_data: Dict[str, Any], cardiologist_input: Optional[str] = None) -> str:
+        """Build the cardiac care plan prompt."""
+        cardiologist_input = f"\nCardiologist input: {cardiologist_input}" if cardiologist_input else ""
+        return CARE_PLAN_PROMPT.render(patient_encoding(patient_data), cardiologist_input=cardiologist_input)
+    
+    def generate_cardiac_care_plan(self, patient_data: Dict[str, Any], cardiologist_input: Optional[str] = None) -> str:
+        """Generate a cardiac care plan based on patient data and cardiologist input."""
+        return self.process_input(self._care_plan_prompt(patient_data, cardiologist_input))
+    
+    async def agenerate_cardiac_care_plan(self, patient_data: Dict[str, Any], cardiologist_input: Optional[str] = None) -> str:
+        """Async twin of generate_cardiac_care_plan."""
+        return await self.aprocess_input(self._care_plan_prompt(patient_data, cardiologist_input))
+    
+    def _emergency_response_prompt(self, patient_data: Dict[str, Any]) -> str:
+        """Build the emergency response coordination prompt."""
+        return EMERGENCY_RESPONSE_PROMPT.render(patient_encoding(patient_data))
     
     def coordinate_emergency_response(self, patient_data: Dict[str, Any]) -> str:
         """Coordinate emergency response for a cardiac patient."""
-        emergency_prompt = f"""
-        Please provide emergency response coordination instructions for:
-        
-        Patient Information:
-        - Name: {patient_data.get('name', 'Unknown')}
-        - Age: {patient_data.get('age', 'Unknown')}
-        - Gender: {patient_data.get('gender', 'Unknown')}
-        - Location: {patient_data.get('location', 'Unknown')}
-        - Cardiac Symptoms: {', '.join(patient_data.get('symptoms', [])) if patient_data.get('symptoms') else 'None reported'}
-        - Vital Signs: {patient_data.get('vital_signs', 'Not available')}
-        
-        Include:
-        1. Instructions for calling emergency services
-        2. Information to provide to emergency responders
-        3. Immediate actions while waiting for help
-        4. Preparation for hospital transport
-        """
-        
-        return self.process_input(emergency_prompt)
\ No newline at end of file
+        return self.process_input(self._emergency_response_prompt(patient_data), method="coordinate_emergency_response")
+    
+    async def acoordinate_emergency_response(self, patient_data: Dict[str, Any]) -> str:
+        """Async twin of coordinate_emergency_response."""
+        return await self.aprocess_input(self._emergency_response_prompt(patient_data),
+                                         method="coordinate_emergency_response")
\ No newline at end of file
@@ -1,8 +1,33 @@
 from typing import Dict, List, Any, Optional
+
 from ..base_agent import BaseAgent
+from ..prompts import PromptTemplate, patient_encoding
 from langchain_core.language_models import BaseChatModel
 from pydantic import Field
 
+from utils.lazy_result import LazyResult
+
+# The wellness and check-up prompts depend only on age and gender, which keeps them cacheable
+WELLNESS_PROMPT = PromptTemplate("wellness", """
+    Provide brief wellness recommendations for a {p.demographics} with normal health. Include exercise, diet, sleep, stress management, and preventive screenings.
+    """)
+
+SCHEDULE_PROMPT = PromptTemplate("check_up_schedule", """
+    Recommend a brief check-up schedule for a {p.demographics} with normal health for the next 2 years.
+    """)
+
+HEALTH_REPORT_PROMPT = PromptTemplate("health_report", """
+    Generate a health report for a patient with normal health status:
+    Patient: {p.demographics}
+    Vitals: {p.vitals}
+    
+    Include:
+    1. Current health assessment
+    2. Preventive care recommendations
+    3. Lifestyle optimization suggestions
+    4. Recommended follow-up timeline
+    """)
+
 class NormalPatientAgent(BaseAgent):
     """Agent for handling patients with normal health conditions."""
     
@@ -10,47 +35,66 @@ class NormalPatientAgent(BaseAgent):
         """Initialize the normal patient agent with specialized system prompt."""
         self.system_prompt = f"You are {self.name}, a medical assistant for routine healthcare. Provide concise preventive care recommendations, health maintenance advice, and check-up scheduling for patients with normal health conditions."
     
-    def process_patient_data(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Process patient data and provide wellness recommendations."""
-        # Check if vital signs are within normal ranges
-        vital_signs = patient_data.get('vital_signs', {})
-        age = patient_data.get('age', 30)
-        gender = patient_data.get('gender', 'Unknown')
-        
-        # Generate wellness recommendations based on patient demographics - more concise prompt
-        wellness_prompt = f"Provide brief wellness recommendations for {age}-year-old {gender} with normal health. Include exercise, diet, sleep, stress management, and preventive screenings."
-        
-        wellness_recommendations = self.process_input(wellness_prompt)
-        
-        # Generate recommended check-up schedule - more concise prompt
-        schedule_prompt = f"Recommend brief check-up schedule for {age}-year-old {gender} with normal health for next 2 years."
-        
-        check_up_schedule = self.process_input(schedule_prompt)
+    def _wellness_prompt(self, patient_data: Dict[str, Any]) -> str:
+        """Build the wellness recommendations prompt."""
+        return WELLNESS_PROMPT.render(patient_encoding(patient_data))
+    
+    def _schedule_prompt(self, patient_data: Dict[str, Any]) -> str:
+        """Build the check-up schedule prompt."""
+        return SCHEDULE_PROMPT.render(patient_encoding(patient_data))
+    
+    def generate_wellness_recommendations(self, patient_data: Dict[str, Any]) -> str:
+        """Generate wellness recommendations based on patient demographics."""
+        # Depends only on age and gender, so it runs without memory and caches well
+        return self.process_input(self._wellness_prompt(patient_data), use_memory=False, method="wellness")
+    
+    async def agenerate_wellness_recommendations(self, patient_data: Dict[str, Any]) -> str:
+        """Async twin of generate_wellness_recommendations."""
+        return await self.aprocess_input(self._wellness_prompt(patient_data), use_memory=False, method="wellness")
+    
+    def generate_check_up_schedule(self, patient_data: Dict[str, Any]) -> str:
+        """Generate a recommended check-up schedule based on patient demographics."""
+        return self.process_input(self._schedule_prompt(patient_data), use_memory=False, method="check_up_schedule")
+    
+    async def agenerate_check_up_schedule(self, patient_data: Dict[str, Any]) -> str:
+        """Async twin of generate_check_up_schedule."""
+        return await self.aprocess_input(self._schedule_prompt(patient_data), use_memory=False, method="check_up_schedule")
+    
+    def _build_assessment(self, patient_data: Dict[str, Any]) -> LazyResult:
+        """Assemble the assessment dict consumed by process_patient.
         
-        return {
+        The wellness recommendations and check-up schedule are lazy fields, generated
+        only if something reads them.
+        """
+        assessment = LazyResult({
             "patient_status": "normal",
-            "wellness_recommendations": wellness_recommendations,
-            "check_up_schedule": check_up_schedule,
             "requires_doctor_attention": False,
             "follow_up_interval": "12 months"
-        }
+        })
+        assessment.defer("wellness_recommendations",
+                         lambda: self.generate_wellness_recommendations(patient_data),
+                         lambda: self.agenerate_wellness_recommendations(patient_data))
+        assessment.defer("check_up_schedule",
+                         lambda: self.generate_check_up_schedule(patient_data),
+                         lambda: self.agenerate_check_up_schedule(patient_data))
+        return assessment
+    
+    def process_patient_data(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Process patient data and provide wellness recommendations."""
+        return self._build_assessment(patient_data)
+    
+    async def aprocess_patient_data(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Async twin of process_patient_data."""
+        return self._build_assessment(patient_data)
+    
+    def _health_report_prompt(self, patient_data: Dict[str, Any]) -> str:
+        """Build the health report prompt."""
+        return HEALTH_REPORT_PROMPT.render(patient_encoding(patient_data))
     
     def generate_health_report(self, patient_data: Dict[str, Any]) -> str:
         """Generate a comprehensive health report for a patient with normal health status."""
-        report_prompt = f"""
-        Please generate a comprehensive health report for:
-        
-        Patient Information:
-        - Name: {patient_data.get('name', 'Unknown')}
-        - Age: {patient_data.get('age', 'Unknown')}
-        - Gender: {patient_data.get('gender', 'Unknown')}
-        - Vital Signs: {patient_data.get('vital_signs', 'Not available')}
-        
-        This patient has normal health status. Include:
-        1. Current health assessment
-        2. Preventive care recommendations
-        3. Lifestyle optimization suggestions
-        4. Recommended follow-up timeline
-        """
-        
-        return self.process_input(report_prompt)
\ No newline at end of file
+        return self.process_input(self._health_report_prompt(patient_data))
+    
+    async def agenerate_health_report(self, patient_data: Dict[str, Any]) -> str:
+        """Async twin of generate_health_report."""
+        return await self.aprocess_input(self._health_report_prompt(patient_data))
\ No newline at end of file
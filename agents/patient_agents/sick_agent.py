@@ -1,8 +1,73 @@
 from typing import Dict, List, Any, Optional
+import asyncio
+
 from ..base_agent import BaseAgent
+from ..prompts import PromptTemplate, patient_encoding
+from ..schemas import IllnessAssessment, describe_fields, parse_structured
 from langchain_core.language_models import BaseChatModel
 from pydantic import Field
 
+from utils.config import Config
+from utils.dag import run_parallel
+from utils.lazy_result import LazyResult
+from utils.triage_rules import TriageDecision, get_triage_engine
+
+SYMPTOM_ASSESSMENT_PROMPT = PromptTemplate("symptom_assessment", """
+    Assess the following patient symptoms and provide an initial evaluation:
+    {p.profile}
+    
+    Provide:
+    1. Potential causes of these symptoms
+    2. Severity assessment (mild, moderate, severe)
+    3. Recommended next steps
+    """)
+
+SEVERITY_PROMPT = PromptTemplate("doctor_attention", """
+    Determine if immediate doctor attention is required:
+    {p.clinical}
+    
+    Respond with only 'Yes' or 'No' followed by a brief explanation.
+    """)
+
+# Single-call variant of the assessment, doctor attention and care recommendation prompts (STRUCTURED_ASSESSMENTS)
+STRUCTURED_ASSESSMENT_PROMPT = PromptTemplate("structured_illness_assessment", """
+    Assess the following patient symptoms and provide an initial evaluation:
+    {p.profile}
+    
+    Respond with only a JSON object with these fields:
+    {fields}
+    """)
+
+ILLNESS_ASSESSMENT_FIELDS = describe_fields(IllnessAssessment)
+
+# The doctor attention question alone, asked for several patients at once by the classification batcher
+SEVERITY_QUESTION = "For each patient, determine if immediate doctor attention is required."
+
+# Depends only on the symptom list, which keeps it cacheable
+CARE_RECOMMENDATIONS_PROMPT = PromptTemplate("care_recommendations", """
+    Provide home care recommendations for a patient with these symptoms: {p.symptoms}
+    
+    Include:
+    1. Symptom management techniques
+    2. Over-the-counter medication recommendations (if appropriate)
+    3. Rest and hydration guidance
+    4. Warning signs that would require immediate medical attention
+    """)
+
+REFERRAL_PROMPT = PromptTemplate("referral", """
+    Generate an appropriate medical referral for:
+    Patient: {p.demographics}
+    Symptoms: {p.symptoms}
+    History: {p.history}
+    Assessment: {assessment}
+    
+    Specify:
+    1. Type of specialist recommended (if any)
+    2. Urgency of the referral (routine, urgent, emergency)
+    3. Recommended timeframe for appointment
+    4. Any preparations or tests needed before the appointment
+    """)
+
 class SickPatientAgent(BaseAgent):
     """Agent for handling patients with general illness conditions."""
     
@@ -22,100 +87,143 @@ class SickPatientAgent(BaseAgent):
         Prioritize patient safety and ensure timely medical intervention when needed.
         """
     
-    def process_patient_data(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Process patient data and provide illness assessment."""
-        # Extract relevant information
-        symptoms = patient_data.get('symptoms', [])
-        vital_signs = patient_data.get('vital_signs', {})
-        medical_history = patient_data.get('medical_history', [])
-        medications = patient_data.get('medications', [])
-        
-        # Generate symptom assessment
-        assessment_prompt = f"""
-        Please assess the following patient symptoms and provide an initial evaluation:
-        
-        Patient Information:
-        - Age: {patient_data.get('age', 'Unknown')}
-        - Gender: {patient_data.get('gender', 'Unknown')}
-        - Symptoms: {', '.join(symptoms) if symptoms else 'None reported'}
-        - Vital Signs: {vital_signs}
-        - Medical History: {', '.join(medical_history) if medical_history else 'None available'}
-        - Current Medications: {', '.join(medications) if medications else 'None reported'}
-        
-        Provide:
-        1. Potential causes of these symptoms
-        2. Severity assessment (mild, moderate, severe)
-        3. Recommended next steps
-        """
-        
-        symptom_assessment = self.process_input(assessment_prompt)
-        
-        # Determine if doctor attention is required
-        severity_prompt = f"""
-        Based on the following patient information, determine if immediate doctor attention is required:
-        
-        - Age: {patient_data.get('age', 'Unknown')}
-        - Gender: {patient_data.get('gender', 'Unknown')}
-        - Symptoms: {', '.join(symptoms) if symptoms else 'None reported'}
-        - Vital Signs: {vital_signs}
-        - Medical History: {', '.join(medical_history) if medical_history else 'None available'}
-        
-        Respond with only 'Yes' or 'No' followed by a brief explanation.
-        """
-        
-        doctor_attention_response = self.process_input(severity_prompt)
-        requires_doctor = doctor_attention_response.lower().startswith('yes')
-        
+    def _assessment_prompt(self, patient_data: Dict[str, Any]) -> str:
+        """Build the symptom assessment prompt."""
+        return SYMPTOM_ASSESSMENT_PROMPT.render(patient_encoding(patient_data))
+    
+    def _severity_prompt(self, patient_data: Dict[str, Any]) -> str:
+        """Build the Yes/No doctor attention prompt."""
+        return SEVERITY_PROMPT.render(patient_encoding(patient_data))
+    
+    def _decide_doctor_attention(self, patient_data: Dict[str, Any]) -> TriageDecision:
+        """Ask the LLM whether the patient needs immediate doctor attention."""
+        return self._decide(self._severity_prompt(patient_data), SEVERITY_QUESTION,
+                            patient_encoding(patient_data), "doctor_attention")
+    
+    async def _adecide_doctor_attention(self, patient_data: Dict[str, Any]) -> TriageDecision:
+        """Async twin of _decide_doctor_attention."""
+        return await self._adecide(self._severity_prompt(patient_data), SEVERITY_QUESTION,
+                                   patient_encoding(patient_data), "doctor_attention")
+    
+    @staticmethod
+    def _build_assessment(symptom_assessment: str, decision: TriageDecision,
+                          care_recommendations: Optional[str] = None) -> LazyResult:
+        """Assemble the assessment dict consumed by process_patient."""
         # Determine appropriate follow-up interval
-        if requires_doctor:
+        if decision.value:
             follow_up = "24 hours"
         else:
             follow_up = "72 hours"
         
-        return {
+        assessment = LazyResult({
             "patient_status": "sick",
             "symptom_assessment": symptom_assessment,
-            "requires_doctor_attention": requires_doctor,
-            "follow_up_interval": follow_up,
-            "care_recommendations": self._generate_care_recommendations(patient_data)
-        }
+            "requires_doctor_attention": decision.value,
+            "doctor_attention_decision": decision.to_dict(),
+            "follow_up_interval": follow_up
+        })
+        if care_recommendations is not None:
+            assessment["care_recommendations"] = care_recommendations
+        return assessment
     
-    def _generate_care_recommendations(self, patient_data: Dict[str, Any]) -> str:
-        """Generate care recommendations based on patient data."""
-        symptoms = patient_data.get('symptoms', [])
-        
-        care_prompt = f"""
-        Please provide home care recommendations for a patient with the following symptoms:
-        {', '.join(symptoms) if symptoms else 'No specific symptoms reported'}
+    def _defer_care_recommendations(self, assessment: LazyResult, patient_data: Dict[str, Any]) -> LazyResult:
+        """Make the care recommendations a lazy field; only patients who do not need a doctor are shown them."""
+        assessment.defer("care_recommendations",
+                         lambda: self.generate_care_recommendations(patient_data),
+                         lambda: self.agenerate_care_recommendations(patient_data))
+        return assessment
+    
+    def _structured_prompt(self, patient_data: Dict[str, Any]) -> str:
+        """Build the single-call structured assessment prompt."""
+        return STRUCTURED_ASSESSMENT_PROMPT.render(patient_encoding(patient_data), fields=ILLNESS_ASSESSMENT_FIELDS)
+    
+    def _build_structured_assessment(self, patient_data: Dict[str, Any], structured: IllnessAssessment) -> LazyResult:
+        """Assemble the assessment dict from a structured assessment; clear-cut rule decisions still win."""
+        decision = self._rule_decision(patient_data)
+        if decision is None:
+            answer = "Yes" if structured.requires_doctor_attention else "No"
+            decision = TriageDecision(structured.requires_doctor_attention, "llm", f"{answer}. {structured.reason}"[:200])
+        assessment = self._build_assessment(structured.assessment, decision, structured.care_recommendations)
+        assessment["severity"] = structured.severity
+        # The model's follow-up interval only holds if the rules did not overturn its decision
+        if decision.value == structured.requires_doctor_attention:
+            assessment["follow_up_interval"] = structured.follow_up_interval
+        return assessment
+    
+    @staticmethod
+    def _rule_decision(patient_data: Dict[str, Any]) -> Optional[TriageDecision]:
+        """Decide doctor attention locally, or return None when the LLM has to decide."""
+        engine = get_triage_engine()
+        return engine.doctor_attention(patient_data) if engine else None
+    
+    def process_patient_data(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Process patient data and provide illness assessment."""
+        if Config.is_structured_assessments_enabled():
+            # One call for the assessment, the doctor attention decision and the care recommendations
+            response = self.process_input(self._structured_prompt(patient_data), method="structured_assessment")
+            structured = parse_structured(response, IllnessAssessment)
+            if structured is not None:
+                return self._build_structured_assessment(patient_data, structured)
+            print(f"[{self.name}] Could not parse the structured assessment; falling back to separate calls")
+        
+        decision = self._rule_decision(patient_data)
+        
+        if decision is None:
+            # Generate symptom assessment and determine if doctor attention is required;
+            # the two calls are independent, so they run concurrently
+            symptom_assessment, decision = run_parallel(
+                lambda: self.process_input(self._assessment_prompt(patient_data)),
+                lambda: self._decide_doctor_attention(patient_data)
+            )
+        else:
+            # Clear-cut case settled by the rules: skip the Yes/No call
+            symptom_assessment = self.process_input(self._assessment_prompt(patient_data))
         
-        Include:
-        1. Symptom management techniques
-        2. Over-the-counter medication recommendations (if appropriate)
-        3. Rest and hydration guidance
-        4. Warning signs that would require immediate medical attention
-        """
+        # Care recommendations are only generated if they are read
+        return self._defer_care_recommendations(self._build_assessment(symptom_assessment, decision), patient_data)
+    
+    async def aprocess_patient_data(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Async twin of process_patient_data."""
+        if Config.is_structured_assessments_enabled():
+            response = await self.aprocess_input(self._structured_prompt(patient_data), method="structured_assessment")
+            structured = parse_structured(response, IllnessAssessment)
+            if structured is not None:
+                return self._build_structured_assessment(patient_data, structured)
+            print(f"[{self.name}] Could not parse the structured assessment; falling back to separate calls")
+        
+        decision = self._rule_decision(patient_data)
+        
+        if decision is None:
+            symptom_assessment, decision = await asyncio.gather(
+                self.aprocess_input(self._assessment_prompt(patient_data)),
+                self._adecide_doctor_attention(patient_data)
+            )
+        else:
+            symptom_assessment = await self.aprocess_input(self._assessment_prompt(patient_data))
         
-        return self.process_input(care_prompt)
+        return self._defer_care_recommendations(self._build_assessment(symptom_assessment, decision), patient_data)
+    
+    def _care_recommendations_prompt(self, patient_data: Dict[str, Any]) -> str:
+        """Build the home care recommendations prompt."""
+        return CARE_RECOMMENDATIONS_PROMPT.render(patient_encoding(patient_data))
+    
+    def generate_care_recommendations(self, patient_data: Dict[str, Any]) -> str:
+        """Generate care recommendations based on patient data."""
+        # Depends only on the symptom list, so it runs without memory and caches well
+        return self.process_input(self._care_recommendations_prompt(patient_data), use_memory=False, method="care_recommendations")
+    
+    async def agenerate_care_recommendations(self, patient_data: Dict[str, Any]) -> str:
+        """Async twin of generate_care_recommendations."""
+        return await self.aprocess_input(self._care_recommendations_prompt(patient_data), use_memory=False, method="care_recommendations")
+    
+    def _referral_prompt(self, patient_data: Dict[str, Any], assessment: str) -> str:
+        """Build the referral prompt."""
+        return REFERRAL_PROMPT.render(patient_encoding(patient_data), assessment=assessment)
     
     def generate_referral(self, patient_data: Dict[str, Any], assessment: str) -> str:
         """Generate a referral to the appropriate medical professional."""
-        referral_prompt = f"""
-        Based on the following patient information and assessment, generate an appropriate medical referral:
-        
-        Patient Information:
-        - Name: {patient_data.get('name', 'Unknown')}
-        - Age: {patient_data.get('age', 'Unknown')}
-        - Gender: {patient_data.get('gender', 'Unknown')}
-        - Symptoms: {', '.join(patient_data.get('symptoms', [])) if patient_data.get('symptoms') else 'None reported'}
-        - Medical History: {', '.join(patient_data.get('medical_history', [])) if patient_data.get('medical_history') else 'None available'}
-        
-        Assessment: {assessment}
-        
-        Please specify:
-        1. Type of specialist recommended (if any)
-        2. Urgency of the referral (routine, urgent, emergency)
-        3. Recommended timeframe for appointment
-        4. Any preparations or tests needed before the appointment
-        """
-        
-        return self.process_input(referral_prompt)
\ No newline at end of file
+        return self.process_input(self._referral_prompt(patient_data, assessment))
+    
+    async def agenerate_referral(self, patient_data: Dict[str, Any], assessment: str) -> str:
+        """Async twin of generate_referral."""
+        return await self.aprocess_input(self._referral_prompt(patient_data, assessment))
\ No newline at end of file
@@ -0,0 +1,59 @@
+from typing import Dict, List, Any
+import textwrap
+import threading
+
+from utils.patient_encoding import PatientEncoding
+from utils.tokens import estimate_tokens
+
+from .memory import current_session
+
+class PromptTemplate:
+    """Agent prompt compiled once at import time.
+
+    The text is dedented and stripped when the template is defined, since indentation
+    in triple-quoted prompts costs tokens on every call. Placeholders read the patient
+    encoding as `{p.field}`; any other placeholder is passed to render() by name.
+    Every render is counted in the per-template token report.
+    """
+    
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.text = "\n".join(line.rstrip() for line in textwrap.dedent(text).strip().splitlines())
+        _templates[name] = self
+    
+    def render(self, patient: PatientEncoding, **values: Any) -> str:
+        """Fill the template for a patient encoding and extra values."""
+        prompt = self.text.format(p=patient, **values)
+        _record(self.name, estimate_tokens(prompt))
+        return prompt
+
+_templates: Dict[str, PromptTemplate] = {}
+_token_counts: Dict[str, List[int]] = {}
+_stats_lock = threading.Lock()
+
+def _record(name: str, tokens: int):
+    """Count one render of a template."""
+    with _stats_lock:
+        counts = _token_counts.setdefault(name, [0, 0, 0])
+        counts[0] += 1
+        counts[1] += tokens
+        counts[2] = max(counts[2], tokens)
+
+def patient_encoding(patient_data: Dict[str, Any]) -> PatientEncoding:
+    """Get the encoding of a patient, computed once per patient session and shared by all agents."""
+    session = current_session()
+    if session is None:
+        return PatientEncoding(patient_data)
+    return session.encoding_for(patient_data)
+
+def prompt_token_report() -> Dict[str, Dict[str, float]]:
+    """Get renders and estimated prompt tokens (total, mean, max) for every template used so far."""
+    with _stats_lock:
+        return {
+            name: {"renders": renders, "tokens": tokens, "mean": tokens / renders, "max": largest}
+            for name, (renders, tokens, largest) in sorted(_token_counts.items())
+        }
+
+def get_templates() -> Dict[str, PromptTemplate]:
+    """Get every defined template by name."""
+    return dict(_templates)
\ No newline at end of file
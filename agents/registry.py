@@ -0,0 +1,40 @@
+from typing import Dict, Any, Callable, Iterator
+from collections.abc import Mapping
+import threading
+
+from .base_agent import BaseAgent
+
+class AgentRegistry(Mapping):
+    """Read-only mapping of agent names to agents that builds each agent on first access.
+
+    Building an agent also creates its LLM client, so a batch without cardiac patients
+    never pays for the cardiac agents. Use built() to inspect only the agents created so far.
+    """
+    
+    def __init__(self, factories: Dict[str, Callable[[], BaseAgent]]):
+        self._factories = dict(factories)
+        self._agents: Dict[str, BaseAgent] = {}
+        self._lock = threading.Lock()
+    
+    def __getitem__(self, name: str) -> BaseAgent:
+        agent = self._agents.get(name)
+        if agent is not None:
+            return agent
+        if name not in self._factories:
+            raise KeyError(name)
+        with self._lock:
+            # Another thread may have built it while we waited for the lock
+            if name not in self._agents:
+                self._agents[name] = self._factories[name]()
+            return self._agents[name]
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._factories)
+    
+    def __len__(self) -> int:
+        return len(self._factories)
+    
+    def built(self) -> Dict[str, BaseAgent]:
+        """Get the agents that have been built so far, without building the rest."""
+        with self._lock:
+            return dict(self._agents)
\ No newline at end of file
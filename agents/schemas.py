@@ -0,0 +1,47 @@
+from typing import Optional, Literal, Type, TypeVar, get_args
+
+from pydantic import BaseModel, Field, ValidationError
+
+Schema = TypeVar("Schema", bound=BaseModel)
+
+class CardiacAssessment(BaseModel):
+    """Structured answer of the single-call cardiac assessment."""
+    
+    risk_level: Literal["low", "moderate", "high", "critical"] = Field(..., description="Cardiac risk level")
+    assessment: str = Field(..., description="Potential conditions and immediate actions")
+    is_emergency: bool = Field(..., description="Whether the patient needs emergency services now")
+    reason: str = Field(..., description="One sentence explaining the emergency decision")
+    emergency_instructions: str = Field(default="", description="Step-by-step instructions until emergency services arrive; empty if not an emergency")
+    follow_up_interval: str = Field(..., description="When the patient must be seen next, e.g. 'immediate' or '24 hours'")
+
+class IllnessAssessment(BaseModel):
+    """Structured answer of the single-call illness assessment."""
+    
+    severity: Literal["mild", "moderate", "severe"] = Field(..., description="Severity of the illness")
+    assessment: str = Field(..., description="Potential causes of the symptoms and recommended next steps")
+    requires_doctor_attention: bool = Field(..., description="Whether immediate doctor attention is required")
+    reason: str = Field(..., description="One sentence explaining the doctor attention decision")
+    care_recommendations: str = Field(..., description="Home care: symptom management, OTC medication, rest and hydration, warning signs")
+    follow_up_interval: str = Field(..., description="When the patient must be seen next, e.g. '24 hours' or '72 hours'")
+
+def describe_fields(schema: Type[BaseModel]) -> str:
+    """List a schema's fields for a prompt, one '- name (type): description' line each."""
+    lines = []
+    for name, field in schema.model_fields.items():
+        choices = get_args(field.annotation)
+        if choices:
+            kind = "|".join(choices)
+        else:
+            kind = "true|false" if field.annotation is bool else "text"
+        lines.append(f"- {name} ({kind}): {field.description}")
+    return "\n".join(lines)
+
+def parse_structured(response: str, schema: Type[Schema]) -> Optional[Schema]:
+    """Parse the JSON object in a response into a schema, or return None if it is missing or invalid."""
+    start, end = response.find("{"), response.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        return schema.model_validate_json(response[start:end + 1])
+    except ValidationError:
+        return None
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""Report the estimated input tokens of every agent prompt.
+
+Usage:
+    python benchmarks/prompt_tokens.py
+
+Renders each prompt of every agent for the sample patients (without calling a
+model) and prints the renders and estimated tokens per prompt template.
+"""
+import os
+import sys
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main(argv: Optional[List[str]] = None):
+    """Render every prompt for the sample patients and print the token report."""
+    os.environ["LLM_BACKEND"] = "simulated"
+    
+    import main as app
+    from agents.memory import patient_session
+    from agents.prompts import prompt_token_report
+    from data.patient_records import get_all_sample_patients
+    
+    agents = app.initialize_agents()
+    doctor, heart, sick, normal = agents["doctor"], agents["heart_agent"], agents["sick_agent"], agents["normal_agent"]
+    diagnosis = "Suspected acute coronary syndrome."
+    for patient_data in get_all_sample_patients().values():
+        with patient_session(patient_data["name"]):
+            # Rendering counts each prompt in the token report
+            doctor._analysis_prompt(patient_data)
+            doctor._treatment_plan_prompt(patient_data, diagnosis)
+            heart._assessment_prompt(patient_data)
+            heart._emergency_prompt(patient_data)
+            heart._instructions_prompt(patient_data)
+            heart._care_plan_prompt(patient_data, diagnosis)
+            heart._emergency_response_prompt(patient_data)
+            sick._assessment_prompt(patient_data)
+            sick._severity_prompt(patient_data)
+            sick._care_recommendations_prompt(patient_data)
+            sick._referral_prompt(patient_data, diagnosis)
+            normal._wellness_prompt(patient_data)
+            normal._schedule_prompt(patient_data)
+            normal._health_report_prompt(patient_data)
+    
+    report = prompt_token_report()
+    print(f"{'prompt':<24} {'renders':>8} {'mean':>8} {'max':>8}")
+    for name, stats in report.items():
+        print(f"{name:<24} {stats['renders']:>8} {stats['mean']:>8.1f} {stats['max']:>8}")
+    total = sum(stats["tokens"] for stats in report.values())
+    renders = sum(stats["renders"] for stats in report.values())
+    print(f"{'all prompts':<24} {renders:>8} {total / renders:>8.1f}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
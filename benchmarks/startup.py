@@ -0,0 +1,50 @@
+"""Benchmark cold-start time of the CLI.
+
+Usage:
+    python benchmarks/startup.py --runs 5
+
+Each measurement runs in a fresh interpreter, so module imports are paid every time,
+as they are on a short CLI run or a serverless invocation. Uses the simulated backend
+unless --backend groq is given (which needs API keys but makes no requests).
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each snippet prints the seconds from interpreter start-up to the end of the step
+STEPS: Dict[str, str] = {
+    "import main": "import main",
+    "register agents": "import main; main.initialize_agents()",
+    "build one agent": "import main; main.initialize_agents()['normal_agent']",
+    "build all agents": "import main; agents = main.initialize_agents(); [agents[name] for name in agents]"
+}
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per step")
+    parser.add_argument("--backend", default="simulated", choices=["simulated", "groq"], help="LLM backend to build")
+    return parser.parse_args(argv)
+
+def measure(snippet: str, backend: str) -> float:
+    """Run a snippet in a fresh interpreter and return its wall time in seconds."""
+    code = f"import time; start = time.perf_counter(); {snippet}; print(time.perf_counter() - start)"
+    env = dict(os.environ, LLM_BACKEND=backend)
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def main(argv: Optional[List[str]] = None):
+    """Run every step in fresh interpreters and print the median and worst times."""
+    args = parse_args(argv)
+    print(f"{'step':<20} {'median':>8} {'max':>8}  ({args.runs} runs, {args.backend} backend)")
+    for name, snippet in STEPS.items():
+        timings = [measure(snippet, args.backend) for _ in range(args.runs)]
+        print(f"{name:<20} {statistics.median(timings):>8.3f} {max(timings):>8.3f}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""Benchmark patient throughput against the offline simulated LLM backend.
+
+Usage:
+    python benchmarks/throughput.py --patients 200 --workers 16 --latency-ms 300
+
+No API keys are needed. Caches are disabled unless --with-cache is given, so every
+patient pays for its LLM calls.
+"""
+import os
+import sys
+import argparse
+import asyncio
+import tempfile
+import time
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Simulated-backend throughput benchmark")
+    parser.add_argument("--patients", type=int, default=100, help="Number of synthetic patients to process")
+    parser.add_argument("--workers", type=int, default=None, help="Patients in flight (defaults to MAX_CONCURRENCY)")
+    parser.add_argument("--latency-ms", type=float, default=None, help="Median simulated latency")
+    parser.add_argument("--tokens-per-minute", type=int, default=None, help="Simulated server-side TPM limit")
+    parser.add_argument("--error-rate", type=float, default=None, help="Fraction of calls failing with a random 429")
+    parser.add_argument("--client-rpm", type=int, default=6000,
+                        help="Client-side requests-per-minute limit (GROQ_REQUESTS_PER_MINUTE)")
+    parser.add_argument("--client-tpm", type=int, default=10000000,
+                        help="Client-side tokens-per-minute limit (GROQ_TOKENS_PER_MINUTE)")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the response and semantic caches enabled")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    """Run the benchmark and print patients per second."""
+    args = parse_args(argv)
+    os.environ["LLM_BACKEND"] = "simulated"
+    overrides = {
+        "SIMULATED_LATENCY_MS": args.latency_ms,
+        "SIMULATED_TOKENS_PER_MINUTE": args.tokens_per_minute,
+        "SIMULATED_ERROR_RATE": args.error_rate,
+        "GROQ_REQUESTS_PER_MINUTE": args.client_rpm,
+        "GROQ_TOKENS_PER_MINUTE": args.client_tpm
+    }
+    for name, value in overrides.items():
+        if value is not None:
+            os.environ[name] = str(value)
+    if not args.with_cache:
+        os.environ["CACHE_ENABLED"] = "False"
+        os.environ["SEMANTIC_CACHE_ENABLED"] = "False"
+    
+    import main as app
+    from data.patient_records import get_all_sample_patients
+    
+    samples = list(get_all_sample_patients().values())
+    patients = []
+    for i in range(args.patients):
+        patient_data = dict(samples[i % len(samples)])
+        patient_data["name"] = f"{patient_data['name']} {i}"
+        patients.append(patient_data)
+    
+    agents = app.initialize_agents()
+    with tempfile.TemporaryDirectory() as output_dir:
+        start_time = time.perf_counter()
+        processed = asyncio.run(app.process_patients_concurrently(patients, agents, args.workers, output_dir))
+        elapsed = time.perf_counter() - start_time
+        app.close_report_writers()
+    
+    calls = sum({id(agent.llm): agent.llm.calls for agent in agents.built().values()}.values())
+    print(f"\nProcessed {processed} patients in {elapsed:.2f}s "
+          f"({processed / elapsed:.2f} patients/s, {calls} LLM calls, {calls / elapsed:.1f} calls/s)")
+    app.print_trace_summary()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
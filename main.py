@@ -1,22 +1,37 @@
 import os
 import sys
-from typing import Dict, List, Any, Optional
+import argparse
+import asyncio
+from typing import Dict, List, Any, Optional, Iterable, AsyncIterable, Mapping, Union
+import multiprocessing
+import queue
 import threading
-import random
-
-from langchain_groq import ChatGroq
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 import time
-import markdown
+from contextlib import contextmanager, nullcontext
 
 from agents.base_agent import BaseAgent
+from agents.memory import patient_session
 from agents.doctor_agent import DoctorAgent
 from agents.patient_agents.normal_agent import NormalPatientAgent
 from agents.patient_agents.sick_agent import SickPatientAgent
 from agents.patient_agents.heart_agent import HeartPatientAgent
+from agents.registry import AgentRegistry
+from agents.prompts import prompt_token_report
+from agents.batching import get_classification_batcher
 
 from utils.config import Config
 from utils.data_processor import DataProcessor
+from utils.dag import Stage, StageGraph
+from utils.llm_cache import get_response_cache
+from utils.semantic_cache import get_semantic_cache
+from utils.single_flight import get_single_flight
+from utils.resilience import get_hedge_stats
+from utils.tracing import get_tracer
+from utils.streaming import ConsoleSink, ReportSink, active_sinks, streaming_to
+from utils.report_writer import PatientReport, ReportWriter, get_report_writer, close_report_writers, forward_reports_to
+from utils.job_store import Job, JobStore, get_job_store
+from utils.lazy_result import LazyResult, lazy_field_report
+from utils.priority import PatientQueue, Ticket, current_ticket, get_slo_tracker, scheduled
 from data.patient_records import get_sample_patient, get_all_sample_patients
 
 def initialize_llm(agent_name=None):
@@ -27,90 +42,102 @@ def initialize_llm(agent_name=None):
                    This helps with debugging and logging
     """
     try:
-        # Get a Groq API key - the Config class will alternate between available keys
-        api_key = Config.get_groq_api_key()
-        model_name = Config.get_model_name()
-        
-        # Add a small random delay (0-1 seconds) to avoid simultaneous API calls
-        time.sleep(random.uniform(0, 1))
+        if Config.get_llm_backend() == "simulated":
+            # Offline stand-in for load tests and CI; needs no API keys
+            from utils.simulated_llm import SimulatedChatModel
+            llm = SimulatedChatModel.from_config()
+            if Config.is_debug_mode():
+                agent_str = f" for {agent_name}" if agent_name else ""
+                print(f"Initialized simulated LLM{agent_str}")
+            return llm
         
-        llm = ChatGroq(
-            groq_api_key=api_key,
-            model_name=model_name
-        )
+        # Every request leases the healthy key with the most headroom from the shared pool and
+        # goes through the process-wide keep-alive connection pool; agents share one model
+        # wrapper (system prompts live on the agents) and the Groq SDK is only imported once
+        # a request is made
+        from utils.llm_factory import get_pooled_chat_model, is_http2_available
+        llm = get_pooled_chat_model()
+        model_name = llm.model_name
         
         if Config.is_debug_mode():
             agent_str = f" for {agent_name}" if agent_name else ""
-            print(f"Initialized LLM{agent_str} with model: {model_name}")
+            protocol = "HTTP/2" if is_http2_available() else "HTTP/1.1"
+            print(f"Initialized LLM{agent_str} with model: {model_name} (shared {protocol} connection pool)")
         
         return llm
     except Exception as e:
         print(f"Error initializing language model: {e}")
         sys.exit(1)
 
-def initialize_agents():
-    """Initialize all agents in the system with separate LLM instances."""
+def initialize_agents() -> AgentRegistry:
+    """Register all agents in the system; each is built with its own LLM instance on first use."""
     # Create doctor agent with its own LLM instance
-    doctor = DoctorAgent(
-        name="Dr. Sarah Chen",
-        role="Primary Care Physician",
-        llm=initialize_llm("doctor"),
-        system_prompt="",  # Will be set in initialize method
-        specialization="Internal Medicine",
-        experience_years=15
-    )
+    def doctor():
+        return DoctorAgent(
+            name="Dr. Sarah Chen",
+            role="Primary Care Physician",
+            llm=initialize_llm("doctor"),
+            system_prompt="",  # Will be set in initialize method
+            specialization="Internal Medicine",
+            experience_years=15
+        )
     
     # Create specialist doctor agent with its own LLM instance
-    cardiologist = DoctorAgent(
-        name="Dr. James Wilson",
-        role="Cardiology Specialist",
-        llm=initialize_llm("cardiologist"),
-        system_prompt="",  # Will be set in initialize method
-        specialization="Cardiology",
-        experience_years=20
-    )
+    def cardiologist():
+        return DoctorAgent(
+            name="Dr. James Wilson",
+            role="Cardiology Specialist",
+            llm=initialize_llm("cardiologist"),
+            system_prompt="",  # Will be set in initialize method
+            specialization="Cardiology",
+            experience_years=20
+        )
     
     # Create patient agents with their own LLM instances
-    normal_agent = NormalPatientAgent(
-        name="Wellness Assistant",
-        role="Normal Patient Handler",
-        llm=initialize_llm("normal_agent"),
-        system_prompt=""  # Will be set in initialize method
-    )
-    
-    sick_agent = SickPatientAgent(
-        name="Illness Assistant",
-        role="Sick Patient Handler",
-        llm=initialize_llm("sick_agent"),
-        system_prompt=""  # Will be set in initialize method
-    )
-    
-    heart_agent = HeartPatientAgent(
-        name="Cardiac Assistant",
-        role="Heart Patient Handler",
-        llm=initialize_llm("heart_agent"),
-        system_prompt=""  # Will be set in initialize method
-    )
-    
-    return {
+    def normal_agent():
+        return NormalPatientAgent(
+            name="Wellness Assistant",
+            role="Normal Patient Handler",
+            llm=initialize_llm("normal_agent"),
+            system_prompt=""  # Will be set in initialize method
+        )
+    
+    def sick_agent():
+        return SickPatientAgent(
+            name="Illness Assistant",
+            role="Sick Patient Handler",
+            llm=initialize_llm("sick_agent"),
+            system_prompt="",  # Will be set in initialize method
+            cache_responses=True,  # Care recommendations depend only on the symptom list
+            semantic_cache_thresholds={"care_recommendations": 0.995}
+        )
+    
+    def heart_agent():
+        return HeartPatientAgent(
+            name="Cardiac Assistant",
+            role="Heart Patient Handler",
+            llm=initialize_llm("heart_agent"),
+            system_prompt="",  # Will be set in initialize method
+            # Emergency guidance must arrive quickly: race a second key when a call is slow
+            hedged_methods=["emergency_instructions", "coordinate_emergency_response"],
+            call_deadlines={"emergency_instructions": 20.0, "coordinate_emergency_response": 20.0}
+        )
+    
+    return AgentRegistry({
         "doctor": doctor,
         "cardiologist": cardiologist,
         "normal_agent": normal_agent,
         "sick_agent": sick_agent,
         "heart_agent": heart_agent
-    }
+    })
 
-def process_patient(patient_data: Dict[str, Any], agents: Dict[str, BaseAgent]):
-    """Process a patient through the appropriate agent workflow and save results to markdown."""
-    # Create output directory if it doesn't exist
-    output_dir = os.path.join(os.getcwd(), "output")
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    # Create a markdown file for this patient
-    patient_name = patient_data['name'].replace(" ", "_")
-    markdown_file = os.path.join(output_dir, f"{patient_name}.md")
+def _start_report(patient_data: Dict[str, Any], report: PatientReport) -> Optional[str]:
+    """Validate and categorize a patient and write the report header.
     
+    Returns:
+        The patient category, or None when the patient data is invalid, in which
+        case the error section has already been written.
+    """
     # Initialize markdown content
     markdown_content = f"# Patient Report: {patient_data['name']}\n\n"
     
@@ -123,9 +150,9 @@ def process_patient(patient_data: Dict[str, Any], agents: Dict[str, BaseAgent]):
         error_msg = "Error: Invalid patient data. Missing required fields."
         print(error_msg)
         markdown_content += f"## Error\n\n{error_msg}\n\n"
-        with open(markdown_file, 'w') as f:
-            f.write(markdown_content)
-        return
+        report.append(markdown_content)
+        report.status = "invalid"
+        return None
     
     # Categorize patient
     patient_category = DataProcessor.categorize_patient(patient_data)
@@ -156,126 +183,739 @@ def process_patient(patient_data: Dict[str, Any], agents: Dict[str, BaseAgent]):
         for history in patient_data['medical_history']:
             markdown_content += f"- {history}\n"
     
-    # Select appropriate agent based on patient category
+    report.append(markdown_content)
+    report.record(category=patient_category)
+    return patient_category
+
+def _select_agents(patient_category: str, agents: Mapping[str, BaseAgent]):
+    """Select the primary agent and specialist for a patient category."""
     if patient_category == 'cardiac':
-        primary_agent = agents['heart_agent']
-        specialist = agents['cardiologist']
+        return agents['heart_agent'], agents['cardiologist']
     elif patient_category == 'sick':
-        primary_agent = agents['sick_agent']
-        specialist = agents['doctor']
+        return agents['sick_agent'], agents['doctor']
     else:  # normal
-        primary_agent = agents['normal_agent']
-        specialist = agents['doctor']
+        return agents['normal_agent'], agents['doctor']
+
+def build_patient_graph(patient_data: Dict[str, Any], patient_category: str,
+                        primary_agent: BaseAgent, specialist: BaseAgent) -> StageGraph:
+    """Express the patient workflow as a graph of stages with declared inputs.
+    
+    Each stage waits only for the results it uses, so independent LLM calls run
+    concurrently. Cardiac patients are always escalated to the cardiologist, so the
+    specialist's analysis starts alongside the heart agent's assessment instead of after it.
+    """
+    is_cardiac = patient_category == 'cardiac'
+    stages = [
+        Stage("assessment",
+              lambda results: primary_agent.process_patient_data(patient_data),
+              arun=lambda results: primary_agent.aprocess_patient_data(patient_data))
+    ]
+    
+    if is_cardiac:
+        stages.append(Stage(
+            "emergency_response",
+            lambda results: primary_agent.coordinate_emergency_response(patient_data),
+            inputs=["assessment"],
+            condition=lambda results: results["assessment"].get('is_emergency', False),
+            arun=lambda results: primary_agent.acoordinate_emergency_response(patient_data)
+        ))
+    
+    stages.append(Stage(
+        "doctor_assessment",
+        lambda results: specialist.analyze_patient_data(patient_data),
+        inputs=[] if is_cardiac else ["assessment"],
+        condition=None if is_cardiac else lambda results: results["assessment"].get('requires_doctor_attention', False),
+        arun=lambda results: specialist.aanalyze_patient_data(patient_data)
+    ))
+    stages.append(Stage(
+        "treatment_plan",
+        lambda results: specialist.create_treatment_plan(patient_data, results["doctor_assessment"]),
+        inputs=["doctor_assessment"],
+        arun=lambda results: specialist.acreate_treatment_plan(patient_data, results["doctor_assessment"])
+    ))
+    
+    if is_cardiac:
+        stages.append(Stage(
+            "cardiac_care_plan",
+            lambda results: primary_agent.generate_cardiac_care_plan(patient_data, results["doctor_assessment"]),
+            inputs=["doctor_assessment"],
+            arun=lambda results: primary_agent.agenerate_cardiac_care_plan(patient_data, results["doctor_assessment"])
+        ))
+    elif patient_category == 'sick':
+        # The care recommendations are a lazy field of the assessment; this stage only reads
+        # (and so generates) them for patients who stay on the self-care path
+        def care_recommendations(results: Dict[str, Any]) -> str:
+            return results["assessment"].get('care_recommendations') or primary_agent.generate_care_recommendations(patient_data)
+        
+        async def acare_recommendations(results: Dict[str, Any]) -> str:
+            assessment = results["assessment"]
+            if isinstance(assessment, LazyResult):
+                text = await assessment.aget('care_recommendations')
+            else:
+                # Restored from a checkpoint taken before the field was read
+                text = assessment.get('care_recommendations')
+            return text or await primary_agent.agenerate_care_recommendations(patient_data)
+        
+        stages.append(Stage(
+            "care_recommendations",
+            care_recommendations,
+            inputs=["assessment"],
+            condition=lambda results: not results["assessment"].get('requires_doctor_attention', False),
+            arun=acare_recommendations
+        ))
+    elif patient_category == 'normal':
+        stages.append(Stage(
+            "health_report",
+            lambda results: primary_agent.generate_health_report(patient_data),
+            inputs=["assessment"],
+            condition=lambda results: not results["assessment"].get('requires_doctor_attention', False),
+            arun=lambda results: primary_agent.agenerate_health_report(patient_data)
+        ))
     
-    # Process patient data with appropriate agent
-    print(f"Primary agent: {primary_agent.name} ({primary_agent.role})")
-    agent_assessment = primary_agent.process_patient_data(patient_data)
+    return StageGraph(stages)
+
+class _ReportSections:
+    """Prints and renders report sections in their fixed order as soon as the stages they show have settled."""
     
-    print("\nAgent Assessment:")
-    print(f"Status: {agent_assessment.get('patient_status', 'Unknown')}")
-    print(f"Requires doctor attention: {agent_assessment.get('requires_doctor_attention', False)}")
-    print(f"Follow-up interval: {agent_assessment.get('follow_up_interval', 'Unknown')}")
+    def __init__(self, graph: StageGraph, patient_category: str, specialist: BaseAgent, report: PatientReport):
+        self.graph = graph
+        self.report = report
+        self.patient_category = patient_category
+        self.specialist = specialist
+        # Agent responses already printed token by token are not printed again
+        self.streamed_to_console = any(isinstance(sink, ConsoleSink) for sink in active_sinks())
+        self.settled = set()
+        self.sections = [
+            (["assessment"], self._assessment),
+            (["assessment", "emergency_response"], self._emergency),
+            (["doctor_assessment"], self._consultation),
+            (["treatment_plan"], self._treatment_plan),
+            (["cardiac_care_plan"], self._cardiac_care_plan),
+            (["assessment", "health_report", "care_recommendations"], self._self_care)
+        ]
     
-    markdown_content += f"\n## Agent Assessment\n\n"
-    markdown_content += f"- **Status**: {agent_assessment.get('patient_status', 'Unknown')}\n"
-    markdown_content += f"- **Requires doctor attention**: {agent_assessment.get('requires_doctor_attention', False)}\n"
-    markdown_content += f"- **Follow-up interval**: {agent_assessment.get('follow_up_interval', 'Unknown')}\n"
+    def on_settled(self, name: str, results: Dict[str, Any]):
+        """Record a settled stage and emit every section that is now complete."""
+        self.settled.add(name)
+        ticket = current_ticket()
+        if name == "assessment" and ticket is not None:
+            # The assessment holds any emergency instructions; the class SLO is measured up to here
+            ticket.mark_assessed()
+        while self.sections:
+            stage_names, render = self.sections[0]
+            if not all(stage in self.settled or stage not in self.graph.stages for stage in stage_names):
+                break
+            self.sections.pop(0)
+            self.report.append(render(results))
     
-    # If emergency cardiac case, show emergency instructions
-    if patient_category == 'cardiac' and agent_assessment.get('is_emergency', False):
+    def _echo(self, title: str, text: str):
+        """Print an agent response under a title, unless it was already streamed to the console."""
+        print(f"\n{title}:")
+        print("(streamed above)" if self.streamed_to_console else text)
+    
+    def _assessment(self, results: Dict[str, Any]) -> str:
+        agent_assessment = results["assessment"]
+        print("\nAgent Assessment:")
+        print(f"Status: {agent_assessment.get('patient_status', 'Unknown')}")
+        print(f"Requires doctor attention: {agent_assessment.get('requires_doctor_attention', False)}")
+        print(f"Follow-up interval: {agent_assessment.get('follow_up_interval', 'Unknown')}")
+        
+        markdown_content = f"\n## Agent Assessment\n\n"
+        markdown_content += f"- **Status**: {agent_assessment.get('patient_status', 'Unknown')}\n"
+        markdown_content += f"- **Requires doctor attention**: {agent_assessment.get('requires_doctor_attention', False)}\n"
+        markdown_content += f"- **Follow-up interval**: {agent_assessment.get('follow_up_interval', 'Unknown')}\n"
+        
+        # Show whether the triage decision came from the local rules or the LLM
+        decision = agent_assessment.get('emergency_decision') or agent_assessment.get('doctor_attention_decision')
+        if decision:
+            print(f"Triage decision: {decision['source']} ({decision['reason']})")
+            markdown_content += f"- **Triage decision**: {decision['source']} ({decision['reason']})\n"
+        return markdown_content
+    
+    def _emergency(self, results: Dict[str, Any]) -> str:
+        # If emergency cardiac case, show emergency instructions
+        if "emergency_response" not in results:
+            return ""
+        agent_assessment = results["assessment"]
         print("\n⚠️ EMERGENCY CARDIAC SITUATION DETECTED ⚠️")
-        print("\nEmergency Instructions:")
-        print(agent_assessment.get('emergency_instructions', 'Seek immediate medical attention'))
+        self._echo("Emergency Instructions", agent_assessment.get('emergency_instructions', 'Seek immediate medical attention'))
         
-        markdown_content += "\n### ⚠️ EMERGENCY CARDIAC SITUATION DETECTED ⚠️\n\n"
+        markdown_content = "\n### ⚠️ EMERGENCY CARDIAC SITUATION DETECTED ⚠️\n\n"
         markdown_content += "**Emergency Instructions:**\n\n"
         markdown_content += agent_assessment.get('emergency_instructions', 'Seek immediate medical attention') + "\n\n"
         
-        # Coordinate emergency response
-        print("\nCoordinating emergency response...")
-        emergency_response = primary_agent.coordinate_emergency_response(patient_data)
-        print(emergency_response)
-        markdown_content += f"**Emergency Response:**\n\n{emergency_response}\n\n"
-    
-    # If doctor attention required, consult with specialist
-    if agent_assessment.get('requires_doctor_attention', False):
+        self._echo("Emergency response coordination", results["emergency_response"])
+        markdown_content += f"**Emergency Response:**\n\n{results['emergency_response']}\n\n"
+        return markdown_content
+    
+    def _consultation(self, results: Dict[str, Any]) -> str:
+        # If doctor attention required, the specialist has analyzed the patient
+        if "doctor_assessment" not in results:
+            return ""
+        specialist = self.specialist
         print(f"\nConsulting with specialist: {specialist.name} ({specialist.specialization})")
-        markdown_content += f"\n## Specialist Consultation\n\n"
+        markdown_content = f"\n## Specialist Consultation\n\n"
         markdown_content += f"Consulting with: **{specialist.name}** ({specialist.specialization})\n\n"
         
-        # Doctor analyzes patient data
-        doctor_assessment = specialist.analyze_patient_data(patient_data)
-        print("\nDoctor Assessment:")
-        print(doctor_assessment)
-        markdown_content += f"### Doctor Assessment\n\n{doctor_assessment}\n\n"
-        
-        # Create treatment plan
-        print("\nGenerating treatment plan...")
-        treatment_plan = specialist.create_treatment_plan(patient_data, doctor_assessment)
-        print("\nTreatment Plan:")
-        print(treatment_plan)
-        markdown_content += f"### Treatment Plan\n\n{treatment_plan}\n\n"
-        
-        # For cardiac patients, create specialized cardiac care plan
-        if patient_category == 'cardiac':
-            print("\nGenerating specialized cardiac care plan...")
-            cardiac_plan = primary_agent.generate_cardiac_care_plan(patient_data, doctor_assessment)
-            print("\nCardiac Care Plan:")
-            print(cardiac_plan)
-            markdown_content += f"### Cardiac Care Plan\n\n{cardiac_plan}\n\n"
-    else:
-        # For normal patients, generate health report
-        if patient_category == 'normal':
-            print("\nGenerating health report...")
-            health_report = primary_agent.generate_health_report(patient_data)
-            print("\nHealth Report:")
-            print(health_report)
-            markdown_content += f"## Health Report\n\n{health_report}\n\n"
-        # For sick patients not requiring immediate doctor attention
-        elif patient_category == 'sick':
-            print("\nGenerating care recommendations...")
-            care_recommendations = agent_assessment.get('care_recommendations', 'No specific recommendations available')
-            print("\nCare Recommendations:")
-            print(care_recommendations)
-            markdown_content += f"## Care Recommendations\n\n{care_recommendations}\n\n"
+        self._echo("Doctor Assessment", results["doctor_assessment"])
+        markdown_content += f"### Doctor Assessment\n\n{results['doctor_assessment']}\n\n"
+        return markdown_content
+    
+    def _treatment_plan(self, results: Dict[str, Any]) -> str:
+        if "treatment_plan" not in results:
+            return ""
+        self._echo("Treatment Plan", results["treatment_plan"])
+        return f"### Treatment Plan\n\n{results['treatment_plan']}\n\n"
     
-    # Save markdown content to file
-    with open(markdown_file, 'w', encoding='utf-8') as f:
-        f.write(markdown_content)
+    def _cardiac_care_plan(self, results: Dict[str, Any]) -> str:
+        # For cardiac patients, the specialized cardiac care plan
+        if "cardiac_care_plan" not in results:
+            return ""
+        self._echo("Cardiac Care Plan", results["cardiac_care_plan"])
+        return f"### Cardiac Care Plan\n\n{results['cardiac_care_plan']}\n\n"
     
+    def _self_care(self, results: Dict[str, Any]) -> str:
+        agent_assessment = results["assessment"]
+        if agent_assessment.get('requires_doctor_attention', False):
+            return ""
+        # For normal patients, the health report
+        if "health_report" in results:
+            self._echo("Health Report", results["health_report"])
+            return f"## Health Report\n\n{results['health_report']}\n\n"
+        # For sick patients not requiring immediate doctor attention
+        if self.patient_category == 'sick':
+            care_recommendations = results.get("care_recommendations") or 'No specific recommendations available'
+            self._echo("Care Recommendations", care_recommendations)
+            return f"## Care Recommendations\n\n{care_recommendations}\n\n"
+        return ""
+
+def _settle_lazy_fields(results: Dict[str, Any]):
+    """Drop the lazy assessment fields nobody read once the workflow is done, so they are never generated."""
+    agent_assessment = results.get("assessment")
+    if isinstance(agent_assessment, LazyResult):
+        agent_assessment.settle()
+
+def _assessment_fields(results: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the structured assessment fields of a finished workflow for the machine-readable results."""
+    agent_assessment = results.get("assessment", {})
+    decision = agent_assessment.get('emergency_decision') or agent_assessment.get('doctor_attention_decision') or {}
+    fields = {
+        "patient_status": agent_assessment.get('patient_status'),
+        "requires_doctor_attention": agent_assessment.get('requires_doctor_attention', False),
+        "is_emergency": agent_assessment.get('is_emergency', False),
+        "follow_up_interval": agent_assessment.get('follow_up_interval'),
+        "triage_source": decision.get('source'),
+        "triage_reason": decision.get('reason')
+    }
+    for key in ('risk_level', 'severity', 'emergency_instructions', 'care_recommendations', 'wellness_recommendations',
+                'check_up_schedule'):
+        if agent_assessment.get(key):
+            fields[key] = agent_assessment[key]
+    for stage in ('care_recommendations', 'emergency_response', 'doctor_assessment', 'treatment_plan', 'cardiac_care_plan',
+                  'health_report'):
+        if stage in results:
+            fields[stage] = results[stage]
+    return fields
+
+def _print_completion(patient_data: Dict[str, Any], report: PatientReport):
+    """Print where the finished report was saved."""
     print(f"\n{'='*50}")
     print(f"Completed processing for patient: {patient_data['name']}")
-    print(f"Report saved to: {markdown_file}")
+    print(f"Report saved to: {report.path}")
     print(f"{'='*50}\n")
 
-def main():
+@contextmanager
+def _stream_report(report: PatientReport):
+    """While streaming, also stream agent responses into the report's live file until the report is complete."""
+    if not active_sinks():
+        yield
+        return
+    with streaming_to(ReportSink(report.live_path)):
+        yield
+
+def process_patient(patient_data: Dict[str, Any], agents: Mapping[str, BaseAgent], output_dir: Optional[str] = None,
+                    job: Optional[Job] = None) -> List[str]:
+    """Process a patient through the appropriate agent workflow and save results to markdown.
+    
+    With a job from the job store, every completed stage is checkpointed and stages
+    checkpointed by an earlier attempt are restored instead of run again.
+    
+    Returns:
+        The stages that fell back to the apology text instead of a model response
+        (they are not checkpointed)
+    """
+    # Agent memory is scoped to this patient and reset once processing finishes; each stage
+    # sees the exchanges of the stages it depends on (see PatientSession)
+    with patient_session(patient_data.get('name', 'Unknown')), get_tracer().span("patient", kind="patient"):
+        return _run_patient_workflow(patient_data, agents, output_dir, job)
+
+def _run_patient_workflow(patient_data: Dict[str, Any], agents: Mapping[str, BaseAgent], output_dir: Optional[str] = None,
+                          job: Optional[Job] = None) -> List[str]:
+    """Run the agent workflow for a patient inside the active patient session."""
+    degraded = []
+    with get_report_writer(output_dir).open(patient_data) as report:
+        patient_category = _start_report(patient_data, report)
+        if patient_category is not None:
+            # Select appropriate agent based on patient category
+            primary_agent, specialist = _select_agents(patient_category, agents)
+            print(f"Primary agent: {primary_agent.name} ({primary_agent.role})")
+            
+            # Run the workflow stages, appending report sections in order as they complete
+            graph = build_patient_graph(patient_data, patient_category, primary_agent, specialist)
+            sections = _ReportSections(graph, patient_category, specialist, report)
+            with _stream_report(report):
+                results = graph.run(on_settled=sections.on_settled, checkpoint=job)
+            _settle_lazy_fields(results)
+            report.record(**_assessment_fields(results))
+            degraded = sorted(graph.degraded)
+    
+    # The report is renamed into place once the workflow completes
+    _print_completion(patient_data, report)
+    return degraded
+
+async def aprocess_patient(patient_data: Dict[str, Any], agents: Mapping[str, BaseAgent], output_dir: Optional[str] = None,
+                           job: Optional[Job] = None) -> List[str]:
+    """Async twin of process_patient; awaits each agent call instead of blocking on it."""
+    # Each asyncio task sees its own session, so concurrent patients never share memory
+    with patient_session(patient_data.get('name', 'Unknown')), get_tracer().span("patient", kind="patient"):
+        return await _arun_patient_workflow(patient_data, agents, output_dir, job)
+
+async def _arun_patient_workflow(patient_data: Dict[str, Any], agents: Mapping[str, BaseAgent], output_dir: Optional[str] = None,
+                                 job: Optional[Job] = None) -> List[str]:
+    """Async twin of _run_patient_workflow."""
+    degraded = []
+    with get_report_writer(output_dir).open(patient_data) as report:
+        patient_category = _start_report(patient_data, report)
+        if patient_category is not None:
+            primary_agent, specialist = _select_agents(patient_category, agents)
+            print(f"Primary agent: {primary_agent.name} ({primary_agent.role})")
+            
+            graph = build_patient_graph(patient_data, patient_category, primary_agent, specialist)
+            sections = _ReportSections(graph, patient_category, specialist, report)
+            with _stream_report(report):
+                results = await graph.arun(on_settled=sections.on_settled, checkpoint=job)
+            _settle_lazy_fields(results)
+            report.record(**_assessment_fields(results))
+            degraded = sorted(graph.degraded)
+    
+    _print_completion(patient_data, report)
+    return degraded
+
+async def process_patients_concurrently(patients: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]], agents: Mapping[str, BaseAgent],
+                                        max_concurrency: Optional[int] = None, output_dir: Optional[str] = None,
+                                        job_store: Optional[JobStore] = None) -> int:
+    """Process many patients at once, with at most max_concurrency in flight.
+    
+    Patients are pulled from the iterable only as capacity frees up, so a streaming
+    loader can feed arbitrarily large batches without holding them in memory.
+    
+    Args:
+        patients: Patient records to process (any iterable, including generators, or an async iterable)
+        agents: Agents returned by initialize_agents
+        max_concurrency: Maximum number of patients processed at the same time
+                         (defaults to Config.get_max_concurrency())
+        output_dir: Directory for the markdown reports (defaults to ./output)
+        job_store: Optional durable job store; patients it has already finished are skipped
+                   and interrupted ones resume from their last checkpointed stage
+    
+    While every slot is busy, up to PRIORITY_LOOKAHEAD pulled patients wait in a priority
+    queue, and the most urgent one (emergencies first, input order within a class) gets
+    the next free slot.
+    
+    Returns:
+        The number of patients processed; patients the job store skipped as already done
+        are not counted (see JobStore.stats)
+    """
+    max_concurrency = max_concurrency or Config.get_max_concurrency()
+    lookahead = max(1, Config.get_priority_lookahead()) if Config.is_priority_scheduling_enabled() else 1
+    slo_tracker = get_slo_tracker()
+    
+    processed = 0
+    
+    async def run(ticket: Ticket):
+        nonlocal processed
+        patient_data = ticket.patient_data
+        job = job_store.start(patient_data) if job_store is not None else None
+        if job_store is not None and job is None:
+            print(f"Skipping patient {patient_data.get('name', 'Unknown')}: already processed in an earlier run")
+            return
+        processed += 1
+        try:
+            with scheduled(ticket):
+                degraded = await aprocess_patient(patient_data, agents, output_dir, job)
+        except Exception as e:
+            # One failing patient must not abort the rest of the batch
+            print(f"Error processing patient {patient_data.get('name', 'Unknown')}: {e}")
+            if job is not None:
+                job.fail(e)
+        else:
+            slo_tracker.record(ticket)
+            if degraded:
+                # The report holds apologies; leave the job open so a rerun redoes those stages
+                retry = " and will be retried on the next run" if job is not None else ""
+                print(f"Patient {patient_data.get('name', 'Unknown')}: stages {', '.join(degraded)} fell back "
+                      f"to the error response; the report is incomplete{retry}")
+                if job is not None:
+                    job.retry_later(degraded)
+            elif job is not None:
+                job.finish()
+    
+    waiting = PatientQueue()
+    in_flight = set()
+    
+    def dispatch():
+        """Give every free slot to the most urgent waiting patient."""
+        while waiting and len(in_flight) < max_concurrency:
+            task = asyncio.ensure_future(run(waiting.pop()))
+            in_flight.add(task)
+            task.add_done_callback(finished)
+    
+    def finished(task: asyncio.Future):
+        in_flight.discard(task)
+        dispatch()
+    
+    async def offer(patient_data: Dict[str, Any]):
+        waiting.push(patient_data)
+        dispatch()
+        # Stop reading while the queue is full; each finishing patient admits the next one
+        while len(waiting) >= lookahead:
+            await asyncio.wait(set(in_flight), return_when=asyncio.FIRST_COMPLETED)
+    
+    if hasattr(patients, "__aiter__"):
+        async for patient_data in patients:
+            await offer(patient_data)
+    else:
+        for patient_data in patients:
+            await offer(patient_data)
+    while in_flight:
+        await asyncio.wait(set(in_flight))
+    return processed
+
+def print_cache_stats(agents: Mapping[str, BaseAgent]):
+    """Print response and semantic cache counters for the agents that use them."""
+    # Only report on the agents that were actually used
+    agents = agents.built() if isinstance(agents, AgentRegistry) else agents
+    if Config.is_cache_enabled() and any(agent.cache_responses for agent in agents.values()):
+        stats = get_response_cache().stats()
+        print(f"Response cache: {stats['memory_hits'] + stats['disk_hits']} hits, "
+              f"{stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+    
+    if Config.is_semantic_cache_enabled() and any(agent.semantic_cache_thresholds for agent in agents.values()):
+        semantic_cache = get_semantic_cache()
+        semantic_cache.save()
+        stats = semantic_cache.stats()
+        print(f"Semantic cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+    
+    if Config.is_classification_batching_enabled():
+        stats = get_classification_batcher().stats()
+        if stats["requests"]:
+            print(f"Classification batching: {stats['batched']} of {stats['requests']} Yes/No triage questions "
+                  f"answered in {stats['batches']} batched calls")
+    
+    if Config.is_coalescing_enabled():
+        stats = get_single_flight().stats()
+        print(f"Coalesced calls: {stats['coalesced']} identical in-flight calls shared "
+              f"{stats['upstream_calls']} upstream calls ({stats['coalesced_rate']:.0%} coalesced)")
+    
+    stats = get_hedge_stats().stats()
+    if stats["sent"]:
+        print(f"Hedged requests: {stats['sent']} duplicates sent to a second key, {stats['won']} answered first")
+
+def print_job_stats(job_store: Optional[JobStore]):
+    """Print how many batch jobs were skipped or resumed, and the job store totals."""
+    if job_store is None:
+        return
+    stats = job_store.stats()
+    print(f"Jobs: {stats['skipped']} already done and skipped, {stats['resumed']} resumed from checkpoints, "
+          f"{stats['incomplete']} left pending after fallback responses "
+          f"({stats.get('done', 0)} done, {stats.get('failed', 0)} failed, {stats.get('pending', 0)} pending in {job_store.path})")
+
+def print_report_summary():
+    """Close the report writers and print where each batch's index and results were written."""
+    for writer in close_report_writers():
+        counts = ", ".join(f"{count} {status}" for status, count in sorted(writer.counts.items()))
+        print(f"\nReports in {writer.output_dir} (batch {writer.batch_id}: {counts or 'none'})")
+        print(f"  index: {writer.index_path}")
+        print(f"  results: {writer.results_path}")
+
+def print_slo_summary():
+    """Print per-class latency of the scheduled patients against the class SLO targets."""
+    summary = get_slo_tracker().summary()
+    if not summary:
+        return
+    print("\nPriority classes (seconds from queued; SLO applies to time to assessment):")
+    print(f"  {'class':<10} {'patients':>8} {'p50':>8} {'p95':>8} {'report p95':>11} {'SLO':>8} {'breaches':>9}")
+    for label, stats in summary.items():
+        p50 = f"{stats['assessment_p50']:.2f}" if stats['assessment_p50'] is not None else "-"
+        p95 = f"{stats['assessment_p95']:.2f}" if stats['assessment_p95'] is not None else "-"
+        slo = f"{stats['slo_seconds']:.0f}" if stats['slo_seconds'] is not None else "-"
+        print(f"  {label:<10} {stats['patients']:>8} {p50:>8} {p95:>8} {stats['report_p95']:>11.2f} {slo:>8} "
+              f"{stats['breaches']:>9}")
+
+def print_lazy_fields():
+    """Print how often each lazy assessment field was generated or skipped."""
+    report = lazy_field_report()
+    if report:
+        print("\nLazy assessment fields:")
+        for key, counts in report.items():
+            print(f"  {key}: {counts['computed']} generated, {counts['skipped']} skipped")
+
+def print_prompt_tokens():
+    """Print the estimated input tokens of every prompt template rendered during the run."""
+    report = prompt_token_report()
+    if not report:
+        return
+    print("\nPrompt tokens (estimated):")
+    print(f"  {'prompt':<24} {'renders':>8} {'mean':>8} {'max':>8}")
+    for name, stats in report.items():
+        print(f"  {name:<24} {stats['renders']:>8} {stats['mean']:>8.1f} {stats['max']:>8}")
+
+def print_trace_summary():
+    """Print p50/p95 latency per patient, stage and agent, and the time each API key spent throttled."""
+    tracer = get_tracer()
+    summary = tracer.summary()
+    if not summary:
+        return
+    print("\nTiming summary (seconds):")
+    print(f"  {'span':<40} {'count':>6} {'p50':>8} {'p95':>8} {'max':>8}")
+    for name, stats in summary.items():
+        print(f"  {name:<40} {stats['count']:>6} {stats['p50']:>8.2f} {stats['p95']:>8.2f} {stats['max']:>8.2f}")
+    for label, stats in tracer.key_summary().items():
+        print(f"  key {label}: {stats['calls']} calls, {stats['rate_limited']} rate limited, "
+              f"{stats['wait_seconds']:.1f}s waiting")
+    tracer.close()
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Agentic Doctor System")
+    parser.add_argument("--input", help="JSONL or CSV file of patient records to process in batch mode "
+                                        "(without it, the sample patients are processed)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of patients processed concurrently (defaults to MAX_CONCURRENCY)")
+    parser.add_argument("--output-dir", default=None, help="Directory for patient reports (defaults to ./output)")
+    parser.add_argument("--route-only", action="store_true",
+                        help="Only categorize the --input records and print how many go to each workflow")
+    parser.add_argument("--stream", action="store_true", default=None,
+                        help="Print agent responses token by token as they are generated (defaults to STREAM_RESPONSES)")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Worker processes for --input batches, each with its own agents and API keys "
+                             "(defaults to PROCESSES); --workers then applies per process")
+    return parser.parse_args(argv)
+
+def route_batch(input_path: str) -> Dict[str, int]:
+    """Categorize all records of a JSONL/CSV file, without calling any agent."""
+    malformed: List[Dict[str, Any]] = []
+    start_time = time.perf_counter()
+    records = list(DataProcessor.iter_patient_records(input_path, malformed))
+    read_time = time.perf_counter() - start_time
+    
+    # A per-record loop: a NumPy batch path was measured slower (see README)
+    start_time = time.perf_counter()
+    categories = [DataProcessor.categorize_patient(patient_data) for patient_data in records]
+    elapsed = time.perf_counter() - start_time
+    
+    counts = {category: categories.count(category) for category in ('normal', 'sick', 'cardiac')}
+    print(f"\nRouted {len(records)} patients in {elapsed:.3f}s after reading them in {read_time:.3f}s "
+          f"({len(malformed)} malformed records skipped):")
+    for category, count in counts.items():
+        print(f"  {category}: {count}")
+    return counts
+
+def run_batch(input_path: str, agents: Mapping[str, BaseAgent], workers: Optional[int] = None,
+              output_dir: Optional[str] = None):
+    """Stream patient records from a JSONL/CSV file through the pipeline."""
+    malformed: List[Dict[str, Any]] = []
+    records = DataProcessor.iter_patient_records(input_path, malformed)
+    job_store = get_job_store()
+    processed = asyncio.run(process_patients_concurrently(records, agents, workers, output_dir, job_store))
+    
+    print(f"\nBatch complete: {processed} patients processed, {len(malformed)} malformed records skipped.")
+    print_job_stats(job_store)
+    for error in malformed[:20]:
+        print(f"  line {error['line']}: {error['error']}")
+    if len(malformed) > 20:
+        print(f"  ... and {len(malformed) - 20} more")
+
+def _partition_keys(processes: int) -> List[List[str]]:
+    """Split the configured API keys into one disjoint group per worker process.
+    
+    There are never more groups than keys; the simulated backend needs no keys,
+    so every worker gets an empty group.
+    """
+    if Config.get_llm_backend() == "simulated":
+        return [[] for _ in range(processes)]
+    keys = Config.get_groq_api_keys()
+    if processes > len(keys):
+        print(f"Only {len(keys)} API keys for {processes} processes; starting {len(keys)} worker processes")
+        processes = len(keys)
+    return [keys[i::processes] for i in range(processes)]
+
+async def _queued_records(patient_queue: Any):
+    """Yield patient records from a multiprocessing queue until the None sentinel arrives."""
+    while True:
+        # The blocking get runs in a thread so patients already in flight keep going
+        patient_data = await asyncio.to_thread(patient_queue.get)
+        if patient_data is None:
+            return
+        yield patient_data
+
+def _process_worker(index: int, api_keys: List[str], patient_queue: Any, result_queue: Any,
+                    workers: Optional[int], output_dir: Optional[str]):
+    """Entry point of a worker process: build its own agents and process patients from the shared queue."""
+    try:
+        if api_keys:
+            # Restrict this process to its own keys; empty values are ignored by Config and,
+            # unlike deleted ones, are not reloaded from .env
+            for name in list(os.environ):
+                if name.startswith("GROQ_API_KEY"):
+                    os.environ[name] = ""
+            os.environ["GROQ_API_KEYS"] = ",".join(api_keys)
+        trace_path = Config.get_trace_path()
+        if trace_path:
+            root, ext = os.path.splitext(trace_path)
+            os.environ["TRACE_PATH"] = f"{root}.worker{index}{ext}"
+        forward_reports_to(result_queue)
+        
+        agents = initialize_agents()
+        job_store = get_job_store()
+        processed = asyncio.run(process_patients_concurrently(_queued_records(patient_queue), agents, workers,
+                                                              output_dir, job_store))
+        print(f"\n[worker {index}] {processed} patients processed with {len(api_keys) or 'no'} API keys")
+        print_job_stats(job_store)
+        print_cache_stats(agents)
+        print_slo_summary()
+        close_report_writers()
+        get_tracer().close()
+    finally:
+        # Tell the aggregator this worker is done, even if it failed
+        result_queue.put(None)
+
+def _aggregate_results(result_queue: Any, writer: ReportWriter, processes: List[Any]):
+    """Write the index entries and results rows sent by the worker processes until all of them finish."""
+    remaining = len(processes)
+    while remaining:
+        try:
+            item = result_queue.get(timeout=1.0)
+        except queue.Empty:
+            # A worker killed before sending its sentinel would otherwise be waited on forever
+            if not any(process.is_alive() for process in processes):
+                break
+            continue
+        if item is None:
+            remaining -= 1
+            continue
+        entry, row = item
+        writer.write(entry, row)
+
+def run_batch_multiprocess(input_path: str, processes: int, workers: Optional[int] = None,
+                           output_dir: Optional[str] = None):
+    """Stream patient records from a JSONL/CSV file through a pool of worker processes.
+    
+    Each worker process builds its own agents, owns a disjoint subset of the API keys
+    and pulls patients from a shared queue, running up to `workers` of them at a time.
+    The workers write the Markdown reports; this process assigns the report IDs and
+    writes the batch index and results.
+    """
+    key_groups = _partition_keys(processes)
+    max_concurrency = workers or Config.get_max_concurrency()
+    context = multiprocessing.get_context("spawn")
+    patient_queue = context.Queue(maxsize=len(key_groups) * max_concurrency * 2)
+    result_queue = context.Queue()
+    writer = get_report_writer(output_dir)
+    
+    pool = [
+        context.Process(target=_process_worker, name=f"patient-worker-{index}",
+                        args=(index, api_keys, patient_queue, result_queue, max_concurrency, output_dir))
+        for index, api_keys in enumerate(key_groups)
+    ]
+    for process in pool:
+        process.start()
+    aggregator = threading.Thread(target=_aggregate_results, args=(result_queue, writer, pool), daemon=True)
+    aggregator.start()
+    
+    malformed: List[Dict[str, Any]] = []
+    submitted = 0
+    for patient_data in DataProcessor.iter_patient_records(input_path, malformed):
+        # IDs are assigned here so identical records in different workers still get separate reports
+        patient_data['patient_id'] = writer.reserve_id(patient_data)
+        _put(patient_queue, patient_data, pool)
+        submitted += 1
+    for _ in pool:
+        _put(patient_queue, None, pool)
+    
+    for process in pool:
+        process.join()
+    aggregator.join()
+    
+    print(f"\nBatch complete: {submitted} patients submitted to {len(pool)} worker processes, "
+          f"{len(malformed)} malformed records skipped.")
+    for error in malformed[:20]:
+        print(f"  line {error['line']}: {error['error']}")
+    if len(malformed) > 20:
+        print(f"  ... and {len(malformed) - 20} more")
+
+def _put(patient_queue: Any, item: Any, pool: List[Any]):
+    """Put an item on the bounded patient queue, failing instead of blocking forever if every worker has died."""
+    while True:
+        try:
+            patient_queue.put(item, timeout=1.0)
+            return
+        except queue.Full:
+            if not any(process.is_alive() for process in pool):
+                raise RuntimeError("All worker processes exited before the batch was queued")
+
+def main(argv: Optional[List[str]] = None):
     """Main application entry point."""
-    print("Initializing Agentic Doctor System...")
+    args = parse_args(argv)
+    if args.route_only:
+        if not args.input:
+            raise SystemExit("--route-only requires --input")
+        route_batch(args.input)
+        return
     
-    # Initialize agents (each with its own LLM instance)
-    agents = initialize_agents()
-    print("All agents initialized successfully.")
+    processes = args.processes or Config.get_processes()
+    if args.input and processes > 1:
+        print(f"Initializing Agentic Doctor System with {processes} worker processes...")
+        run_batch_multiprocess(args.input, processes, args.workers, args.output_dir)
+        print_report_summary()
+        return
     
-    # Process only normal and heart patients to reduce API load
-    selected_patients = {
-        "normal": get_sample_patient("normal"),
-        "heart": get_sample_patient("heart")
-    }
+    print("Initializing Agentic Doctor System...")
     
-    print("\nNote: Only processing normal and heart patients to avoid API rate limits.\n")
+    # Register agents; each is built with its own LLM instance when first needed
+    agents = initialize_agents()
+    print("Agents registered.")
     
-    for patient_type, patient_data in selected_patients.items():
-        # Process the patient
-        process_patient(patient_data, agents)
+    stream = args.stream if args.stream is not None else Config.is_streaming_enabled()
+    with streaming_to(ConsoleSink()) if stream else nullcontext():
+        if args.input:
+            run_batch(args.input, agents, args.workers, args.output_dir)
+            print_cache_stats(agents)
+            print_report_summary()
+            print_slo_summary()
+            print_lazy_fields()
+            print_prompt_tokens()
+            print_trace_summary()
+            return
+        
+        # Process only normal and heart patients to reduce API load
+        selected_patients = {
+            "normal": get_sample_patient("normal"),
+            "heart": get_sample_patient("heart")
+        }
+        
+        print("\nNote: Only processing normal and heart patients to avoid API rate limits.\n")
+        
+        # Patients are processed concurrently; MAX_CONCURRENCY bounds how many are in flight
+        asyncio.run(process_patients_concurrently(selected_patients.values(), agents, args.workers, args.output_dir))
         
-        # Add a delay between patients to avoid hitting API rate limits
-        # This gives time for the API rate limits to reset
-        if patient_type != list(selected_patients.keys())[-1]:  # Skip delay after the last patient
-            delay = random.uniform(3, 6)  # Longer delay between 3-6 seconds
-            print(f"\nWaiting {delay:.1f} seconds before processing next patient...")
-            time.sleep(delay)
-    
-    print("\nAll patients processed successfully.")
+        print("\nAll patients processed successfully.")
+        print_cache_stats(agents)
+        print_report_summary()
+        print_slo_summary()
+        print_lazy_fields()
+        print_prompt_tokens()
+        print_trace_summary()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
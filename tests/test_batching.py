@@ -0,0 +1,52 @@
+from typing import List
+
+from agents.batching import ClassificationBatcher
+from utils.patient_encoding import PatientEncoding
+
+class FakeAgent:
+    """Answers every batched prompt with a Yes for P1 and a No for P2."""
+    
+    name = "Fake Agent"
+    
+    def __init__(self):
+        self.prompts: List[str] = []
+    
+    def process_input(self, prompt: str, **kwargs) -> str:
+        self.prompts.append(prompt)
+        return ('[{"patient_id": "P1", "answer": "Yes", "reason": "chest pain"}, '
+                '{"patient_id": "P2", "answer": "No", "reason": "stable"}]')
+
+def _patient(*symptoms: str) -> PatientEncoding:
+    return PatientEncoding({"name": "Jane Doe", "age": 50, "gender": "F", "symptoms": list(symptoms)})
+
+def test_lone_question_does_not_wait_for_the_window():
+    batcher = ClassificationBatcher(window_seconds=60.0)
+    agent = FakeAgent()
+    
+    future = batcher.submit(agent, "emergency", "Is this an emergency?", _patient("chest pain"))
+    
+    assert future.done() and future.result() is None
+    assert agent.prompts == []
+
+def test_concurrent_questions_share_one_call():
+    batcher = ClassificationBatcher(window_seconds=60.0, max_size=2)
+    agent = FakeAgent()
+    batcher.submit(agent, "emergency", "Is this an emergency?", _patient("cough"))
+    
+    first = batcher.submit(agent, "emergency", "Is this an emergency?", _patient("chest pain"))
+    second = batcher.submit(agent, "emergency", "Is this an emergency?", _patient("headache"))
+    
+    assert first.result(timeout=5).value is True
+    assert second.result(timeout=5).value is False
+    assert len(agent.prompts) == 1
+    assert batcher.stats() == {"requests": 3, "batches": 1, "batched": 2}
+
+def test_duplicates_of_one_patient_are_not_sent_as_a_batch():
+    batcher = ClassificationBatcher(window_seconds=0.05)
+    agent = FakeAgent()
+    batcher.submit(agent, "emergency", "Is this an emergency?", _patient("cough"))
+    
+    futures = [batcher.submit(agent, "emergency", "Is this an emergency?", _patient("chest pain")) for _ in range(3)]
+    
+    assert [future.result(timeout=5) for future in futures] == [None, None, None]
+    assert agent.prompts == []
\ No newline at end of file
@@ -0,0 +1,81 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+from utils.dag import Stage, StageGraph, current_stage
+from utils.resilience import FallbackResponse
+
+class RecordingCheckpoint:
+    """Checkpoint that restores fixed results and records what is saved."""
+    
+    def __init__(self, restored: Optional[Dict[str, Any]] = None):
+        self.restored = restored or {}
+        self.saved: Dict[str, Any] = {}
+    
+    def load(self) -> Dict[str, Any]:
+        return dict(self.restored)
+    
+    def save(self, stage: str, result: Any):
+        self.saved[stage] = result
+
+def test_failed_condition_skips_stage_and_its_dependents():
+    graph = StageGraph([
+        Stage("assessment", lambda results: {"requires_doctor_attention": False}),
+        Stage("doctor", lambda results: "see a doctor", inputs=["assessment"],
+              condition=lambda results: results["assessment"]["requires_doctor_attention"]),
+        Stage("treatment", lambda results: "treat", inputs=["doctor"]),
+        Stage("report", lambda results: "report", inputs=["assessment"])
+    ])
+    settled = []
+    
+    results = graph.run(on_settled=lambda name, results: settled.append(name))
+    
+    assert graph.skipped == {"doctor", "treatment"}
+    assert set(results) == {"assessment", "report"}
+    assert sorted(settled) == ["assessment", "doctor", "report", "treatment"]
+
+def test_running_stage_knows_its_ancestors_in_graph_order():
+    graph = StageGraph([
+        Stage("assessment", lambda results: current_stage()),
+        Stage("doctor", lambda results: current_stage(), inputs=["assessment"]),
+        Stage("report", lambda results: current_stage()),
+        Stage("treatment", lambda results: current_stage(), inputs=["doctor"])
+    ])
+    
+    for results in (graph.run(), asyncio.run(graph.arun())):
+        assert results["treatment"].ancestors == ("assessment", "doctor")
+        assert results["report"].ancestors == ()
+    assert current_stage() is None
+
+def test_checkpointed_stages_are_restored_instead_of_run():
+    calls = []
+    
+    def run(name):
+        def stage(results):
+            calls.append(name)
+            return f"{name} result"
+        return stage
+    
+    graph = StageGraph([
+        Stage("assessment", run("assessment")),
+        Stage("report", run("report"), inputs=["assessment"])
+    ])
+    checkpoint = RecordingCheckpoint({"assessment": "restored assessment"})
+    
+    results = graph.run(checkpoint=checkpoint)
+    
+    assert calls == ["report"]
+    assert results["assessment"] == "restored assessment"
+    assert checkpoint.saved == {"report": "report result"}
+
+def test_fallback_results_and_their_dependents_are_not_checkpointed():
+    graph = StageGraph([
+        Stage("assessment", lambda results: {"reason": FallbackResponse("Sorry", "timeout")}),
+        Stage("plan", lambda results: "plan", inputs=["assessment"]),
+        Stage("report", lambda results: "report")
+    ])
+    checkpoint = RecordingCheckpoint()
+    
+    graph.run(checkpoint=checkpoint)
+    
+    assert graph.degraded == {"assessment", "plan"}
+    assert checkpoint.saved == {"report": "report"}
\ No newline at end of file
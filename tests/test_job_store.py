@@ -0,0 +1,25 @@
+from utils.job_store import JobStore
+
+PATIENT = {"name": "Jane Doe", "age": 40, "symptoms": ["cough"]}
+
+def test_finished_job_is_skipped_on_rerun():
+    store = JobStore(":memory:")
+    job = store.start(PATIENT)
+    job.save("assessment", {"patient_status": "sick"})
+    job.finish()
+    
+    assert store.start(PATIENT) is None
+    assert store.stats()["skipped"] == 1
+
+def test_job_with_fallback_stages_stays_pending_and_resumes():
+    store = JobStore(":memory:")
+    job = store.start(PATIENT)
+    job.save("assessment", {"patient_status": "sick"})
+    job.retry_later(["care_recommendations"])
+    assert store.stats()["pending"] == 1
+    assert store.stats()["incomplete"] == 1
+    
+    resumed = store.start(PATIENT)
+    
+    assert resumed is not None
+    assert resumed.load() == {"assessment": {"patient_status": "sick"}}
\ No newline at end of file
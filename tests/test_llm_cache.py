@@ -0,0 +1,48 @@
+import pytest
+
+import utils.llm_cache as llm_cache
+from utils.llm_cache import ResponseCache
+
+class FakeClock:
+    """Stands in for the time module so tests can move the clock past the TTL."""
+    
+    def __init__(self, now: float):
+        self.now = now
+    
+    def time(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock(1000.0)
+    monkeypatch.setattr(llm_cache, "time", clock)
+    return clock
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResponseCache(":memory:", ttl_seconds=10, max_memory_entries=10)
+    cache.set("key", "response")
+    
+    clock.now += 9
+    assert cache.get("key") == "response"
+    clock.now += 2
+    assert cache.get("key") is None
+    assert cache.stats()["misses"] == 1
+
+def test_expired_entries_are_not_served_from_disk(clock, tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache(path, ttl_seconds=10, max_memory_entries=10).set("key", "response")
+    
+    assert ResponseCache(path, ttl_seconds=10, max_memory_entries=10).get("key") == "response"
+    clock.now += 11
+    reopened = ResponseCache(path, ttl_seconds=10, max_memory_entries=10)
+    assert reopened.get("key") is None
+
+def test_evict_expired_removes_only_expired_entries(clock):
+    cache = ResponseCache(":memory:", ttl_seconds=10, max_memory_entries=10)
+    cache.set("old", "old response")
+    clock.now += 5
+    cache.set("new", "new response")
+    clock.now += 6
+    
+    assert cache.evict_expired() == 1
+    assert cache.get("new") == "new response"
\ No newline at end of file
@@ -0,0 +1,76 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import main
+from data.patient_records import get_all_sample_patients
+
+@pytest.fixture
+def simulated(monkeypatch, tmp_path):
+    """Run the agents against the simulated model, with caches and the job store off."""
+    for name, value in {
+        "LLM_BACKEND": "simulated",
+        "SIMULATED_LATENCY_MS": "20",
+        "SIMULATED_LATENCY_SIGMA": "0",
+        "SIMULATED_ERROR_RATE": "0",
+        "GROQ_REQUESTS_PER_MINUTE": "100000",
+        "GROQ_TOKENS_PER_MINUTE": "100000000",
+        "CACHE_ENABLED": "False",
+        "SEMANTIC_CACHE_ENABLED": "False",
+        "JOB_STORE_ENABLED": "False",
+        "PRIORITY_SCHEDULING": "False",
+        "CLASSIFICATION_BATCHING": "False",
+        "TRACING_ENABLED": "False"
+    }.items():
+        monkeypatch.setenv(name, value)
+    yield str(tmp_path)
+    main.close_report_writers()
+
+def _read_jsonl(path: str):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def _patients(count: int):
+    samples = list(get_all_sample_patients().values())
+    return [dict(samples[i % len(samples)], name=f"Patient {i}") for i in range(count)]
+
+def test_aprocess_patient_writes_a_complete_report(simulated):
+    agents = main.initialize_agents()
+    patient = _patients(1)[0]
+    
+    degraded = asyncio.run(main.aprocess_patient(patient, agents, simulated))
+    
+    assert degraded == []
+    [entry] = _read_jsonl(os.path.join(simulated, "index.jsonl"))
+    assert entry["name"] == "Patient 0" and entry["status"] == "complete"
+    assert os.path.exists(os.path.join(simulated, entry["report"]))
+
+def test_process_patients_concurrently_bounds_concurrency_and_keeps_input_order(simulated, monkeypatch):
+    agents = main.initialize_agents()
+    patients = _patients(9)
+    started, in_flight, peak = [], 0, 0
+    aprocess_patient = main.aprocess_patient
+    
+    async def tracked(patient_data, *args):
+        nonlocal in_flight, peak
+        started.append(patient_data["name"])
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            return await aprocess_patient(patient_data, *args)
+        finally:
+            in_flight -= 1
+    
+    monkeypatch.setattr(main, "aprocess_patient", tracked)
+    
+    processed = asyncio.run(main.process_patients_concurrently(iter(patients), agents, max_concurrency=3,
+                                                               output_dir=simulated))
+    
+    assert processed == 9
+    assert peak == 3
+    assert started == [patient["name"] for patient in patients]
+    rows = _read_jsonl(os.path.join(simulated, "results.jsonl"))
+    assert sorted(row["name"] for row in rows) == sorted(patient["name"] for patient in patients)
+    assert all(row["status"] == "complete" for row in rows)
\ No newline at end of file
@@ -0,0 +1,53 @@
+import asyncio
+
+from agents.base_agent import BaseAgent
+from agents.memory import patient_session
+from utils.dag import Stage, StageGraph
+from utils.simulated_llm import SimulatedChatModel
+
+def _agent() -> BaseAgent:
+    return BaseAgent(name="Test Agent", role="Tester", llm=SimulatedChatModel(latency_ms=1.0), system_prompt="")
+
+def _ask(agent: BaseAgent, prompt: str):
+    def run(results):
+        agent.process_input(prompt, use_cache=False)
+        return [message.content for message in agent._build_messages("next question")]
+    return run
+
+def _graph(agent: BaseAgent) -> StageGraph:
+    return StageGraph([
+        Stage("assessment", _ask(agent, "assess the patient")),
+        Stage("report", _ask(agent, "write the report")),
+        Stage("plan", _ask(agent, "plan the treatment"), inputs=["assessment"]),
+        Stage("summary", _ask(agent, "summarize"), inputs=["plan", "report"])
+    ])
+
+def test_stages_see_only_the_exchanges_of_the_stages_they_depend_on():
+    agent = _agent()
+    with patient_session("Jane Doe"):
+        results = _graph(agent).run()
+    
+    assert "assess the patient" in results["plan"]
+    assert "write the report" not in results["plan"]
+    assert "write the report" not in results["assessment"]
+    assert {"assess the patient", "plan the treatment", "write the report"} <= set(results["summary"])
+
+def test_async_stages_see_the_same_memory():
+    agent = _agent()
+    with patient_session("Jane Doe"):
+        threaded = _graph(agent).run()
+    
+    async def run():
+        with patient_session("Jane Doe"):
+            return await _graph(agent).arun()
+    
+    assert asyncio.run(run()) == threaded
+
+def test_outside_a_stage_the_session_keeps_one_memory_per_agent():
+    agent = _agent()
+    with patient_session("Jane Doe") as session:
+        agent.process_input("first question", use_cache=False)
+        agent.process_input("second question", use_cache=False)
+        assert [message["content"] for message in session.memory_for(agent.name)][::2] == ["first question",
+                                                                                         "second question"]
+    assert len(agent.memory) == 0
\ No newline at end of file
@@ -0,0 +1,30 @@
+import pytest
+
+from utils.priority import PriorityClass
+from utils.rate_limiter import RateLimiter
+
+def test_acquire_does_not_wait_while_budget_is_available():
+    limiter = RateLimiter(requests_per_minute=10, tokens_per_minute=1_000_000)
+    assert limiter.acquire(100) == 0.0
+
+def test_acquire_timeout_raises_without_reserving():
+    limiter = RateLimiter(requests_per_minute=1, tokens_per_minute=1_000_000)
+    limiter.acquire(10)
+    wait_before = limiter.estimated_wait(10)
+    
+    with pytest.raises(TimeoutError):
+        limiter.acquire(10, timeout=1.0)
+    
+    # A reservation would have pushed the next request back by another minute
+    assert limiter.estimated_wait(10) <= wait_before
+def test_low_priority_request_larger_than_the_budget_reserves_into_debt(monkeypatch):
+    monkeypatch.setenv("PRIORITY_SCHEDULING", "True")
+    monkeypatch.setenv("PRIORITY_RESERVED_BUDGET", "0.2")
+    limiter = RateLimiter(requests_per_minute=100, tokens_per_minute=600_000)
+    
+    # 1,000 tokens over the budget: a 0.1s debt once the full bucket is taken
+    waited = limiter.acquire(601_000, priority=PriorityClass.ROUTINE, timeout=5.0)
+    
+    assert waited < 1.0
+    # The whole budget was taken (the bucket only refilled while the debt was paid back)
+    assert limiter.tokens.level < 60_000
\ No newline at end of file
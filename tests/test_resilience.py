@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+from agents.base_agent import BaseAgent
+from utils.key_pool import KeyPool
+from utils.llm_factory import PooledChatModel
+from utils.rate_limiter import RateLimiter
+from utils.resilience import Deadline, FallbackResponse, contains_fallback, get_hedge_stats
+from utils.simulated_llm import SimulatedChatModel
+
+def _pooled_agent(monkeypatch, labels, llm, **fields) -> BaseAgent:
+    """Build an agent over a pool of `labels`, always leasing the first key not excluded."""
+    pool = KeyPool(labels)
+    monkeypatch.setattr(KeyPool, "_score", lambda self, key, tokens, now, priority=None: self.keys.index(key))
+    monkeypatch.setattr(PooledChatModel, "client_for", lambda self, key: llm)
+    return BaseAgent(name="Test Agent", role="Tester", llm=PooledChatModel(model_name="simulated", pool=pool),
+                     system_prompt="", **fields)
+
+def test_deadline_keeps_min_call_time_out_of_the_wait_budget():
+    deadline = Deadline(10.0, min_call_seconds=3.0)
+    assert 6.9 < deadline.wait_budget() <= 7.0
+    assert deadline.allows(6.0)
+    assert not deadline.allows(8.0)
+
+def test_deadline_caps_min_call_time_at_half_the_deadline():
+    deadline = Deadline(1.0, min_call_seconds=5.0)
+    assert deadline.min_call_seconds == 0.5
+    assert deadline.allows(0.0)
+
+def test_contains_fallback_looks_inside_dicts_and_lists():
+    fallback = FallbackResponse("Sorry", "timeout")
+    assert fallback == "Sorry" and fallback.error == "timeout"
+    assert contains_fallback({"plan": ["ok", fallback]})
+    assert not contains_fallback({"plan": ["ok"], "status": "normal"})
+
+def test_call_is_not_attempted_when_rate_limit_wait_would_overrun_deadline(monkeypatch):
+    limiter = RateLimiter(requests_per_minute=1, tokens_per_minute=1_000_000, label="drained")
+    limiter.acquire(10)
+    monkeypatch.setattr(BaseAgent, "_rate_limiter", lambda self: limiter)
+    llm = SimulatedChatModel(latency_ms=1.0)
+    agent = BaseAgent(name="Test Agent", role="Tester", llm=llm, system_prompt="", call_deadlines={"urgent": 2.0})
+    
+    started = time.monotonic()
+    response = agent.process_input("Is this urgent?", use_memory=False, use_cache=False, method="urgent")
+    
+    assert time.monotonic() - started < 1.0
+    assert isinstance(response, FallbackResponse)
+    assert "Call not attempted" in response
+    assert llm.calls == 0
+
+def test_open_circuit_moves_the_call_to_the_next_key(monkeypatch):
+    llm = SimulatedChatModel(latency_ms=1.0)
+    agent = _pooled_agent(monkeypatch, ["circuit-open-key", "circuit-healthy-key"], llm)
+    pool = agent.llm.pool
+    pool.keys[0].breaker.opened_until = time.monotonic() + 60
+    
+    response = agent.process_input("Is this urgent?", use_memory=False, use_cache=False)
+    
+    assert not isinstance(response, FallbackResponse)
+    assert llm.calls == 1
+    assert [key.requests for key in pool.keys] == [1, 1]
+    assert [key.in_flight for key in pool.keys] == [0, 0]
+
+def test_call_falls_back_when_every_key_circuit_is_open(monkeypatch):
+    llm = SimulatedChatModel(latency_ms=1.0)
+    agent = _pooled_agent(monkeypatch, ["all-open-key-1", "all-open-key-2"], llm)
+    pool = agent.llm.pool
+    for key in pool.keys:
+        key.breaker.opened_until = time.monotonic() + 60
+    
+    response = agent.process_input("Is this urgent?", use_memory=False, use_cache=False)
+    
+    assert isinstance(response, FallbackResponse)
+    assert "is open" in response.error
+    assert llm.calls == 0
+    assert [key.in_flight for key in pool.keys] == [0, 0]
+
+def test_hedge_is_skipped_when_its_budget_is_not_available_within_the_deadline(monkeypatch):
+    monkeypatch.setenv("LLM_HEDGING", "True")
+    monkeypatch.setenv("LLM_HEDGE_DELAY_MS", "10")
+    llm = SimulatedChatModel(latency_ms=100.0, latency_sigma=0.0)
+    agent = _pooled_agent(monkeypatch, ["hedge-primary-key", "hedge-drained-key"], llm,
+                          hedged_methods=["urgent"], call_deadlines={"urgent": 10.0})
+    pool = agent.llm.pool
+    timeouts = []
+    
+    def drained(tokens, priority=None, timeout=None):
+        timeouts.append(timeout)
+        raise TimeoutError("Rate-limit budget is not available")
+    monkeypatch.setattr(pool.keys[1].limiter, "acquire", drained)
+    sent = get_hedge_stats().sent
+    
+    response = agent.process_input("Is this urgent?", use_memory=False, use_cache=False, method="urgent")
+    
+    assert not isinstance(response, FallbackResponse)
+    assert llm.calls == 1
+    assert len(timeouts) == 1 and 0 < timeouts[0] < 10.0
+    assert get_hedge_stats().sent == sent
+    assert [key.in_flight for key in pool.keys] == [0, 0]
+
+def test_async_hedge_is_skipped_when_its_budget_is_not_available_within_the_deadline(monkeypatch):
+    monkeypatch.setenv("LLM_HEDGING", "True")
+    monkeypatch.setenv("LLM_HEDGE_DELAY_MS", "10")
+    llm = SimulatedChatModel(latency_ms=100.0, latency_sigma=0.0)
+    agent = _pooled_agent(monkeypatch, ["ahedge-primary-key", "ahedge-drained-key"], llm,
+                          hedged_methods=["urgent"], call_deadlines={"urgent": 10.0})
+    pool = agent.llm.pool
+    timeouts = []
+    
+    async def drained(tokens, priority=None, timeout=None):
+        timeouts.append(timeout)
+        raise TimeoutError("Rate-limit budget is not available")
+    monkeypatch.setattr(pool.keys[1].limiter, "aacquire", drained)
+    
+    response = asyncio.run(agent.aprocess_input("Is this urgent?", use_memory=False, use_cache=False, method="urgent"))
+    
+    assert not isinstance(response, FallbackResponse)
+    assert llm.calls == 1
+    assert len(timeouts) == 1 and 0 < timeouts[0] < 10.0
+    assert [key.in_flight for key in pool.keys] == [0, 0]
\ No newline at end of file
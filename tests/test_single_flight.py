@@ -0,0 +1,64 @@
+from concurrent.futures import CancelledError
+import threading
+import time
+
+import pytest
+
+from utils.single_flight import SingleFlight
+
+def test_followers_receive_the_leaders_result():
+    flights = SingleFlight()
+    flight, leader = flights.join("key")
+    follower_flight, follower_leads = flights.join("key")
+    assert leader and not follower_leads
+    assert follower_flight is flight
+    
+    flights.settle("key", flight, "response")
+    
+    assert follower_flight.result() == "response"
+    assert flights.stats()["coalesced"] == 1
+    assert flights.stats()["in_flight"] == 0
+
+def test_abandoned_flight_lets_a_follower_lead_a_new_one():
+    flights = SingleFlight()
+    flight, _ = flights.join("key")
+    follower_flight, _ = flights.join("key")
+    
+    flights.abandon("key", flight)
+    
+    with pytest.raises(CancelledError):
+        follower_flight.result()
+    new_flight, leader = flights.join("key")
+    assert leader
+    assert new_flight is not flight
+
+def test_waiting_follower_wakes_up_when_the_leader_abandons():
+    flights = SingleFlight()
+    flight, _ = flights.join("key")
+    outcome = []
+    
+    def follow():
+        follower_flight, _ = flights.join("key")
+        try:
+            follower_flight.result(timeout=5)
+        except CancelledError:
+            outcome.append(flights.join("key")[1])
+    
+    follower = threading.Thread(target=follow)
+    follower.start()
+    while flights.stats()["coalesced"] == 0:
+        time.sleep(0.001)
+    flights.abandon("key", flight)
+    follower.join(timeout=5)
+    
+    assert outcome == [True]
+
+def test_settling_a_stale_flight_keeps_the_current_one():
+    flights = SingleFlight()
+    stale, _ = flights.join("key")
+    flights.abandon("key", stale)
+    current, _ = flights.join("key")
+    
+    flights.abandon("key", stale)
+    
+    assert flights.join("key") == (current, False)
\ No newline at end of file
@@ -0,0 +1,42 @@
+from utils.triage_rules import TriageRuleEngine
+
+NORMAL_VITALS = {
+    "heart_rate": 72,
+    "blood_pressure_systolic": 120,
+    "blood_pressure_diastolic": 80,
+    "oxygen_saturation": 98,
+    "temperature": 98.6,
+    "respiratory_rate": 16
+}
+
+def test_cardiac_symptoms_with_normal_vitals_go_to_the_llm():
+    patient = {"vital_signs": NORMAL_VITALS, "symptoms": ["jaw pain", "sweating", "nausea"]}
+    assert TriageRuleEngine().cardiac_emergency(patient) is None
+
+def test_normal_vitals_without_symptoms_rule_out_a_cardiac_emergency():
+    decision = TriageRuleEngine().cardiac_emergency({"vital_signs": NORMAL_VITALS, "symptoms": []})
+    assert decision is not None
+    assert decision.value is False and decision.source == "rules"
+
+def test_critical_vitals_with_red_flag_confirm_a_cardiac_emergency():
+    vital_signs = dict(NORMAL_VITALS, heart_rate=150)
+    decision = TriageRuleEngine().cardiac_emergency({"vital_signs": vital_signs, "symptoms": ["chest pain"]})
+    assert decision is not None
+    assert decision.value is True and decision.source == "rules"
+
+def test_missing_core_vitals_are_never_clear_cut():
+    patient = {"vital_signs": {"temperature": 98.6}, "symptoms": []}
+    assert TriageRuleEngine().cardiac_emergency(patient) is None
+def test_sick_patient_with_symptoms_and_normal_vitals_goes_to_the_llm():
+    patient = {"vital_signs": NORMAL_VITALS, "symptoms": ["cough", "fatigue", "sore throat"]}
+    assert TriageRuleEngine().doctor_attention(patient) is None
+
+def test_normal_vitals_without_symptoms_need_no_doctor():
+    decision = TriageRuleEngine().doctor_attention({"vital_signs": NORMAL_VITALS, "symptoms": [" "]})
+    assert decision is not None
+    assert decision.value is False and decision.source == "rules"
+
+def test_critical_vitals_need_a_doctor():
+    decision = TriageRuleEngine().doctor_attention({"vital_signs": dict(NORMAL_VITALS, oxygen_saturation=90),
+                                                    "symptoms": ["cough"]})
+    assert decision is not None and decision.value is True
\ No newline at end of file
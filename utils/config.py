@@ -1,7 +1,6 @@
 import os
 from dotenv import load_dotenv
-from typing import Dict, Any, Optional
-import threading
+from typing import Dict, List, Any, Optional
 
 # Load environment variables from .env file
 load_dotenv()
@@ -9,37 +8,52 @@ load_dotenv()
 class Config:
     """Configuration utility for the Agentic Doctor system."""
     
-    # Thread-local storage to track which API key each thread is using
-    _thread_local = threading.local()
-    # Lock for synchronizing access to the API key counter
-    _api_key_lock = threading.Lock()
-    # Counter to alternate between API keys
-    _api_key_counter = 0
-    
     @staticmethod
-    def get_groq_api_key() -> str:
-        """Get the Groq API key from environment variables, alternating between available keys."""
-        # Try to get API key from thread-local storage first
-        if hasattr(Config._thread_local, 'api_key'):
-            return Config._thread_local.api_key
+    def get_groq_api_keys() -> List[str]:
+        """Get all configured Groq API keys.
         
-        # Alternate between API keys
-        with Config._api_key_lock:
-            key_num = Config._api_key_counter % 2 + 1  # Alternate between 1 and 2
-            Config._api_key_counter += 1
+        Keys are read from GROQ_API_KEYS (comma-separated), GROQ_API_KEY and the numbered
+        GROQ_API_KEY_1, GROQ_API_KEY_2, ... variables; duplicates are dropped.
+        """
+        keys = [key.strip() for key in os.getenv("GROQ_API_KEYS", "").split(",") if key.strip()]
+        if os.getenv("GROQ_API_KEY"):
+            keys.append(os.getenv("GROQ_API_KEY"))
+        numbered = sorted(
+            (int(name[len("GROQ_API_KEY_"):]), value) for name, value in os.environ.items()
+            if name.startswith("GROQ_API_KEY_") and name[len("GROQ_API_KEY_"):].isdigit() and value
+        )
+        keys.extend(value for _, value in numbered)
         
-        # Get the API key from environment variables
-        api_key = os.getenv(f"GROQ_API_KEY_{key_num}")
-        if not api_key:
-            # Fall back to the other key if one is missing
-            other_key_num = 2 if key_num == 1 else 1
-            api_key = os.getenv(f"GROQ_API_KEY_{other_key_num}")
-            if not api_key:
-                raise ValueError("No GROQ API keys found in environment variables. Please check your .env file.")
-        
-        # Store the API key in thread-local storage
-        Config._thread_local.api_key = api_key
-        return api_key
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            raise ValueError("No GROQ API keys found in environment variables. Please check your .env file.")
+        return keys
+    
+    @staticmethod
+    def get_groq_api_key() -> str:
+        """Get the first configured Groq API key."""
+        return Config.get_groq_api_keys()[0]
+    
+    @staticmethod
+    def get_key_bench_seconds() -> float:
+        """Get how long an API key is benched after its first server error (doubling on repeats)."""
+        return float(os.getenv("KEY_BENCH_SECONDS", "5"))
+    
+    @staticmethod
+    def get_http_max_connections() -> int:
+        """Get the size of the shared HTTP connection pool used by every Groq client."""
+        return int(os.getenv("HTTP_MAX_CONNECTIONS", "32"))
+    
+    @staticmethod
+    def get_http_keepalive_seconds() -> float:
+        """Get how long idle pooled HTTP connections are kept open for reuse."""
+        return float(os.getenv("HTTP_KEEPALIVE_SECONDS", "120"))
+    
+    @staticmethod
+    def is_http2_enabled() -> bool:
+        """Check if the shared HTTP client may use HTTP/2 (only when the h2 package is installed)."""
+        enabled = os.getenv("HTTP2_ENABLED", "True")
+        return enabled.lower() in ("true", "1", "t")
     
     @staticmethod
     def get_model_name() -> str:
@@ -53,11 +67,281 @@ class Config:
         debug = os.getenv("DEBUG", "False")
         return debug.lower() in ("true", "1", "t")
     
+    @staticmethod
+    def get_max_concurrency() -> int:
+        """Get the maximum number of patients processed concurrently."""
+        max_concurrency = int(os.getenv("MAX_CONCURRENCY", "4"))
+        return max(1, max_concurrency)
+    
+    @staticmethod
+    def get_processes() -> int:
+        """Get the number of worker processes used for batch input."""
+        return int(os.getenv("PROCESSES", "1"))
+    
+    @staticmethod
+    def is_job_store_enabled() -> bool:
+        """Check if batch jobs are tracked in the durable job store so reruns can resume."""
+        enabled = os.getenv("JOB_STORE_ENABLED", "True")
+        return enabled.lower() in ("true", "1", "t")
+    
+    @staticmethod
+    def get_job_store_path() -> str:
+        """Get the path of the SQLite job store."""
+        return os.getenv("JOB_STORE_PATH", os.path.join(".cache", "jobs.sqlite"))
+    
+    @staticmethod
+    def is_priority_scheduling_enabled() -> bool:
+        """Check if batch patients are admitted by priority class instead of input order."""
+        enabled = os.getenv("PRIORITY_SCHEDULING", "True")
+        return enabled.lower() in ("true", "1", "t")
+    
+    @staticmethod
+    def get_priority_lookahead() -> int:
+        """Get how many queued patients the scheduler reorders by priority."""
+        return int(os.getenv("PRIORITY_LOOKAHEAD", "64"))
+    
+    @staticmethod
+    def get_priority_reserved_budget() -> float:
+        """Get the share of each key's rate-limit budget that routine calls leave for emergencies."""
+        return float(os.getenv("PRIORITY_RESERVED_BUDGET", "0.2"))
+    
+    @staticmethod
+    def get_priority_slo_seconds() -> Dict[str, float]:
+        """Get the time-to-assessment SLO per priority class, e.g. 'emergency=30,cardiac=120'."""
+        targets = {"emergency": 30.0, "cardiac": 120.0, "sick": 300.0, "routine": 900.0}
+        for item in os.getenv("PRIORITY_SLO_SECONDS", "").split(","):
+            if "=" in item:
+                name, value = item.split("=", 1)
+                targets[name.strip().lower()] = float(value)
+        return targets
+    
+    @staticmethod
+    def get_llm_deadline_seconds() -> float:
+        """Get the default time budget of one LLM call, including its retries and waits."""
+        return float(os.getenv("LLM_DEADLINE_SECONDS", "60"))
+    
+    @staticmethod
+    def get_llm_method_deadlines() -> Dict[str, float]:
+        """Get per-method deadline overrides in seconds, e.g. 'coordinate_emergency_response=15'."""
+        deadlines = {}
+        for item in os.getenv("LLM_METHOD_DEADLINES", "").split(","):
+            if "=" in item:
+                method, value = item.split("=", 1)
+                deadlines[method.strip()] = float(value)
+        return deadlines
+    
+    @staticmethod
+    def get_llm_min_call_seconds() -> float:
+        """Get the time an attempt must have left for the request itself after any rate-limit wait."""
+        return float(os.getenv("LLM_MIN_CALL_SECONDS", "5"))
+    
+    @staticmethod
+    def get_circuit_failure_threshold() -> int:
+        """Get the consecutive backend failures that open a key's circuit."""
+        return int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    
+    @staticmethod
+    def get_circuit_reset_seconds() -> float:
+        """Get how long an open circuit refuses calls before letting a probe through."""
+        return float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+    
+    @staticmethod
+    def is_hedging_enabled() -> bool:
+        """Check if latency-critical agent methods send a duplicate request when the first one is slow."""
+        enabled = os.getenv("LLM_HEDGING", "True")
+        return enabled.lower() in ("true", "1", "t")
+    
+    @staticmethod
+    def get_hedge_delay_ms() -> float:
+        """Get how long a hedged call waits for its first request before sending the duplicate."""
+        return float(os.getenv("LLM_HEDGE_DELAY_MS", "2000"))
+    
+    @staticmethod
+    def get_requests_per_minute() -> int:
+        """Get the requests-per-minute budget of a single Groq API key."""
+        return int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+    
+    @staticmethod
+    def get_tokens_per_minute() -> int:
+        """Get the tokens-per-minute budget of a single Groq API key."""
+        return int(os.getenv("GROQ_TOKENS_PER_MINUTE", "6000"))
+    
+    @staticmethod
+    def get_completion_token_estimate() -> int:
+        """Get the number of completion tokens reserved up front for each LLM call."""
+        return int(os.getenv("COMPLETION_TOKEN_ESTIMATE", "400"))
+    
+    @staticmethod
+    def get_memory_token_budget() -> int:
+        """Get the token budget of an agent's conversation memory window."""
+        return int(os.getenv("MEMORY_TOKEN_BUDGET", "2000"))
+    
+    @staticmethod
+    def memory_summaries_enabled() -> bool:
+        """Check if evicted memory is folded into a rolling summary."""
+        summaries = os.getenv("MEMORY_SUMMARIES", "False")
+        return summaries.lower() in ("true", "1", "t")
+    
+    @staticmethod
+    def is_cache_enabled() -> bool:
+        """Check if the LLM response cache is enabled for agents that opt in."""
+        enabled = os.getenv("CACHE_ENABLED", "True")
+        return enabled.lower() in ("true", "1", "t")
+    
+    @staticmethod
+    def is_cache_bypassed() -> bool:
+        """Check if cache lookups are bypassed (fresh responses still refresh the cache)."""
+        bypass = os.getenv("CACHE_BYPASS", "False")
+        return bypass.lower() in ("true", "1", "t")
+    
+    @staticmethod
+    def is_coalescing_enabled() -> bool:
+        """Check if identical concurrent LLM calls share one upstream request."""
+        enabled = os.getenv("COALESCE_REQUESTS", "True")
+        return enabled.lower() in ("true", "1", "t")
+    
+    @staticmethod
+    def is_structured_assessments_enabled() -> bool:
+        """Check if the heart and sick agents assess a patient in one structured-output call instead of a chain."""
+        enabled = os.getenv("STRUCTURED_ASSESSMENTS", "False")
+        return enabled.lower() in ("true", "1", "t")
+    
+    @staticmethod
+    def is_classification_batching_enabled() -> bool:
+        """Check if the Yes/No triage questions of concurrent patients are batched into one LLM call."""
+        enabled = os.getenv("CLASSIFICATION_BATCHING", "True")
+        return enabled.lower() in ("true", "1", "t")
+    
+    @staticmethod
+    def get_classification_batch_window_ms() -> float:
+        """Get how long a classification batch collects requests before it is sent."""
+        return float(os.getenv("CLASSIFICATION_BATCH_WINDOW_MS", "25"))
+    
+    @staticmethod
+    def get_classification_batch_size() -> int:
+        """Get the maximum number of patients in one classification batch."""
+        return int(os.getenv("CLASSIFICATION_BATCH_SIZE", "20"))
+    
+    @staticmethod
+    def get_cache_path() -> str:
+        """Get the path of the SQLite response cache."""
+        return os.getenv("CACHE_PATH", os.path.join(".cache", "llm_responses.sqlite"))
+    
+    @staticmethod
+    def get_cache_ttl_seconds() -> int:
+        """Get how long cached responses stay valid."""
+        return int(os.getenv("CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    
+    @staticmethod
+    def get_cache_memory_entries() -> int:
+        """Get the size of the in-memory LRU in front of the response cache."""
+        return int(os.getenv("CACHE_MEMORY_ENTRIES", "1024"))
+    
+    @staticmethod
+    def is_semantic_cache_enabled() -> bool:
+        """Check if the FAISS semantic cache is enabled for agent methods that have a threshold."""
+        enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "True")
+        return enabled.lower() in ("true", "1", "t")
+    
+    @staticmethod
+    def get_semantic_cache_dir() -> str:
+        """Get the directory holding the semantic cache indexes."""
+        return os.getenv("SEMANTIC_CACHE_DIR", os.path.join(".cache", "semantic"))
+    
+    @staticmethod
+    def get_semantic_cache_dim() -> int:
+        """Get the dimension of the local prompt embeddings."""
+        return int(os.getenv("SEMANTIC_CACHE_DIM", "1024"))
+    
+    @staticmethod
+    def get_semantic_cache_thresholds() -> Dict[str, float]:
+        """Get per-method similarity threshold overrides, e.g. 'wellness=0.98,care_recommendations=0.99'."""
+        thresholds = {}
+        for item in os.getenv("SEMANTIC_CACHE_THRESHOLDS", "").split(","):
+            if "=" in item:
+                method, value = item.split("=", 1)
+                thresholds[method.strip()] = float(value)
+        return thresholds
+    
+    @staticmethod
+    def triage_rules_enabled() -> bool:
+        """Check if clear-cut yes/no triage decisions are made by local rules instead of the LLM."""
+        enabled = os.getenv("TRIAGE_RULES_ENABLED", "True")
+        return enabled.lower() in ("true", "1", "t")
+    
+    @staticmethod
+    def get_triage_rules_path() -> Optional[str]:
+        """Get the optional JSON file overriding the triage rule thresholds."""
+        return os.getenv("TRIAGE_RULES_PATH") or None
+    
+    @staticmethod
+    def get_llm_backend() -> str:
+        """Get the LLM backend: 'groq' for the live API or 'simulated' for the offline stand-in."""
+        return os.getenv("LLM_BACKEND", "groq").lower()
+    
+    @staticmethod
+    def get_simulated_latency_ms() -> float:
+        """Get the median latency of the simulated backend in milliseconds."""
+        return float(os.getenv("SIMULATED_LATENCY_MS", "800"))
+    
+    @staticmethod
+    def get_simulated_latency_sigma() -> float:
+        """Get the spread (log-normal sigma) of the simulated latency."""
+        return float(os.getenv("SIMULATED_LATENCY_SIGMA", "0.3"))
+    
+    @staticmethod
+    def get_simulated_tokens_per_minute() -> int:
+        """Get the server-side tokens-per-minute limit of the simulated backend (0 disables it)."""
+        return int(os.getenv("SIMULATED_TOKENS_PER_MINUTE", "0"))
+    
+    @staticmethod
+    def get_simulated_error_rate() -> float:
+        """Get the fraction of simulated calls that fail with a random 429."""
+        return float(os.getenv("SIMULATED_ERROR_RATE", "0"))
+    
+    @staticmethod
+    def get_simulated_seed() -> Optional[int]:
+        """Get the random seed of the simulated backend, if runs should be reproducible."""
+        seed = os.getenv("SIMULATED_SEED")
+        return int(seed) if seed else None
+    
+    @staticmethod
+    def is_tracing_enabled() -> bool:
+        """Check if agent calls and workflow stages are recorded as trace spans."""
+        enabled = os.getenv("TRACING_ENABLED", "True")
+        return enabled.lower() in ("true", "1", "t")
+    
+    @staticmethod
+    def get_trace_path() -> Optional[str]:
+        """Get the file spans are exported to, if any."""
+        return os.getenv("TRACE_PATH") or None
+    
+    @staticmethod
+    def get_trace_format() -> str:
+        """Get the span export format: 'jsonl' (one span per line) or 'otlp' (OTLP/JSON document)."""
+        return os.getenv("TRACE_FORMAT", "jsonl").lower()
+    
+    @staticmethod
+    def is_streaming_enabled() -> bool:
+        """Check if agent responses are printed token by token as they are generated."""
+        enabled = os.getenv("STREAM_RESPONSES", "False")
+        return enabled.lower() in ("true", "1", "t")
+    
+    @staticmethod
+    def is_report_parquet_enabled() -> bool:
+        """Check if the batch results are also written as Parquet (needs pyarrow)."""
+        enabled = os.getenv("REPORT_PARQUET", "False")
+        return enabled.lower() in ("true", "1", "t")
+    
     @staticmethod
     def get_all_config() -> Dict[str, Any]:
         """Get all configuration values as a dictionary."""
         return {
             "groq_api_key": Config.get_groq_api_key(),
+            "groq_api_key_count": len(Config.get_groq_api_keys()),
             "model_name": Config.get_model_name(),
-            "debug": Config.is_debug_mode()
+            "debug": Config.is_debug_mode(),
+            "max_concurrency": Config.get_max_concurrency(),
+            "requests_per_minute": Config.get_requests_per_minute(),
+            "tokens_per_minute": Config.get_tokens_per_minute()
         }
\ No newline at end of file
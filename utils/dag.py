@@ -0,0 +1,243 @@
+from typing import Dict, List, Any, Optional, Callable, Iterable, Awaitable, NamedTuple, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+import asyncio
+import contextvars
+import threading
+
+from utils.resilience import contains_fallback
+from utils.tracing import get_tracer
+
+class Stage:
+    """A step of a workflow graph with declared inputs.
+
+    Args:
+        name: Unique stage name; its result is stored under this key
+        run: Callable taking the dict of results so far and returning the stage result
+        inputs: Names of the stages whose results this stage needs
+        condition: Optional predicate on the results so far; when it returns False
+                   the stage (and every stage depending on it) is skipped
+        arun: Optional async variant of run used by StageGraph.arun
+    """
+    
+    def __init__(self, name: str, run: Callable[[Dict[str, Any]], Any], inputs: Iterable[str] = (),
+                 condition: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                 arun: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]] = None):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.condition = condition
+        self.arun = arun
+
+class StageScope(NamedTuple):
+    """The running stage and every stage it depends on, directly or not, in graph order."""
+    name: str
+    ancestors: Tuple[str, ...]
+
+# The stage running in the current thread or task, if any (see agents.memory.PatientSession)
+_current_stage: contextvars.ContextVar[Optional[StageScope]] = contextvars.ContextVar("stage", default=None)
+
+def current_stage() -> Optional[StageScope]:
+    """Get the workflow stage running in the current thread or task, if any."""
+    return _current_stage.get()
+
+@contextmanager
+def _stage_scope(scope: StageScope):
+    """Mark a stage as running in the current thread or task, inside a trace span."""
+    token = _current_stage.set(scope)
+    try:
+        with get_tracer().span(f"stage:{scope.name}", kind="stage"):
+            yield
+    finally:
+        _current_stage.reset(token)
+
+def _run_stage(stage: Stage, scope: StageScope, inputs: Dict[str, Any]) -> Any:
+    """Run a stage inside its scope."""
+    with _stage_scope(scope):
+        return stage.run(inputs)
+
+class StageGraph:
+    """Executes stages as soon as their inputs are available, running independent stages concurrently.
+
+    Results of completed stages are collected in a dict keyed by stage name; skipped
+    stages are listed in `skipped`. An optional on_settled callback is invoked (in the
+    calling thread or task) every time a stage completes or is skipped. While a stage
+    runs, current_stage() names it and the stages it depends on.
+    
+    An optional checkpoint (e.g. utils.job_store.Job) makes runs resumable: its
+    load() returns the results of stages completed by an earlier run, which are
+    restored instead of run again, and save(name, result) is called for every
+    stage that completes. Stage results must then be JSON-serializable.
+    
+    A stage whose result holds a fallback response, or that used the result of such
+    a stage, is listed in `degraded` and never checkpointed, so a resumed run
+    computes it again instead of restoring the apology.
+    """
+    
+    def __init__(self, stages: List[Stage]):
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Stage names must be unique")
+        for stage in stages:
+            unknown = [name for name in stage.inputs if name not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {', '.join(unknown)}")
+        self._check_acyclic()
+        self.scopes = {name: StageScope(name, self._ancestors(name)) for name in self.stages}
+    
+    def _ancestors(self, name: str) -> Tuple[str, ...]:
+        """Get every stage a stage depends on, directly or not, in graph order."""
+        found, todo = set(), list(self.stages[name].inputs)
+        while todo:
+            dependency = todo.pop()
+            if dependency not in found:
+                found.add(dependency)
+                todo.extend(self.stages[dependency].inputs)
+        return tuple(stage for stage in self.stages if stage in found)
+    
+    def _check_acyclic(self):
+        """Raise ValueError if the stage dependencies contain a cycle."""
+        visiting, done = set(), set()
+        
+        def visit(name: str):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage graph has a cycle through '{name}'")
+            visiting.add(name)
+            for dependency in self.stages[name].inputs:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+        
+        for name in self.stages:
+            visit(name)
+    
+    def _ready(self, pending: List[str], settled: set, results: Dict[str, Any], skipped: set,
+               on_settled: Optional[Callable[[str, Dict[str, Any]], None]],
+               restored: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Pop the pending stages whose inputs are settled, resolving skips, conditions and restored results."""
+        progress = True
+        runnable = []
+        while progress:
+            progress = False
+            for name in list(pending):
+                stage = self.stages[name]
+                if not all(dependency in settled for dependency in stage.inputs):
+                    continue
+                pending.remove(name)
+                progress = True
+                if any(dependency in skipped for dependency in stage.inputs) or \
+                        (stage.condition is not None and not stage.condition(results)):
+                    skipped.add(name)
+                    settled.add(name)
+                    if on_settled:
+                        on_settled(name, results)
+                elif restored and name in restored:
+                    results[name] = restored[name]
+                    settled.add(name)
+                    if on_settled:
+                        on_settled(name, results)
+                else:
+                    runnable.append(name)
+        return runnable
+    
+    def _settle(self, name: str, results: Dict[str, Any], checkpoint: Any):
+        """Checkpoint a completed stage, unless it is degraded by a fallback response."""
+        if contains_fallback(results[name]) or any(dependency in self.degraded for dependency in self.stages[name].inputs):
+            self.degraded.add(name)
+        elif checkpoint is not None:
+            checkpoint.save(name, results[name])
+    
+    def run(self, on_settled: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+            max_workers: Optional[int] = None, checkpoint: Any = None) -> Dict[str, Any]:
+        """Run the graph with a thread pool; each stage runs in a copy of the caller's context."""
+        restored = checkpoint.load() if checkpoint is not None else None
+        results: Dict[str, Any] = {}
+        self.skipped: set = set()
+        self.degraded: set = set()
+        settled: set = set()
+        pending = list(self.stages)
+        
+        with ThreadPoolExecutor(max_workers=max_workers or len(self.stages)) as executor:
+            futures = {}
+            while pending or futures:
+                for name in self._ready(pending, settled, results, self.skipped, on_settled, restored):
+                    context = contextvars.copy_context()
+                    futures[executor.submit(context.run, _run_stage, self.stages[name], self.scopes[name], dict(results))] = name
+                if not futures:
+                    continue
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = futures.pop(future)
+                    results[name] = future.result()
+                    self._settle(name, results, checkpoint)
+                    settled.add(name)
+                    if on_settled:
+                        on_settled(name, results)
+        return results
+    
+    async def arun(self, on_settled: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                   checkpoint: Any = None) -> Dict[str, Any]:
+        """Run the graph as asyncio tasks, using each stage's arun when it has one."""
+        restored = checkpoint.load() if checkpoint is not None else None
+        results: Dict[str, Any] = {}
+        self.skipped = set()
+        self.degraded = set()
+        settled: set = set()
+        pending = list(self.stages)
+        tasks = {}
+        
+        async def call(stage: Stage, inputs: Dict[str, Any]) -> Any:
+            if stage.arun is None:
+                return await asyncio.to_thread(_run_stage, stage, self.scopes[stage.name], inputs)
+            with _stage_scope(self.scopes[stage.name]):
+                return await stage.arun(inputs)
+        
+        try:
+            while pending or tasks:
+                for name in self._ready(pending, settled, results, self.skipped, on_settled, restored):
+                    tasks[asyncio.ensure_future(call(self.stages[name], dict(results)))] = name
+                if not tasks:
+                    continue
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = tasks.pop(task)
+                    results[name] = task.result()
+                    self._settle(name, results, checkpoint)
+                    settled.add(name)
+                    if on_settled:
+                        on_settled(name, results)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return results
+
+def run_parallel(*calls: Callable[[], Any]) -> List[Any]:
+    """Run independent blocking calls concurrently in threads and return their results in order.
+
+    Each call runs in a copy of the caller's context, so the active patient session is preserved.
+    """
+    if len(calls) == 1:
+        return [calls[0]()]
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, call) for call in calls]
+        return [future.result() for future in futures]
+
+def run_in_thread(call: Callable[..., Any], *args: Any) -> Future:
+    """Start a blocking call in a daemon thread and return its future without waiting for it.
+
+    Unlike run_parallel, the caller may stop waiting and leave the call to finish in the
+    background. The call runs in a copy of the caller's context.
+    """
+    future = Future()
+    context = contextvars.copy_context()
+    
+    def run():
+        try:
+            future.set_result(context.run(call, *args))
+        except BaseException as e:
+            future.set_exception(e)
+    
+    threading.Thread(target=run, name=getattr(call, "__name__", "call"), daemon=True).start()
+    return future
\ No newline at end of file
@@ -1,6 +1,40 @@
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+import csv
 import json
 import os
+import re
+
+# Symptoms that route a patient to the cardiac workflow
+CARDIAC_SYMPTOMS = ['chest pain', 'chest pressure', 'shortness of breath', 'palpitations',
+                    'dizziness', 'fainting', 'sweating', 'nausea', 'jaw pain', 'arm pain']
+# Vital sign thresholds used for categorization (and as the baseline of the triage rules)
+HEART_RATE_MIN = 60
+HEART_RATE_MAX = 100
+SYSTOLIC_MAX = 140
+DIASTOLIC_MAX = 90
+# Medical history keywords that route a patient to the cardiac workflow
+CARDIAC_HISTORY_KEYWORDS = ['heart']
+
+# Columns of a flat CSV intake export that hold vital signs
+VITAL_SIGN_FIELDS = ['temperature', 'heart_rate', 'blood_pressure_systolic', 'blood_pressure_diastolic',
+                     'respiratory_rate', 'oxygen_saturation']
+# Columns of a CSV intake export holding ';'-separated lists
+LIST_FIELDS = ['symptoms', 'medical_history', 'medications', 'allergies']
+
+class KeywordMatcher:
+    """Precompiled multi-pattern substring matcher: one regex alternation scans the text once
+    regardless of the number of keywords."""
+    
+    def __init__(self, keywords: List[str]):
+        self.keywords = [keyword.lower() for keyword in keywords]
+        self._pattern = re.compile('|'.join(re.escape(keyword) for keyword in self.keywords))
+    
+    def search(self, text: str) -> bool:
+        """Check whether any keyword occurs in the (lowercased) text."""
+        return self._pattern.search(text) is not None
+
+_cardiac_symptom_matcher = KeywordMatcher(CARDIAC_SYMPTOMS)
+_cardiac_history_matcher = KeywordMatcher(CARDIAC_HISTORY_KEYWORDS)
 
 class DataProcessor:
     """Utility for processing and managing patient data."""
@@ -15,11 +49,8 @@ class DataProcessor:
     def categorize_patient(patient_data: Dict[str, Any]) -> str:
         """Categorize patient based on their data."""
         # Check for cardiac symptoms
-        cardiac_symptoms = ['chest pain', 'chest pressure', 'shortness of breath', 'palpitations', 
-                           'dizziness', 'fainting', 'sweating', 'nausea', 'jaw pain', 'arm pain']
-        
         symptoms = patient_data.get('symptoms', [])
-        has_cardiac_symptoms = any(symptom in ' '.join(symptoms).lower() for symptom in cardiac_symptoms)
+        has_cardiac_symptoms = _cardiac_symptom_matcher.search(' '.join(symptoms).lower())
         
         # Check vital signs for abnormalities
         vital_signs = patient_data.get('vital_signs', {})
@@ -28,17 +59,17 @@ class DataProcessor:
         if vital_signs:
             # Check heart rate
             heart_rate = vital_signs.get('heart_rate')
-            if heart_rate and (heart_rate < 60 or heart_rate > 100):
+            if heart_rate and (heart_rate < HEART_RATE_MIN or heart_rate > HEART_RATE_MAX):
                 has_abnormal_vitals = True
             
             # Check blood pressure
             systolic = vital_signs.get('blood_pressure_systolic')
             diastolic = vital_signs.get('blood_pressure_diastolic')
-            if (systolic and systolic > 140) or (diastolic and diastolic > 90):
+            if (systolic and systolic > SYSTOLIC_MAX) or (diastolic and diastolic > DIASTOLIC_MAX):
                 has_abnormal_vitals = True
         
         # Determine patient category
-        if has_cardiac_symptoms or ('heart' in ' '.join(patient_data.get('medical_history', [])).lower()):
+        if has_cardiac_symptoms or _cardiac_history_matcher.search(' '.join(patient_data.get('medical_history', [])).lower()):
             return 'cardiac'
         elif symptoms and (has_abnormal_vitals or len(symptoms) > 2):
             return 'sick'
@@ -72,4 +103,96 @@ class DataProcessor:
         with open(file_path, 'r') as f:
             patient_data = json.load(f)
         
-        return patient_data
\ No newline at end of file
+        return patient_data
+    
+    @staticmethod
+    def _parse_number(value: Any, field: str) -> Any:
+        """Convert a numeric field to int or float, raising ValueError with the field name if it is not numeric."""
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        try:
+            number = float(str(value).strip())
+        except ValueError:
+            raise ValueError(f"'{field}' is not a number: {value!r}")
+        return int(number) if number.is_integer() else number
+    
+    @staticmethod
+    def normalize_patient_record(record: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate a raw intake record and convert it to the patient data format.
+        
+        Accepts both nested records (as in data/patient_records.py) and flat CSV rows
+        with vital sign columns and ';'-separated list columns.
+        
+        Raises:
+            ValueError: If required fields are missing or a numeric field is not a number
+        """
+        if None in record:
+            raise ValueError("row has more fields than the header")
+        missing = [field for field in ['name', 'age', 'gender'] if record.get(field) in (None, '')]
+        if missing:
+            raise ValueError(f"missing required fields: {', '.join(missing)}")
+        
+        patient_data = {key: value for key, value in record.items()
+                        if key not in VITAL_SIGN_FIELDS and value not in (None, '')}
+        patient_data['age'] = DataProcessor._parse_number(record['age'], 'age')
+        
+        vital_signs = dict(record.get('vital_signs') or {})
+        for field in VITAL_SIGN_FIELDS:
+            if record.get(field) not in (None, ''):
+                vital_signs[field] = record[field]
+        patient_data['vital_signs'] = {field: DataProcessor._parse_number(value, field)
+                                       for field, value in vital_signs.items() if value not in (None, '')}
+        
+        for field in LIST_FIELDS:
+            value = patient_data.get(field, [])
+            if isinstance(value, str):
+                value = [item.strip() for item in value.split(';') if item.strip()]
+            if not isinstance(value, list):
+                raise ValueError(f"'{field}' must be a list")
+            patient_data[field] = value
+        
+        return patient_data
+    
+    @staticmethod
+    def _iter_raw_records(file_path: str) -> Iterator[Tuple[int, Any]]:
+        """Yield (line number, raw record or parse error) pairs from a JSONL or CSV file."""
+        extension = os.path.splitext(file_path)[1].lower()
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            if extension == '.csv':
+                reader = csv.DictReader(f)
+                for row in reader:
+                    # line_num is the last physical line read, which handles quoted newlines
+                    yield reader.line_num, row
+            elif extension in ('.jsonl', '.ndjson'):
+                for line_number, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        yield line_number, json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield line_number, ValueError(f"invalid JSON: {e.msg}")
+            else:
+                raise ValueError(f"Unsupported patient file format: {file_path} (expected .jsonl or .csv)")
+    
+    @staticmethod
+    def iter_patient_records(file_path: str, malformed: Optional[List[Dict[str, Any]]] = None) -> Iterator[Dict[str, Any]]:
+        """Stream validated patient records from a JSONL or CSV file without loading it into memory.
+        
+        Args:
+            file_path: Path to a .jsonl/.ndjson or .csv intake file
+            malformed: Optional list collecting {"line": ..., "error": ...} for every rejected row
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"Patient data file not found: {file_path}")
+        
+        for line_number, record in DataProcessor._iter_raw_records(file_path):
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                if not isinstance(record, dict):
+                    raise ValueError("record is not an object")
+                yield DataProcessor.normalize_patient_record(record)
+            except ValueError as e:
+                print(f"Skipping malformed record at {file_path}:{line_number}: {e}")
+                if malformed is not None:
+                    malformed.append({"line": line_number, "error": str(e)})
\ No newline at end of file
@@ -0,0 +1,157 @@
+from typing import Dict, List, Any, Optional
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils.config import Config
+
+class Job:
+    """One patient job; passed to StageGraph as its checkpoint so completed stages are saved and restored."""
+    
+    def __init__(self, store: "JobStore", job_id: str, patient_data: Dict[str, Any]):
+        self.store = store
+        self.job_id = job_id
+        self.patient_data = patient_data
+    
+    def load(self) -> Dict[str, Any]:
+        """Get the results of the stages completed by earlier attempts."""
+        return self.store.checkpoints(self.job_id)
+    
+    def save(self, stage: str, result: Any):
+        """Checkpoint the result of a completed stage."""
+        self.store.save_checkpoint(self.job_id, stage, result)
+    
+    def finish(self):
+        """Mark the job done so reruns skip it."""
+        self.store.set_status(self.job_id, "done")
+    
+    def retry_later(self, stages: List[str]):
+        """Leave the job pending because stages fell back; their checkpoints were not saved, so a rerun redoes them."""
+        self.store.incomplete += 1
+        self.store.set_status(self.job_id, "pending", f"Fallback responses in stages: {', '.join(stages)}")
+    
+    def fail(self, error: BaseException):
+        """Mark the job failed; its checkpoints are kept for the next attempt."""
+        self.store.set_status(self.job_id, "failed", str(error))
+
+class JobStore:
+    """Durable SQLite queue of patient jobs with per-stage checkpoints.
+
+    Jobs are keyed by a content hash of the patient record, so rerunning a batch
+    skips records that already finished and resumes the others from their last
+    completed stage instead of paying for those LLM calls again. Several worker
+    processes can share one store file.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or Config.get_job_store_path()
+        self.skipped = 0
+        self.resumed = 0
+        self.incomplete = 0
+        self._lock = threading.Lock()
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Other processes may hold the write lock briefly; wait for it rather than failing
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, patient TEXT NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, error TEXT, updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "job_id TEXT NOT NULL, stage TEXT NOT NULL, result TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (job_id, stage))"
+        )
+        self._db.commit()
+    
+    @staticmethod
+    def job_id(patient_data: Dict[str, Any]) -> str:
+        """Get the content hash identifying a patient record."""
+        encoded = json.dumps(patient_data, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+    
+    def enqueue(self, patient_data: Dict[str, Any]) -> str:
+        """Add a record as a pending job unless it is already queued; returns its job ID."""
+        job_id = self.job_id(patient_data)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO jobs (job_id, patient, status, updated_at) VALUES (?, ?, 'pending', ?)",
+                (job_id, json.dumps(patient_data, ensure_ascii=False, default=str), time.time())
+            )
+            self._db.commit()
+        return job_id
+    
+    def start(self, patient_data: Dict[str, Any]) -> Optional[Job]:
+        """Start (or resume) the job for a record, or return None if it already finished."""
+        job_id = self.enqueue(patient_data)
+        with self._lock:
+            row = self._db.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row[0] == "done":
+                self.skipped += 1
+                return None
+            self._db.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE job_id = ?",
+                (time.time(), job_id)
+            )
+            self._db.commit()
+        return Job(self, job_id, patient_data)
+    
+    def checkpoints(self, job_id: str) -> Dict[str, Any]:
+        """Get the checkpointed stage results of a job."""
+        with self._lock:
+            rows = self._db.execute("SELECT stage, result FROM checkpoints WHERE job_id = ?", (job_id,)).fetchall()
+        if rows:
+            with self._lock:
+                self.resumed += 1
+        return {stage: json.loads(result) for stage, result in rows}
+    
+    def save_checkpoint(self, job_id: str, stage: str, result: Any):
+        """Store the result of a completed stage."""
+        encoded = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO checkpoints (job_id, stage, result, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, stage, encoded, time.time())
+            )
+            self._db.commit()
+    
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None):
+        """Update a job's status."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, error, time.time(), job_id)
+            )
+            self._db.commit()
+    
+    def stats(self) -> Dict[str, int]:
+        """Get the number of jobs per status, plus how many were skipped, resumed or left incomplete by this process."""
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        counts["skipped"] = self.skipped
+        counts["resumed"] = self.resumed
+        counts["incomplete"] = self.incomplete
+        return counts
+    
+    def close(self):
+        """Close the underlying SQLite connection."""
+        with self._lock:
+            self._db.close()
+
+_job_store: Optional[JobStore] = None
+_job_store_lock = threading.Lock()
+
+def get_job_store() -> Optional[JobStore]:
+    """Get the process-wide job store, or None if job tracking is disabled."""
+    global _job_store
+    if not Config.is_job_store_enabled():
+        return None
+    with _job_store_lock:
+        if _job_store is None:
+            _job_store = JobStore()
+        return _job_store
\ No newline at end of file
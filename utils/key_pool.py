@@ -0,0 +1,169 @@
+from typing import Collection, Dict, List, Any, Optional
+import threading
+import time
+
+from utils.config import Config
+from utils.rate_limiter import RateLimiter, get_rate_limiter, status_code_from_error, retry_after_from_error
+from utils.resilience import CircuitBreaker, get_circuit_breaker
+
+# Longest a key is benched after repeated server errors
+MAX_BENCH_SECONDS = 60.0
+# Keys rejected as unauthorized are benched for much longer; they rarely recover on their own
+AUTH_BENCH_SECONDS = 300.0
+# Weight of the latest outcome in the error-rate moving average
+ERROR_RATE_ALPHA = 0.2
+
+class KeyState:
+    """Health and load of one API key in the pool."""
+    
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.limiter = get_rate_limiter(api_key)
+        self.breaker = get_circuit_breaker(api_key)
+        self.label = self.limiter.label
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.benched_until = 0.0
+
+class KeyLease:
+    """The model client, rate limiter and circuit breaker to use for one request attempt.
+
+    Leases must be released with the outcome of the attempt so the pool and the
+    circuit breaker can track the key's health, or aborted if no request was made.
+    """
+    
+    def __init__(self, llm: Any, limiter: RateLimiter, pool: Optional["KeyPool"] = None, key: Optional[KeyState] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.llm = llm
+        self.limiter = limiter
+        self.pool = pool
+        self.key = key
+        self.breaker = breaker or (key.breaker if key is not None else None)
+        self._released = False
+        self._allowed = False
+    
+    def allow(self) -> bool:
+        """Check with the circuit breaker that the attempt may be made."""
+        self._allowed = self.breaker is None or self.breaker.allow()
+        return self._allowed
+    
+    def release(self, error: Optional[Exception] = None):
+        """Report the outcome of the attempt; only the first call counts."""
+        if self._released:
+            return
+        self._released = True
+        if self.breaker is not None and self._allowed:
+            self.breaker.record(error)
+        if self.pool is not None:
+            self.pool.release(self.key, error)
+    
+    def abort(self):
+        """Give the key back without an outcome, for an attempt that was never made or was cancelled."""
+        if self._released:
+            return
+        self._released = True
+        if self.breaker is not None and self._allowed:
+            self.breaker.cancel()
+        if self.pool is not None:
+            self.pool.abort(self.key)
+
+class KeyPool:
+    """Routes every request to the healthy API key with the most headroom.
+
+    Headroom is the expected rate-limiter wait for the request, then the number of
+    requests already in flight on the key, then its remaining token budget. Keys that
+    return 429s are benched until the server's Retry-After; keys failing with 5xx or
+    connection errors are benched with exponential backoff.
+    """
+    
+    def __init__(self, api_keys: List[str], bench_seconds: Optional[float] = None):
+        if not api_keys:
+            raise ValueError("KeyPool needs at least one API key")
+        self.keys = [KeyState(api_key) for api_key in dict.fromkeys(api_keys)]
+        self.bench_seconds = bench_seconds if bench_seconds is not None else Config.get_key_bench_seconds()
+        self._lock = threading.Lock()
+    
+    def _score(self, key: KeyState, tokens: int, now: float, priority: Optional[int] = None):
+        """Sort key for selection; lower is better."""
+        wait = max(key.limiter.estimated_wait(tokens, priority), key.benched_until - now, key.breaker.open_for())
+        snapshot = key.limiter.snapshot()
+        token_fraction = snapshot["tokens_remaining"] / max(key.limiter.tokens.capacity, 1.0)
+        return (round(wait, 1), key.in_flight, -token_fraction, key.error_rate)
+    
+    def acquire(self, tokens: int, priority: Optional[int] = None, exclude: Collection[KeyState] = ()) -> KeyState:
+        """Pick the key with the most headroom for a request of `tokens` tokens and mark it in flight.
+        
+        Headroom is judged for the caller's priority class, so an emergency sees the
+        budget that routine calls leave untouched on every key. Keys in `exclude` are
+        skipped unless no other key is left (used to send a hedged request on a second
+        key, or to move past keys whose circuit is open).
+        """
+        with self._lock:
+            now = time.monotonic()
+            candidates = [key for key in self.keys if key not in exclude] or self.keys
+            key = min(candidates, key=lambda candidate: self._score(candidate, tokens, now, priority))
+            key.in_flight += 1
+            key.requests += 1
+            return key
+    
+    def release(self, key: KeyState, error: Optional[Exception] = None):
+        """Record the outcome of a request on a key, benching it if the error points at the key."""
+        with self._lock:
+            key.in_flight -= 1
+            key.error_rate = (1 - ERROR_RATE_ALPHA) * key.error_rate + ERROR_RATE_ALPHA * (error is not None)
+            if error is None:
+                key.consecutive_failures = 0
+                return
+            
+            key.failures += 1
+            key.consecutive_failures += 1
+            status = status_code_from_error(error)
+            now = time.monotonic()
+            if status == 429:
+                bench = retry_after_from_error(error) or self.bench_seconds
+            elif status in (401, 403):
+                bench = AUTH_BENCH_SECONDS
+            elif status is None or status >= 500:
+                bench = min(MAX_BENCH_SECONDS, self.bench_seconds * 2 ** (key.consecutive_failures - 1))
+            else:
+                # Other 4xx errors are caused by the request, not the key
+                return
+            key.benched_until = max(key.benched_until, now + bench)
+            print(f"[key pool] Benching key {key.label} for {bench:.1f}s after {status or type(error).__name__}")
+    
+    def abort(self, key: KeyState):
+        """Take a key out of flight without recording an outcome."""
+        with self._lock:
+            key.in_flight -= 1
+    
+    def stats(self) -> List[Dict[str, Any]]:
+        """Get the load, health and remaining budget of every key."""
+        now = time.monotonic()
+        with self._lock:
+            stats = []
+            for key in self.keys:
+                snapshot = key.limiter.snapshot()
+                stats.append({
+                    "key": key.label,
+                    "requests": key.requests,
+                    "failures": key.failures,
+                    "error_rate": key.error_rate,
+                    "in_flight": key.in_flight,
+                    "benched_for": max(0.0, key.benched_until - now),
+                    "tokens_remaining": snapshot["tokens_remaining"]
+                })
+            return stats
+
+_key_pool: Optional[KeyPool] = None
+_key_pool_lock = threading.Lock()
+
+def get_key_pool() -> KeyPool:
+    """Get the process-wide pool of the configured Groq API keys, creating it on first use."""
+    global _key_pool
+    with _key_pool_lock:
+        if _key_pool is None:
+            _key_pool = KeyPool(Config.get_groq_api_keys())
+        return _key_pool
\ No newline at end of file
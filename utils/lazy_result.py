@@ -0,0 +1,131 @@
+from typing import Dict, List, Any, Optional, Callable, Awaitable, Tuple
+from concurrent.futures import Future
+import asyncio
+import threading
+
+# Per-field counts of lazy fields that were computed or skipped, keyed by field name
+_field_counts: Dict[str, List[int]] = {}
+_counts_lock = threading.Lock()
+
+def _count(key: str, computed: bool):
+    """Record that a lazy field was computed, or settled without being read."""
+    with _counts_lock:
+        counts = _field_counts.setdefault(key, [0, 0])
+        counts[0 if computed else 1] += 1
+
+class LazyResult(dict):
+    """Agent result dict whose expensive optional fields are only computed when read.
+
+    Eager fields are set as usual. defer() registers a lazy field with a function
+    computing it (and optionally an async twin); the first read through [] or get()
+    computes and stores it, and aget() does the same without blocking the event loop.
+    Concurrent readers of a field share one computation. Only computed fields are
+    items of the dict, so a serialized result holds exactly what was used; settle()
+    drops the fields nobody read and counts them as skipped.
+    """
+    
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._pending: Dict[str, Tuple[Callable[[], Any], Optional[Callable[[], Awaitable[Any]]]]] = {}
+        self._computing: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+    
+    def defer(self, key: str, compute: Callable[[], Any], acompute: Optional[Callable[[], Awaitable[Any]]] = None):
+        """Register a lazy field; acompute is used by aget() and defaults to running compute in a thread."""
+        self._pending[key] = (compute, acompute)
+    
+    def is_pending(self, key: str) -> bool:
+        """Check if a field is lazy and has not been computed yet."""
+        return key in self._pending or key in self._computing
+    
+    def _claim(self, key: str) -> Tuple[Optional[Future], Optional[Tuple[Callable, Optional[Callable]]]]:
+        """Start computing a pending field, or join the caller already computing it (functions is then None).
+        
+        Both are None if the field was computed in the meantime.
+        """
+        with self._lock:
+            if key in self._computing:
+                return self._computing[key], None
+            if key not in self._pending:
+                return None, None
+            functions = self._pending.pop(key)
+            future = self._computing[key] = Future()
+            return future, functions
+    
+    def _store(self, key: str, future: Future, value: Any = None, error: Optional[BaseException] = None,
+               functions: Optional[Tuple[Callable, Optional[Callable]]] = None):
+        """Finish computing a field: store its value, or make it pending again after an error."""
+        with self._lock:
+            del self._computing[key]
+            if error is None:
+                super().__setitem__(key, value)
+            else:
+                self._pending[key] = functions
+        if error is None:
+            _count(key, computed=True)
+            future.set_result(value)
+        else:
+            future.set_exception(error)
+    
+    def _resolve(self, key: str) -> Any:
+        """Compute a pending field, or wait for the caller already computing it."""
+        future, functions = self._claim(key)
+        if future is None:
+            return super().__getitem__(key)
+        if functions is None:
+            return future.result()
+        try:
+            value = functions[0]()
+        except BaseException as e:
+            self._store(key, future, error=e, functions=functions)
+            raise
+        self._store(key, future, value)
+        return value
+    
+    def __getitem__(self, key: str) -> Any:
+        if self.is_pending(key):
+            return self._resolve(key)
+        return super().__getitem__(key)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        if self.is_pending(key):
+            return self._resolve(key)
+        return super().get(key, default)
+    
+    def __contains__(self, key: object) -> bool:
+        return self.is_pending(key) or super().__contains__(key)
+    
+    async def aget(self, key: str, default: Any = None) -> Any:
+        """Async twin of get; computes a pending field with its async function."""
+        if not self.is_pending(key):
+            return super().get(key, default)
+        future, functions = self._claim(key)
+        if future is None:
+            return super().get(key, default)
+        if functions is None:
+            return await asyncio.shield(asyncio.wrap_future(future))
+        compute, acompute = functions
+        try:
+            value = await acompute() if acompute is not None else await asyncio.to_thread(compute)
+        except BaseException as e:
+            self._store(key, future, error=e, functions=functions)
+            raise
+        self._store(key, future, value)
+        return value
+    
+    def settle(self) -> List[str]:
+        """Drop the lazy fields that were never read, count them as skipped and return their names."""
+        with self._lock:
+            skipped = list(self._pending)
+            self._pending.clear()
+        for key in skipped:
+            _count(key, computed=False)
+        return skipped
+
+def lazy_field_report() -> Dict[str, Dict[str, int]]:
+    """Get how often each lazy field was computed and skipped so far."""
+    with _counts_lock:
+        return {
+            key: {"computed": computed, "skipped": skipped}
+            for key, (computed, skipped) in sorted(_field_counts.items())
+        }
\ No newline at end of file
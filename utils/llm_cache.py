@@ -0,0 +1,132 @@
+from typing import Dict, List, Any, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils.config import Config
+
+class ResponseCache:
+    """Content-addressed cache of LLM responses keyed on the model and message list.
+
+    Lookups go through an in-memory LRU first and fall back to a SQLite file, so
+    cached responses survive restarts. Entries expire after ttl_seconds.
+    """
+    
+    def __init__(self, path: Optional[str] = None, ttl_seconds: Optional[int] = None,
+                 max_memory_entries: Optional[int] = None):
+        self.path = path or Config.get_cache_path()
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.get_cache_ttl_seconds()
+        self.max_memory_entries = max_memory_entries or Config.get_cache_memory_entries()
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self.evict_expired()
+    
+    @staticmethod
+    def make_key(model_name: str, messages: List[Any]) -> str:
+        """Build the cache key for a model and a list of chat messages."""
+        payload = [model_name] + [
+            [getattr(message, "type", "human"), str(getattr(message, "content", message))]
+            for message in messages
+        ]
+        encoded = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached response, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return response
+                del self._memory[key]
+            
+            row = self._db.execute(
+                "SELECT response, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                response, expires_at = row
+                if expires_at > now:
+                    self._remember(key, response, expires_at)
+                    self.disk_hits += 1
+                    return response
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+            
+            self.misses += 1
+            return None
+    
+    def set(self, key: str, response: str):
+        """Store a response under a key."""
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, response, expires_at)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, expires_at) VALUES (?, ?, ?)",
+                (key, response, expires_at)
+            )
+            self._db.commit()
+    
+    def _remember(self, key: str, response: str, expires_at: float):
+        """Put an entry in the in-memory LRU, evicting the least recently used one if full."""
+        self._memory[key] = (response, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+    
+    def evict_expired(self) -> int:
+        """Delete expired entries from disk and memory, returning how many were removed from disk."""
+        now = time.time()
+        with self._lock:
+            for key in [key for key, (_, expires_at) in self._memory.items() if expires_at <= now]:
+                del self._memory[key]
+            removed = self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,)).rowcount
+            self._db.commit()
+        return removed
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters."""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0
+            }
+    
+    def close(self):
+        """Close the underlying SQLite connection."""
+        with self._lock:
+            self._db.close()
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    """Get the process-wide response cache, opening it on first use."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
\ No newline at end of file
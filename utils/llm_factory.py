@@ -0,0 +1,176 @@
+from typing import Collection, Dict, List, Any, Optional, Iterator, AsyncIterator, Tuple
+import os
+import threading
+
+import httpx
+try:
+    import h2
+except ImportError:
+    h2 = None
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+from utils.config import Config
+from utils.key_pool import KeyPool, KeyLease, KeyState, get_key_pool
+from utils.rate_limiter import get_rate_limiter
+from utils.tokens import estimate_message_tokens
+
+_clients: Dict[str, BaseChatModel] = {}
+_clients_lock = threading.Lock()
+
+# Process that created the shared HTTP clients; a forked worker builds its own
+_http_clients: Optional[Tuple[int, httpx.Client, httpx.AsyncClient]] = None
+_http_clients_lock = threading.Lock()
+
+def _limiter_for(response: httpx.Response):
+    """Get the rate limiter of the API key a response was requested with."""
+    authorization = response.request.headers.get("authorization", "")
+    api_key = authorization[len("Bearer "):] if authorization.startswith("Bearer ") else None
+    return get_rate_limiter(api_key)
+
+def _observe_response(response: httpx.Response):
+    """httpx response event hook feeding rate-limit headers into the limiter of the request's key."""
+    _limiter_for(response).observe_response(response)
+
+async def _aobserve_response(response: httpx.Response):
+    """Async httpx response event hook."""
+    await _limiter_for(response).aobserve_response(response)
+
+def is_http2_available() -> bool:
+    """Check if the shared HTTP clients speak HTTP/2 (enabled and the h2 package installed)."""
+    return h2 is not None and Config.is_http2_enabled()
+
+def get_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """Get the process-wide sync and async HTTP clients shared by every Groq client, creating them on first use.
+    
+    All agents and API keys share one keep-alive connection pool per process, so
+    connections (and their TLS sessions) opened by one call are reused by the next
+    instead of every key or agent paying for its own cold connections.
+    """
+    global _http_clients
+    with _http_clients_lock:
+        if _http_clients is None or _http_clients[0] != os.getpid():
+            max_connections = Config.get_http_max_connections()
+            limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                  keepalive_expiry=Config.get_http_keepalive_seconds())
+            http2 = is_http2_available()
+            _http_clients = (
+                os.getpid(),
+                httpx.Client(limits=limits, http2=http2, event_hooks={"response": [_observe_response]}),
+                httpx.AsyncClient(limits=limits, http2=http2, event_hooks={"response": [_aobserve_response]})
+            )
+        return _http_clients[1], _http_clients[2]
+
+def get_groq_client(api_key: str, model_name: Optional[str] = None) -> BaseChatModel:
+    """Get the shared ChatGroq client for an API key and model, creating it on first use.
+    
+    Clients are cheap wrappers holding the key; their requests all go through the
+    shared HTTP connection pool.
+    """
+    model_name = model_name or Config.get_model_name()
+    cache_key = f"{model_name}:{api_key}"
+    with _clients_lock:
+        client = _clients.get(cache_key)
+        if client is None:
+            # Imported here because the Groq SDK is slow to import and unused by the simulated backend
+            from langchain_groq import ChatGroq
+            
+            # Rate limiting is handled by the shared per-key limiters: the HTTP clients feed them
+            # the x-ratelimit-* response headers, and retries are left to BaseAgent so that
+            # 429s are retried after the server's Retry-After rather than a fixed backoff.
+            http_client, http_async_client = get_http_clients()
+            client = ChatGroq(
+                groq_api_key=api_key,
+                model_name=model_name,
+                max_retries=0,
+                http_client=http_client,
+                http_async_client=http_async_client
+            )
+            _clients[cache_key] = client
+        return client
+
+class PooledChatModel(BaseChatModel):
+    """Groq chat model that leases an API key from the key pool for every request.
+
+    BaseAgent leases keys itself (see lease) so each retry can move to a healthier
+    key; invoking the model directly leases a key for the single call.
+    """
+    
+    model_name: str
+    pool: KeyPool
+    
+    @classmethod
+    def from_config(cls) -> "PooledChatModel":
+        """Create a pooled model over all configured Groq API keys."""
+        return cls(model_name=Config.get_model_name(), pool=get_key_pool())
+    
+    @property
+    def _llm_type(self) -> str:
+        return "groq-pooled"
+    
+    def client_for(self, key: KeyState) -> BaseChatModel:
+        """Get the client bound to a pool key."""
+        return get_groq_client(key.api_key, self.model_name)
+    
+    def lease(self, tokens: int, priority: Optional[int] = None, exclude: Collection[KeyState] = ()) -> KeyLease:
+        """Lease the key with the most headroom for a request of `tokens` tokens at a priority class."""
+        key = self.pool.acquire(tokens, priority, exclude)
+        return KeyLease(self.client_for(key), key.limiter, self.pool, key)
+    
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        lease = self.lease(estimate_message_tokens(messages))
+        try:
+            result = lease.llm._generate(messages, stop=stop, **kwargs)
+        except Exception as e:
+            lease.release(e)
+            raise
+        lease.release()
+        return result
+    
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        lease = self.lease(estimate_message_tokens(messages))
+        try:
+            result = await lease.llm._agenerate(messages, stop=stop, **kwargs)
+        except Exception as e:
+            lease.release(e)
+            raise
+        lease.release()
+        return result
+    
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        lease = self.lease(estimate_message_tokens(messages))
+        try:
+            yield from lease.llm._stream(messages, stop=stop, **kwargs)
+        except Exception as e:
+            lease.release(e)
+            raise
+        finally:
+            # Release is idempotent; this also covers a consumer that stops reading early
+            lease.release()
+    
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        lease = self.lease(estimate_message_tokens(messages))
+        try:
+            async for chunk in lease.llm._astream(messages, stop=stop, **kwargs):
+                yield chunk
+        except Exception as e:
+            lease.release(e)
+            raise
+        finally:
+            # Release is idempotent; this also covers a consumer that stops reading early
+            lease.release()
+
+_pooled_model: Optional[PooledChatModel] = None
+
+def get_pooled_chat_model() -> PooledChatModel:
+    """Get the pooled model shared by every agent of this process, creating it on first use."""
+    global _pooled_model
+    with _clients_lock:
+        if _pooled_model is None:
+            _pooled_model = PooledChatModel.from_config()
+        return _pooled_model
\ No newline at end of file
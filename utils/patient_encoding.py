@@ -0,0 +1,69 @@
+from typing import Dict, List, Any, Optional
+
+# Short labels for the vital signs; unknown keys keep their own name
+VITAL_LABELS = {
+    "temperature": "Temp",
+    "heart_rate": "HR",
+    "respiratory_rate": "RR",
+    "oxygen_saturation": "SpO2"
+}
+
+def _join(items: Optional[List[Any]], empty: str = "none") -> str:
+    """Join a list field with '; ', or return `empty` if it is missing or empty."""
+    if not items:
+        return empty
+    if isinstance(items, str):
+        return items
+    return "; ".join(str(item) for item in items)
+
+def _format_value(value: Any) -> str:
+    """Format a vital sign value without a trailing '.0'."""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+class PatientEncoding:
+    """Compact, token-efficient text encoding of a patient record.
+
+    Every field is formatted once, so prompts only splice ready-made strings.
+    Lists are '; '-separated and vital signs use short labels
+    (e.g. 'BP 180/100, HR 110, SpO2 91') instead of a Python dict repr.
+    """
+    
+    def __init__(self, patient_data: Dict[str, Any]):
+        self.name = str(patient_data.get('name', 'Unknown'))
+        age = patient_data.get('age')
+        gender = patient_data.get('gender')
+        self.demographics = f"{age if age is not None else '?'}yo {gender or 'unknown gender'}"
+        self.symptoms = _join(patient_data.get('symptoms'), "none reported")
+        self.vitals = self._encode_vitals(patient_data.get('vital_signs') or {})
+        self.history = _join(patient_data.get('medical_history'))
+        self.medications = _join(patient_data.get('medications'))
+        self.allergies = _join(patient_data.get('allergies'))
+        self.location = str(patient_data.get('location') or 'unknown')
+        # The clinical picture shared by the triage prompts, one field per line
+        self.clinical = (
+            f"Patient: {self.demographics}\n"
+            f"Symptoms: {self.symptoms}\n"
+            f"Vitals: {self.vitals}\n"
+            f"History: {self.history}"
+        )
+        # The clinical picture plus medications, shared by the assessment and planning prompts
+        self.profile = f"{self.clinical}\nMeds: {self.medications}"
+    
+    @staticmethod
+    def _encode_vitals(vital_signs: Dict[str, Any]) -> str:
+        """Encode the vital signs as 'BP s/d, HR n, ...'."""
+        if not vital_signs:
+            return "not available"
+        parts = []
+        systolic = vital_signs.get('blood_pressure_systolic')
+        diastolic = vital_signs.get('blood_pressure_diastolic')
+        if systolic is not None or diastolic is not None:
+            parts.append(f"BP {_format_value(systolic) if systolic is not None else '?'}/"
+                         f"{_format_value(diastolic) if diastolic is not None else '?'}")
+        for key, value in vital_signs.items():
+            if key in ('blood_pressure_systolic', 'blood_pressure_diastolic') or value is None:
+                continue
+            parts.append(f"{VITAL_LABELS.get(key, key)} {_format_value(value)}")
+        return ", ".join(parts)
\ No newline at end of file
@@ -0,0 +1,173 @@
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+import heapq
+import itertools
+import threading
+import time
+
+import numpy as np
+
+from utils.config import Config
+from utils.data_processor import DataProcessor
+from utils.triage_rules import TriageRuleEngine, get_triage_engine
+
+class PriorityClass(IntEnum):
+    """Scheduling classes of batch patients; lower values are served first."""
+    EMERGENCY = 0
+    CARDIAC = 1
+    SICK = 2
+    ROUTINE = 3
+    
+    @property
+    def label(self) -> str:
+        return self.name.lower()
+
+# Classes of the categories returned by DataProcessor.categorize_patient
+_CATEGORY_CLASSES = {"cardiac": PriorityClass.CARDIAC, "sick": PriorityClass.SICK, "normal": PriorityClass.ROUTINE}
+
+# Used to spot emergencies for scheduling even when rule-based triage decisions are disabled
+_default_engine = TriageRuleEngine()
+
+def classify_patient(patient_data: Dict[str, Any]) -> PriorityClass:
+    """Get a patient's priority class from its category and emergency flag.
+
+    A cardiac patient is an emergency if the record says so ('emergency': true) or the
+    triage rules find the vitals and symptoms clear-cut enough; neither needs the LLM.
+    """
+    priority = _CATEGORY_CLASSES[DataProcessor.categorize_patient(patient_data)]
+    if priority == PriorityClass.CARDIAC:
+        engine = get_triage_engine() or _default_engine
+        decision = engine.cardiac_emergency(patient_data)
+        if patient_data.get('emergency') or (decision is not None and decision.value):
+            return PriorityClass.EMERGENCY
+    return priority
+
+def budget_floor(priority: Optional[int]) -> float:
+    """Get the share of a rate-limit budget a call of this class must leave untouched.
+
+    Emergencies (and calls made outside the scheduler) may spend the whole budget;
+    each lower class holds back a larger share, up to PRIORITY_RESERVED_BUDGET for
+    routine patients, so the more urgent classes still find budget when throttled.
+    """
+    if priority is None or not Config.is_priority_scheduling_enabled():
+        return 0.0
+    return Config.get_priority_reserved_budget() * priority / PriorityClass.ROUTINE
+
+class Ticket:
+    """A scheduled patient: its priority class and the milestones measured against the class SLO."""
+    
+    def __init__(self, patient_data: Dict[str, Any], priority: PriorityClass, sequence: int):
+        self.patient_data = patient_data
+        self.priority = priority
+        self.sequence = sequence
+        self.queued_at = time.monotonic()
+        self.assessed_at: Optional[float] = None
+    
+    def mark_assessed(self):
+        """Record when the triage assessment (with any emergency instructions) was ready."""
+        if self.assessed_at is None:
+            self.assessed_at = time.monotonic()
+
+_current_ticket: ContextVar[Optional[Ticket]] = ContextVar("priority_ticket", default=None)
+
+def current_ticket() -> Optional[Ticket]:
+    """Get the ticket of the patient being processed in this context, if it was scheduled."""
+    return _current_ticket.get()
+
+def current_priority() -> Optional[PriorityClass]:
+    """Get the priority class of the patient being processed in this context, if any."""
+    ticket = _current_ticket.get()
+    return ticket.priority if ticket is not None else None
+
+@contextmanager
+def scheduled(ticket: Optional[Ticket]) -> Iterator[Optional[Ticket]]:
+    """Process a patient under its ticket; LLM calls made inside draw on the budget of its class."""
+    token = _current_ticket.set(ticket)
+    try:
+        yield ticket
+    finally:
+        _current_ticket.reset(token)
+
+class PatientQueue:
+    """Lookahead buffer that hands out the most urgent queued patient first.
+
+    The batch loop keeps up to PRIORITY_LOOKAHEAD patients queued while every slot is
+    busy, so an emergency arriving behind routine check-ups is admitted as soon as a
+    slot frees up instead of waiting its turn in input order. Without priority
+    scheduling, patients are still classified (for the SLO report) but leave in
+    input order.
+    """
+    
+    def __init__(self, by_priority: Optional[bool] = None):
+        self.by_priority = by_priority if by_priority is not None else Config.is_priority_scheduling_enabled()
+        self._heap: List[Tuple[int, int, Ticket]] = []
+        self._sequence = itertools.count()
+    
+    def push(self, patient_data: Dict[str, Any]) -> Ticket:
+        """Classify and queue a patient."""
+        ticket = Ticket(patient_data, classify_patient(patient_data), next(self._sequence))
+        # Most urgent class first, input order within a class
+        rank = ticket.priority if self.by_priority else 0
+        heapq.heappush(self._heap, (rank, ticket.sequence, ticket))
+        return ticket
+    
+    def pop(self) -> Ticket:
+        """Take the most urgent queued patient."""
+        return heapq.heappop(self._heap)[2]
+    
+    def __len__(self) -> int:
+        return len(self._heap)
+
+class SLOTracker:
+    """Per-class latency of scheduled patients, measured from the moment they were queued.
+
+    Time to assessment is what the SLO targets apply to: for emergencies it is the
+    time until the emergency instructions are ready. Time to report covers the whole
+    workflow.
+    """
+    
+    def __init__(self, targets: Optional[Dict[str, float]] = None):
+        self.targets = targets or Config.get_priority_slo_seconds()
+        self._assessed: Dict[PriorityClass, List[float]] = {}
+        self._completed: Dict[PriorityClass, List[float]] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, ticket: Ticket):
+        """Record the milestones of a finished patient."""
+        now = time.monotonic()
+        with self._lock:
+            self._completed.setdefault(ticket.priority, []).append(now - ticket.queued_at)
+            if ticket.assessed_at is not None:
+                self._assessed.setdefault(ticket.priority, []).append(ticket.assessed_at - ticket.queued_at)
+    
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Get patients, p50/p95 time to assessment, p95 time to report and SLO breaches per class."""
+        with self._lock:
+            completed = {priority: np.array(values) for priority, values in self._completed.items()}
+            assessed = {priority: np.array(values) for priority, values in self._assessed.items()}
+        summary = {}
+        for priority in sorted(completed):
+            target = self.targets.get(priority.label)
+            to_assessment = assessed.get(priority, np.array([]))
+            summary[priority.label] = {
+                "patients": len(completed[priority]),
+                "assessment_p50": float(np.percentile(to_assessment, 50)) if len(to_assessment) else None,
+                "assessment_p95": float(np.percentile(to_assessment, 95)) if len(to_assessment) else None,
+                "report_p95": float(np.percentile(completed[priority], 95)),
+                "slo_seconds": target,
+                "breaches": int((to_assessment > target).sum()) if target is not None else 0
+            }
+        return summary
+
+_slo_tracker: Optional[SLOTracker] = None
+_slo_tracker_lock = threading.Lock()
+
+def get_slo_tracker() -> SLOTracker:
+    """Get the process-wide SLO tracker."""
+    global _slo_tracker
+    with _slo_tracker_lock:
+        if _slo_tracker is None:
+            _slo_tracker = SLOTracker()
+        return _slo_tracker
\ No newline at end of file
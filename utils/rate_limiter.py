@@ -0,0 +1,280 @@
+from typing import Dict, Any, Optional, Mapping, Tuple
+import asyncio
+import re
+import threading
+import time
+
+from utils.config import Config
+from utils.priority import budget_floor
+
+_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse a rate-limit duration header such as '7.66s', '2m59.56s' or '120ms' into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+class TokenBucket:
+    """Continuously refilling budget of `capacity` units per `period` seconds.
+
+    Reservations are taken up front and may drive the level negative; the caller
+    then waits for the returned number of seconds, which is exactly how long the
+    bucket needs to refill back to zero. Not thread-safe on its own; RateLimiter
+    serializes access.
+    """
+    
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.period = period
+        self.level = float(capacity)
+        self.updated_at = time.monotonic()
+    
+    @property
+    def rate(self) -> float:
+        """Units refilled per second."""
+        return self.capacity / self.period
+    
+    def refill(self, now: float):
+        """Add the units accrued since the last update."""
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.level = min(self.capacity, self.level + elapsed * self.rate)
+            self.updated_at = now
+    
+    def reserve(self, amount: float, now: float) -> float:
+        """Take `amount` units and return the seconds to wait before using them."""
+        self.refill(now)
+        self.level -= amount
+        if self.level >= 0:
+            return 0.0
+        return -self.level / self.rate
+    
+    def wait_above(self, amount: float, floor: float, now: float) -> float:
+        """Seconds until `amount` units can be taken while keeping `floor` (a share of capacity) in the bucket."""
+        self.refill(now)
+        reserved = max(0.0, min(floor * self.capacity, self.capacity - amount))
+        return max(0.0, (reserved + amount - self.level) / self.rate)
+    
+    def debt_wait(self, amount: float) -> float:
+        """Seconds a full bucket needs to pay back taking `amount` units (0 unless it exceeds capacity)."""
+        return max(0.0, amount - self.capacity) / self.rate
+    
+    def give_back(self, amount: float, now: float):
+        """Return over-reserved units (or take more when `amount` is negative)."""
+        self.refill(now)
+        self.level = min(self.capacity, self.level + amount)
+    
+    def sync(self, remaining: Optional[float], reset_seconds: Optional[float], now: float):
+        """Align the bucket with the remaining budget reported by the server."""
+        self.refill(now)
+        if remaining is None:
+            return
+        if remaining <= 0 and reset_seconds:
+            # Nothing left until the server-side window resets
+            self.level = min(self.level, -reset_seconds * self.rate)
+        else:
+            self.level = min(self.level, remaining)
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limiter for a single API key.
+
+    Safe to share between threads and asyncio tasks: the lock only guards the
+    bookkeeping, and waiting happens outside it with time.sleep or asyncio.sleep.
+    Calls only wait when the budget is actually exhausted.
+    """
+    
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, label: str = "default"):
+        self.label = label
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+    
+    def _reserve(self, tokens: int, floor: float = 0.0, max_wait: Optional[float] = None) -> Tuple[float, bool]:
+        """Reserve one request and `tokens` tokens, returning the seconds to wait and whether they were reserved.
+        
+        With a floor, nothing is reserved unless the call leaves that share of both budgets
+        untouched; the caller then tries again after the returned wait. Raises TimeoutError,
+        without reserving anything, if the wait would be longer than `max_wait`.
+        """
+        with self._lock:
+            now = time.monotonic()
+            blocked = self.blocked_until - now
+            if floor > 0 or max_wait is not None:
+                requests_wait = self.requests.wait_above(1, floor, now)
+                tokens_wait = self.tokens.wait_above(tokens, floor, now)
+                wait = max(requests_wait, tokens_wait, blocked)
+                if max_wait is not None and wait > max_wait:
+                    raise TimeoutError(f"Rate-limit budget of key {self.label} is not available within {max(max_wait, 0.0):.1f}s")
+                # A request larger than the whole budget can never leave the floor untouched;
+                # like a floor-0 call it goes into debt, but only once the bucket is full
+                hold = max(requests_wait - self.requests.debt_wait(1), tokens_wait - self.tokens.debt_wait(tokens), blocked)
+                if floor > 0 and hold > 0:
+                    return hold, False
+            wait = max(
+                self.requests.reserve(1, now),
+                self.tokens.reserve(tokens, now),
+                blocked
+            )
+            return max(0.0, wait), True
+    
+    def acquire(self, tokens: int, priority: Optional[int] = None, timeout: Optional[float] = None) -> float:
+        """Block the calling thread until a request of `tokens` tokens fits the budget.
+        
+        Calls of a lower priority class leave a share of the budget for the more urgent
+        classes (see utils.priority.budget_floor), so they may wait while it is not exhausted.
+        
+        Returns:
+            The number of seconds spent waiting
+        
+        Raises:
+            TimeoutError: If the budget would not be available within `timeout` seconds;
+                          nothing is reserved then
+        """
+        floor = budget_floor(priority)
+        waited = 0.0
+        while True:
+            wait, reserved = self._reserve(tokens, floor, timeout - waited if timeout is not None else None)
+            if wait > 0:
+                if Config.is_debug_mode():
+                    print(f"[rate limiter {self.label}] Waiting {wait:.2f}s for budget")
+                time.sleep(wait)
+                waited += wait
+            if reserved:
+                return waited
+    
+    async def aacquire(self, tokens: int, priority: Optional[int] = None, timeout: Optional[float] = None) -> float:
+        """Async twin of acquire; waits without blocking the event loop."""
+        floor = budget_floor(priority)
+        waited = 0.0
+        while True:
+            wait, reserved = self._reserve(tokens, floor, timeout - waited if timeout is not None else None)
+            if wait > 0:
+                if Config.is_debug_mode():
+                    print(f"[rate limiter {self.label}] Waiting {wait:.2f}s for budget")
+                await asyncio.sleep(wait)
+                waited += wait
+            if reserved:
+                return waited
+    
+    def record_usage(self, reserved_tokens: int, actual_tokens: Optional[int]):
+        """Reconcile a reservation with the token usage reported for the call."""
+        if actual_tokens is None:
+            return
+        with self._lock:
+            self.tokens.give_back(reserved_tokens - actual_tokens, time.monotonic())
+    
+    def record_rate_limited(self, retry_after: Optional[float]):
+        """Block the key after a 429 until the server says it may be used again."""
+        with self._lock:
+            now = time.monotonic()
+            # Without a Retry-After hint, wait until one request's worth of budget refills
+            delay = retry_after if retry_after is not None else 1.0 / self.requests.rate
+            self.blocked_until = max(self.blocked_until, now + delay)
+    
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """Learn the remaining budget from Groq's x-ratelimit-* response headers."""
+        headers = {key.lower(): value for key, value in headers.items()}
+        if not any(key.startswith("x-ratelimit-") or key == "retry-after" for key in headers):
+            return
+        
+        with self._lock:
+            now = time.monotonic()
+            token_limit = headers.get("x-ratelimit-limit-tokens")
+            if token_limit:
+                try:
+                    self.tokens.capacity = float(token_limit)
+                except ValueError:
+                    pass
+            
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                try:
+                    remaining = float(remaining) if remaining is not None else None
+                except ValueError:
+                    remaining = None
+                bucket.sync(remaining, parse_duration(headers.get(f"x-ratelimit-reset-{kind}")), now)
+            
+            retry_after = parse_duration(headers.get("retry-after"))
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+    
+    def observe_response(self, response: Any):
+        """httpx response event hook feeding rate-limit headers into the limiter."""
+        self.update_from_headers(response.headers)
+    
+    async def aobserve_response(self, response: Any):
+        """Async httpx response event hook."""
+        self.update_from_headers(response.headers)
+    
+    def estimated_wait(self, tokens: int, priority: Optional[int] = None) -> float:
+        """Estimate how long a request of `tokens` tokens would wait, without reserving anything."""
+        floor = budget_floor(priority)
+        with self._lock:
+            now = time.monotonic()
+            return max(
+                self.requests.wait_above(1, floor, now),
+                self.tokens.wait_above(tokens, floor, now),
+                self.blocked_until - now
+            )
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the current budget for logging and key selection."""
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            return {
+                "key": self.label,
+                "requests_remaining": self.requests.level,
+                "tokens_remaining": self.tokens.level,
+                "blocked_for": max(0.0, self.blocked_until - now)
+            }
+
+def status_code_from_error(error: Exception) -> Optional[int]:
+    """Get the HTTP status code of a provider exception, if it carries one."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether an exception is an HTTP 429 from the provider."""
+    return status_code_from_error(error) == 429
+
+def retry_after_from_error(error: Exception) -> Optional[float]:
+    """Extract the Retry-After delay (in seconds) from a provider exception, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for name in ("retry-after", "x-ratelimit-reset-tokens"):
+        value = headers.get(name)
+        if value is not None:
+            return parse_duration(value)
+    return None
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(api_key: Optional[str] = None) -> RateLimiter:
+    """Get the shared rate limiter for an API key, creating it on first use."""
+    registry_key = api_key or "default"
+    with _limiters_lock:
+        limiter = _limiters.get(registry_key)
+        if limiter is None:
+            label = f"...{api_key[-4:]}" if api_key else "default"
+            limiter = RateLimiter(
+                Config.get_requests_per_minute(),
+                Config.get_tokens_per_minute(),
+                label=label
+            )
+            _limiters[registry_key] = limiter
+        return limiter
\ No newline at end of file
@@ -0,0 +1,221 @@
+from typing import Dict, List, Any, Optional, Iterator
+from contextlib import contextmanager
+import atexit
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+
+from utils.config import Config
+
+try:
+    import pyarrow.json as pa_json
+    import pyarrow.parquet as pq
+except ImportError:
+    pa_json = pq = None
+
+def patient_id(patient_data: Dict[str, Any]) -> str:
+    """Get a stable ID for a patient record: its own patient_id, or its name plus a hash of its contents.
+
+    Two patients with the same name get different IDs, and reprocessing the same
+    record maps to the same report.
+    """
+    if patient_data.get('patient_id'):
+        return re.sub(r"[^\w.-]+", "_", str(patient_data['patient_id']))
+    name = re.sub(r"[^\w-]+", "_", str(patient_data.get('name', 'Unknown'))).strip("_") or "patient"
+    encoded = json.dumps(patient_data, sort_keys=True, ensure_ascii=False, default=str)
+    return f"{name}-{hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:10]}"
+
+class PatientReport:
+    """Markdown report of one patient, written section by section and published atomically.
+
+    Sections are appended to `<id>.md.partial` as soon as they are rendered, so a crash
+    keeps everything written so far; complete() renames the file to `<id>.md` and adds
+    the patient's structured fields to the batch results and index.
+    """
+    
+    def __init__(self, writer: "ReportWriter", patient_id: str, patient_data: Dict[str, Any]):
+        self.writer = writer
+        self.patient_id = patient_id
+        self.patient_data = patient_data
+        self.path = os.path.join(writer.output_dir, f"{patient_id}.md")
+        self.partial_path = self.path + ".partial"
+        # Agent responses streamed while the patient is processed (see utils.streaming.ReportSink)
+        self.live_path = self.path + ".live"
+        self.status = "complete"
+        self.fields: Dict[str, Any] = {}
+        self.started_at = time.time()
+        self._file = open(self.partial_path, "w", encoding="utf-8")
+    
+    def append(self, markdown: str):
+        """Append a rendered section and flush it to disk."""
+        if not markdown:
+            return
+        self._file.write(markdown)
+        self._file.flush()
+    
+    def record(self, **fields: Any):
+        """Add structured fields for the machine-readable results."""
+        self.fields.update(fields)
+    
+    def complete(self):
+        """Publish the report under its final name and add it to the results and index."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.partial_path, self.path)
+        if os.path.exists(self.live_path):
+            os.remove(self.live_path)
+        self.writer._publish(self, self.status)
+    
+    def fail(self, error: BaseException):
+        """Keep the partial report and record the failure in the index."""
+        self._file.close()
+        self.writer._publish(self, "failed", str(error))
+
+class ReportWriter:
+    """Writes the patient reports of a batch and their machine-readable companions.
+
+    Next to the Markdown reports, the output directory holds:
+      - results.jsonl: one row of structured assessment fields per patient
+      - index.jsonl: one row per report with its batch, status and path
+      - results-<batch_id>.parquet: the results rows of this batch, when REPORT_PARQUET
+        is set and pyarrow is installed
+    The JSONL files are appended to, so successive batches accumulate; rows carry a batch_id.
+    
+    In worker processes the writer is created with `forward_to`, a queue: reports are
+    still written by the worker, but their index entries and results rows are sent to
+    the parent's writer (see write()) so one process owns the batch files.
+    """
+    
+    def __init__(self, output_dir: str, parquet: Optional[bool] = None, forward_to: Any = None):
+        self.output_dir = output_dir
+        self.forward_to = forward_to
+        self.parquet = parquet if parquet is not None else Config.is_report_parquet_enabled()
+        self.batch_id = time.strftime("%Y%m%dT%H%M%S") + "-" + os.urandom(3).hex()
+        self.index_path = os.path.join(output_dir, "index.jsonl")
+        self.results_path = os.path.join(output_dir, "results.jsonl")
+        self.counts: Dict[str, int] = {}
+        self._ids: Dict[str, int] = {}
+        # Results rows of this batch, kept for its Parquet file
+        self._rows: List[str] = []
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+        self._index = self._results = None
+        if forward_to is None:
+            self._index = open(self.index_path, "a", encoding="utf-8")
+            self._results = open(self.results_path, "a", encoding="utf-8")
+    
+    def reserve_id(self, patient_data: Dict[str, Any]) -> str:
+        """Get the patient's ID, suffixed if the same record already appeared in this batch."""
+        base_id = patient_id(patient_data)
+        with self._lock:
+            seen = self._ids.get(base_id, 0)
+            self._ids[base_id] = seen + 1
+        return base_id if not seen else f"{base_id}-{seen + 1}"
+    
+    @contextmanager
+    def open(self, patient_data: Dict[str, Any]) -> Iterator[PatientReport]:
+        """Start a patient's report; it is published when the block exits and kept as .partial if it raises."""
+        report = PatientReport(self, self.reserve_id(patient_data), patient_data)
+        try:
+            yield report
+        except BaseException as e:
+            report.fail(e)
+            raise
+        report.complete()
+    
+    def _publish(self, report: PatientReport, status: str, error: Optional[str] = None):
+        """Append a finished report to the results and the index."""
+        finished_at = time.time()
+        entry = {
+            "batch_id": self.batch_id,
+            "patient_id": report.patient_id,
+            "name": report.patient_data.get('name', 'Unknown'),
+            "status": status,
+            "report": os.path.basename(report.path if status != "failed" else report.partial_path),
+            "finished_at": finished_at
+        }
+        if error is not None:
+            entry["error"] = error
+        row = {
+            "batch_id": self.batch_id,
+            "patient_id": report.patient_id,
+            "name": report.patient_data.get('name', 'Unknown'),
+            "age": report.patient_data.get('age'),
+            "gender": report.patient_data.get('gender'),
+            "status": status,
+            **report.fields,
+            "duration_seconds": round(finished_at - report.started_at, 3)
+        }
+        self.write(entry, row if status != "failed" else None)
+    
+    def write(self, entry: Dict[str, Any], row: Optional[Dict[str, Any]] = None):
+        """Append an index entry and its results row (if any), or forward them to the parent process."""
+        if self.forward_to is not None:
+            self.forward_to.put((entry, row))
+            return
+        entry["batch_id"] = self.batch_id
+        with self._lock:
+            self.counts[entry["status"]] = self.counts.get(entry["status"], 0) + 1
+            if row is not None:
+                row["batch_id"] = self.batch_id
+                line = json.dumps(row, ensure_ascii=False, default=str) + "\n"
+                self._results.write(line)
+                if self.parquet:
+                    self._rows.append(line)
+                self._results.flush()
+            self._index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._index.flush()
+    
+    def close(self):
+        """Close the results and index, and write this batch's results to Parquet if enabled.
+
+        Each batch gets its own results-<batch_id>.parquet: rows from earlier batches may
+        have different fields or types, which would make a combined schema inconsistent.
+        Each file holds the same rows as the batch's lines in results.jsonl.
+        """
+        with self._lock:
+            if self._index is None or self._index.closed:
+                return
+            self._index.close()
+            self._results.close()
+        if not self.parquet or not self._rows:
+            return
+        if pq is None:
+            print(f"REPORT_PARQUET is set but pyarrow is not installed; skipping results-{self.batch_id}.parquet")
+            return
+        table = pa_json.read_json(io.BytesIO("".join(self._rows).encode("utf-8")))
+        pq.write_table(table, os.path.join(self.output_dir, f"results-{self.batch_id}.parquet"))
+
+_writers: Dict[str, ReportWriter] = {}
+_writers_lock = threading.Lock()
+# Set in worker processes, whose index entries and results go to the parent
+_forward_queue: Any = None
+
+def forward_reports_to(queue: Any):
+    """Send the index entries and results of this process's report writers to `queue` instead of writing them."""
+    global _forward_queue
+    _forward_queue = queue
+
+def get_report_writer(output_dir: Optional[str] = None) -> ReportWriter:
+    """Get the report writer for an output directory (defaults to ./output), creating it on first use."""
+    output_dir = os.path.abspath(output_dir or os.path.join(os.getcwd(), "output"))
+    with _writers_lock:
+        writer = _writers.get(output_dir)
+        if writer is None:
+            writer = _writers[output_dir] = ReportWriter(output_dir, forward_to=_forward_queue)
+            atexit.register(writer.close)
+        return writer
+
+def close_report_writers() -> List[ReportWriter]:
+    """Close every open report writer and return them."""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+    return writers
\ No newline at end of file
@@ -0,0 +1,174 @@
+from typing import Dict, Any, Optional
+import threading
+import time
+
+from utils.config import Config
+from utils.rate_limiter import status_code_from_error
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend/key whose circuit is open."""
+
+class DeadlineExceededError(Exception):
+    """Raised when an LLM call cannot finish (or retry) within its deadline."""
+
+class Deadline:
+    """Time budget of one LLM call, covering every attempt, rate-limit wait and backoff.
+
+    An attempt is only worth making if, after waiting, it still has `min_call_seconds`
+    left for the request itself (LLM_MIN_CALL_SECONDS, capped at half the deadline so
+    short deadlines still get an attempt).
+    """
+    
+    def __init__(self, seconds: float, min_call_seconds: Optional[float] = None):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        if min_call_seconds is None:
+            min_call_seconds = Config.get_llm_min_call_seconds()
+        self.min_call_seconds = min(min_call_seconds, seconds / 2)
+    
+    def remaining(self) -> float:
+        """Seconds left before the deadline (never negative)."""
+        return max(0.0, self.expires_at - time.monotonic())
+    
+    def wait_budget(self) -> float:
+        """Longest wait that still leaves an attempt its minimum call time (negative once there is none)."""
+        return self.remaining() - self.min_call_seconds
+    
+    def allows(self, seconds: float) -> bool:
+        """Check if waiting `seconds` still leaves an attempt its minimum call time."""
+        return seconds <= self.wait_budget()
+
+class FallbackResponse(str):
+    """Apology text returned in place of a model response when a call could not be made or kept failing.
+
+    It is a plain string to every caller, but stays recognisable (see contains_fallback)
+    so a workflow stage built on it is not checkpointed as if it were a real answer.
+    """
+    
+    def __new__(cls, text: str, error: str = ""):
+        response = super().__new__(cls, text)
+        response.error = error
+        return response
+
+def contains_fallback(value: Any) -> bool:
+    """Check if a result (a string, or dicts and lists of them) holds a fallback response."""
+    if isinstance(value, FallbackResponse):
+        return True
+    if isinstance(value, dict):
+        # Only the stored items; lazy fields of a LazyResult are not computed
+        return any(contains_fallback(item) for item in dict.values(value))
+    if isinstance(value, (list, tuple)):
+        return any(contains_fallback(item) for item in value)
+    return False
+
+def is_backend_failure(error: Exception) -> bool:
+    """Check whether an error says the backend or key is unhealthy rather than the request or the rate limit.
+
+    Connection errors and timeouts (no status), 5xx responses and rejected keys count;
+    429s are the rate limiter's business and other 4xx errors are caused by the request.
+    """
+    status = status_code_from_error(error)
+    return status is None or status >= 500 or status in (401, 403)
+
+class CircuitBreaker:
+    """Fails calls to a backend/key fast once it keeps failing, instead of retrying into an outage.
+
+    After `failure_threshold` consecutive backend failures the circuit opens and calls
+    are refused for `reset_seconds`. Then a single probe call is let through: its success
+    closes the circuit, its failure opens it again.
+    """
+    
+    def __init__(self, label: str, failure_threshold: Optional[int] = None, reset_seconds: Optional[float] = None):
+        self.label = label
+        self.failure_threshold = failure_threshold or Config.get_circuit_failure_threshold()
+        self.reset_seconds = reset_seconds if reset_seconds is not None else Config.get_circuit_reset_seconds()
+        self.consecutive_failures = 0
+        self.opened_until = 0.0
+        self.probing = False
+        self.trips = 0
+        self._lock = threading.Lock()
+    
+    def open_for(self) -> float:
+        """Seconds until the circuit lets a call through again (0 if it is closed or ready for a probe)."""
+        with self._lock:
+            if self.probing:
+                return self.reset_seconds
+            return max(0.0, self.opened_until - time.monotonic())
+    
+    def allow(self) -> bool:
+        """Check if a call may go ahead; an open circuit past its reset time admits one probe."""
+        with self._lock:
+            if self.opened_until == 0.0:
+                return True
+            if self.probing or time.monotonic() < self.opened_until:
+                return False
+            self.probing = True
+            return True
+    
+    def record(self, error: Optional[Exception] = None):
+        """Record the outcome of an allowed call."""
+        with self._lock:
+            self.probing = False
+            if error is None or not is_backend_failure(error):
+                self.consecutive_failures = 0
+                self.opened_until = 0.0
+                return
+            self.consecutive_failures += 1
+            if self.opened_until or self.consecutive_failures >= self.failure_threshold:
+                self.opened_until = time.monotonic() + self.reset_seconds
+                self.trips += 1
+                print(f"[circuit breaker] Circuit for {self.label} open for {self.reset_seconds:.1f}s "
+                      f"after {self.consecutive_failures} consecutive failures")
+    
+    def cancel(self):
+        """Forget an allowed call that was abandoned without an outcome, so a new probe can be made."""
+        with self._lock:
+            self.probing = False
+    
+    def error(self) -> CircuitOpenError:
+        """Build the error raised while the circuit is open."""
+        return CircuitOpenError(f"Circuit for {self.label} is open after {self.consecutive_failures} consecutive "
+                                f"failures; retry in {self.open_for():.1f}s")
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(api_key: Optional[str] = None) -> CircuitBreaker:
+    """Get the shared circuit breaker of the configured backend and an API key, creating it on first use."""
+    backend = Config.get_llm_backend()
+    registry_key = f"{backend}:{api_key or 'default'}"
+    with _breakers_lock:
+        breaker = _breakers.get(registry_key)
+        if breaker is None:
+            label = f"{backend} key ...{api_key[-4:]}" if api_key else f"{backend} default key"
+            breaker = _breakers[registry_key] = CircuitBreaker(label)
+        return breaker
+
+class HedgeStats:
+    """Counts of hedged duplicate requests and how often the duplicate answered first."""
+    
+    def __init__(self):
+        self.sent = 0
+        self.won = 0
+        self._lock = threading.Lock()
+    
+    def record_sent(self):
+        """Count a duplicate request that was sent."""
+        with self._lock:
+            self.sent += 1
+    
+    def record_won(self):
+        """Count a duplicate request that answered before the original."""
+        with self._lock:
+            self.won += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of hedges sent and won."""
+        with self._lock:
+            return {"sent": self.sent, "won": self.won}
+
+_hedge_stats = HedgeStats()
+
+def get_hedge_stats() -> HedgeStats:
+    """Get the process-wide hedge counters."""
+    return _hedge_stats
\ No newline at end of file
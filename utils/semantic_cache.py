@@ -0,0 +1,170 @@
+from typing import Dict, List, Any, Optional
+import atexit
+import json
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from utils.config import Config
+
+_TOKEN_PATTERN = re.compile(r"[a-z]+|\d+(?:\.\d+)?")
+
+def _quantize(number: str) -> str:
+    """Map a number onto a coarse bucket so that readings a few points apart compare equal."""
+    value = float(number)
+    if "." in number:
+        # Decimal readings (e.g. temperature) in half-unit steps
+        return f"{round(value * 2) / 2:g}"
+    # Integer readings (e.g. heart rate, blood pressure, age) in steps of five
+    return str(int(value // 5 * 5))
+
+def embed_text(text: str, dim: Optional[int] = None) -> np.ndarray:
+    """Embed text locally as an L2-normalized hashed bag of words.
+
+    Word order is ignored and numbers are bucketed, so prompts listing the same
+    symptoms in a different order, or vitals a few points apart, embed identically.
+    """
+    dim = dim or Config.get_semantic_cache_dim()
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in set(_TOKEN_PATTERN.findall(text.lower())):
+        if token[0].isdigit():
+            token = "#" + _quantize(token)
+        digest = zlib.crc32(token.encode("utf-8"))
+        # Use the top bit as a sign to reduce the bias from hash collisions
+        vector[digest % dim] += 1.0 if digest & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+class _Namespace:
+    """FAISS index and stored responses for one agent method."""
+    
+    def __init__(self, index: Any, responses: List[str]):
+        self.index = index
+        self.responses = responses
+        self.dirty = False
+
+class SemanticCache:
+    """FAISS-backed cache returning stored responses for near-duplicate prompts.
+
+    Each agent method gets its own namespace with an inner-product index over
+    normalized embeddings (i.e. cosine similarity). Indexes are persisted to
+    `directory` and memory-mapped when loaded; responses are kept in an
+    append-only JSONL file next to each index.
+    """
+    
+    def __init__(self, directory: Optional[str] = None, dim: Optional[int] = None):
+        self.directory = directory or Config.get_semantic_cache_dir()
+        self.dim = dim or Config.get_semantic_cache_dim()
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+    
+    def _paths(self, namespace: str):
+        """Get the index and response file paths of a namespace."""
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", namespace)
+        base = os.path.join(self.directory, safe_name)
+        return base + ".index", base + ".jsonl"
+    
+    def _namespace(self, namespace: str) -> _Namespace:
+        """Get a namespace, loading it from disk on first use."""
+        if namespace in self._namespaces:
+            return self._namespaces[namespace]
+        
+        # FAISS is slow to import, so it is only loaded once a namespace is used
+        import faiss
+        
+        index_path, responses_path = self._paths(namespace)
+        index = None
+        lines: List[str] = []
+        if os.path.exists(index_path):
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+            if index.d != self.dim:
+                index = None
+        if index is not None and os.path.exists(responses_path):
+            with open(responses_path, "r", encoding="utf-8") as f:
+                lines = [line for line in f if line.strip()]
+        if index is None or len(lines) < index.ntotal:
+            # Missing or inconsistent files: start the namespace over
+            index, lines = faiss.IndexFlatIP(self.dim), []
+            if os.path.exists(responses_path):
+                os.remove(responses_path)
+        elif len(lines) > index.ntotal:
+            # Responses appended after the last index save have no vector; drop them
+            lines = lines[:index.ntotal]
+            with open(responses_path, "w", encoding="utf-8") as f:
+                f.writelines(lines)
+        responses = [json.loads(line)["response"] for line in lines]
+        
+        self._namespaces[namespace] = _Namespace(index, responses)
+        return self._namespaces[namespace]
+    
+    def lookup(self, namespace: str, text: str, threshold: float) -> Optional[str]:
+        """Get the stored response of the most similar prompt if it clears the threshold."""
+        query = embed_text(text, self.dim).reshape(1, -1)
+        with self._lock:
+            entry = self._namespace(namespace)
+            if entry.index.ntotal:
+                scores, ids = entry.index.search(query, 1)
+                if ids[0][0] >= 0 and scores[0][0] >= threshold:
+                    self.hits += 1
+                    return entry.responses[ids[0][0]]
+            self.misses += 1
+            return None
+    
+    def add(self, namespace: str, text: str, response: str):
+        """Store a prompt/response pair."""
+        vector = embed_text(text, self.dim).reshape(1, -1)
+        with self._lock:
+            entry = self._namespace(namespace)
+            entry.index.add(vector)
+            entry.responses.append(response)
+            entry.dirty = True
+            _, responses_path = self._paths(namespace)
+            with open(responses_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"prompt": text, "response": response}, ensure_ascii=False) + "\n")
+    
+    def save(self):
+        """Write the indexes of all changed namespaces to disk."""
+        with self._lock:
+            for namespace, entry in self._namespaces.items():
+                if not entry.dirty:
+                    continue
+                import faiss
+                
+                index_path, _ = self._paths(namespace)
+                # Write next to the memory-mapped file and swap it in atomically; the temporary
+                # name is per process since worker processes may save the same namespace
+                temp_path = f"{index_path}.{os.getpid()}.tmp"
+                faiss.write_index(entry.index, temp_path)
+                os.replace(temp_path, index_path)
+                entry.dirty = False
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": sum(entry.index.ntotal for entry in self._namespaces.values())
+            }
+
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_cache_lock = threading.Lock()
+
+def get_semantic_cache() -> SemanticCache:
+    """Get the process-wide semantic cache, creating it on first use."""
+    global _semantic_cache
+    with _semantic_cache_lock:
+        if _semantic_cache is None:
+            _semantic_cache = SemanticCache()
+            atexit.register(_semantic_cache.save)
+        return _semantic_cache
\ No newline at end of file
@@ -0,0 +1,286 @@
+from typing import List, Any, Optional, Iterator, AsyncIterator
+from types import SimpleNamespace
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict, PrivateAttr
+
+from utils.config import Config
+from utils.rate_limiter import TokenBucket
+from utils.tokens import estimate_tokens, estimate_message_tokens
+
+# Prompt fragments that make the simulated model answer 'Yes' to the Yes/No triage prompts
+_URGENT_TERMS = ['chest pain', 'chest pressure', 'fainting', 'severe', 'shortness of breath', 'confusion']
+
+# Share of the simulated latency spent before the first token when streaming
+FIRST_TOKEN_FRACTION = 0.2
+
+# Canned responses keyed on a fragment of each agent prompt; the first matching fragment wins
+_RESPONSE_TEMPLATES = [
+    ("cardiac assessment", "1. Cardiac risk level: {risk}\n2. Potential conditions: acute coronary syndrome, "
+                           "hypertensive heart disease, arrhythmia\n3. Immediate actions: keep the patient at rest, "
+                           "monitor vital signs, obtain an ECG\n4. Need for emergency services: {yes_no}"),
+    ("emergency instructions", "1. Call emergency services immediately.\n2. Keep the patient seated and calm.\n"
+                               "3. Loosen tight clothing.\n4. Give aspirin if not allergic and advised by the dispatcher.\n"
+                               "5. Be ready to start CPR if the patient becomes unresponsive."),
+    ("emergency response coordination", "1. Call emergency services and report a suspected cardiac emergency.\n"
+                                        "2. Share age, symptoms, vital signs and medications with responders.\n"
+                                        "3. Keep the patient at rest and monitor breathing.\n"
+                                        "4. Prepare medication list and ID for hospital transport."),
+    ("cardiac care plan", "1. Monitoring: daily blood pressure and heart rate log\n2. Medications: continue current "
+                          "regimen, review with cardiology\n3. Lifestyle: low-sodium diet, supervised activity, "
+                          "no smoking\n4. Warning signs: chest pain, fainting, severe breathlessness\n"
+                          "5. Follow-up: cardiology review within 1 week"),
+    ("treatment plan", "1. Diagnosis: findings consistent with the reported symptoms\n2. Treatment: symptomatic "
+                       "management and targeted medication\n3. Monitoring: recheck vital signs in 48 hours\n"
+                       "4. Follow-up: primary care visit within 1 week"),
+    ("assess patient:", "Assessment: the presentation warrants clinical evaluation. Differential "
+                        "diagnosis includes infection, inflammation and cardiovascular causes. "
+                        "Recommended: physical examination, basic labs and vital-sign monitoring."),
+    ("home care recommendations", "1. Symptom management: rest, fluids, cool compresses\n2. OTC medication: "
+                                  "acetaminophen as directed\n3. Rest and hydration: 8 glasses of water daily\n"
+                                  "4. Warning signs: high fever, breathing difficulty, confusion"),
+    ("wellness recommendations", "1. Exercise: 150 minutes of moderate activity weekly\n2. Nutrition: balanced "
+                                 "diet rich in vegetables and whole grains\n3. Sleep: 7-9 hours nightly\n"
+                                 "4. Stress management: mindfulness and regular breaks"),
+    ("check-up schedule", "1. Annual physical examination\n2. Blood pressure check every year\n"
+                          "3. Cholesterol screening every 5 years\n4. Dental check-up every 6 months"),
+    ("health report", "Overall health: good. Vital signs are within normal ranges. Continue current lifestyle, "
+                      "keep routine screenings and schedule the next check-up in 12 months."),
+    ("referral", "1. Specialist: internal medicine\n2. Urgency: routine\n3. Timeframe: within 2 weeks\n"
+                 "4. Preparation: bring medication list and recent lab results"),
+    ("initial evaluation", "1. Potential causes: viral infection, inflammatory process\n2. Severity: moderate\n"
+                           "3. Next steps: rest, hydration and re-evaluation if symptoms persist"),
+]
+
+class SimulatedRateLimitError(Exception):
+    """HTTP 429 raised by the simulated backend, shaped like the provider's rate-limit errors."""
+    
+    status_code = 429
+    
+    def __init__(self, retry_after: float):
+        super().__init__(f"Simulated rate limit reached; retry after {retry_after:.2f}s")
+        self.response = SimpleNamespace(status_code=429, headers={"retry-after": f"{retry_after:.3f}"})
+
+class SimulatedTimeoutError(Exception):
+    """Raised by the simulated backend when a call takes longer than its request timeout."""
+    
+    def __init__(self, timeout: float):
+        super().__init__(f"Simulated request timed out after {timeout:.2f}s")
+
+class SimulatedQuota:
+    """Server-side tokens-per-minute budget shared by all simulated models of one account."""
+    
+    def __init__(self, tokens_per_minute: int):
+        self.bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._lock = threading.Lock()
+    
+    def consume(self, tokens: int):
+        """Spend tokens, raising SimulatedRateLimitError if the budget cannot cover them."""
+        if self.bucket is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.bucket.refill(now)
+            if self.bucket.level < tokens:
+                raise SimulatedRateLimitError((tokens - self.bucket.level) / self.bucket.rate)
+            self.bucket.level -= tokens
+
+_quota: Optional[SimulatedQuota] = None
+_quota_lock = threading.Lock()
+
+def get_simulated_quota() -> SimulatedQuota:
+    """Get the process-wide simulated quota, creating it on first use."""
+    global _quota
+    with _quota_lock:
+        if _quota is None:
+            _quota = SimulatedQuota(Config.get_simulated_tokens_per_minute())
+        return _quota
+
+class SimulatedChatModel(BaseChatModel):
+    """Offline stand-in for ChatGroq used for load tests and CI.
+
+    Returns canned responses for each agent prompt type (answering the Yes/No
+    triage prompts from the urgency of the symptoms), sleeps for a log-normally
+    distributed latency, reports token usage, and raises 429s when the simulated
+    tokens-per-minute budget is exhausted or at a configurable random error rate.
+    Calls slower than their `timeout` time out like a real request would.
+    """
+    
+    model_name: str = "simulated"
+    latency_ms: float = 800.0
+    latency_sigma: float = 0.3
+    error_rate: float = 0.0
+    seed: Optional[int] = None
+    quota: Optional[SimulatedQuota] = None
+    calls: int = 0
+    
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    
+    _random: random.Random = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    
+    def model_post_init(self, __context: Any):
+        self._random = random.Random(self.seed)
+    
+    @classmethod
+    def from_config(cls) -> "SimulatedChatModel":
+        """Create a simulated model from the SIMULATED_* settings."""
+        return cls(
+            latency_ms=Config.get_simulated_latency_ms(),
+            latency_sigma=Config.get_simulated_latency_sigma(),
+            error_rate=Config.get_simulated_error_rate(),
+            seed=Config.get_simulated_seed(),
+            quota=get_simulated_quota()
+        )
+    
+    @property
+    def _llm_type(self) -> str:
+        return "simulated"
+    
+    @staticmethod
+    def _respond(prompt: str) -> str:
+        """Pick a canned response for a prompt."""
+        lowered = prompt.lower()
+        is_urgent = any(term in lowered for term in _URGENT_TERMS)
+        if "respond with only a json object" in lowered:
+            return SimulatedChatModel._respond_structured(prompt)
+        if "json array" in lowered and "patient_id" in lowered:
+            return SimulatedChatModel._respond_batch(prompt)
+        if "'yes' or 'no'" in lowered:
+            if is_urgent:
+                return "Yes. The reported symptoms and vital signs need prompt medical evaluation."
+            return "No. The symptoms are mild and the vital signs do not indicate an urgent problem."
+        
+        for fragment, template in _RESPONSE_TEMPLATES:
+            if fragment in lowered:
+                return template.format(risk="high" if is_urgent else "moderate", yes_no="Yes" if is_urgent else "No")
+        return "Noted. Based on the information provided, continue monitoring and follow up as scheduled."
+    
+    @staticmethod
+    def _respond_structured(prompt: str) -> str:
+        """Answer a structured-output prompt with a JSON object holding every '- <field> (...)' it lists."""
+        # Only the patient part decides urgency; the field list mentions 'severe' as a choice
+        patient_part = prompt.lower().split("respond with only a json object")[0]
+        is_urgent = any(term in patient_part for term in _URGENT_TERMS)
+        is_cardiac = "cardiac assessment" in patient_part
+        templates = dict(_RESPONSE_TEMPLATES)
+        values = {
+            "risk_level": "high" if is_urgent else "moderate",
+            "severity": "severe" if is_urgent else "moderate",
+            "assessment": templates["cardiac assessment"].format(risk="high" if is_urgent else "moderate",
+                                                                 yes_no="Yes" if is_urgent else "No") if is_cardiac
+                          else templates["assess patient:"],
+            "is_emergency": is_urgent,
+            "requires_doctor_attention": is_urgent,
+            "reason": "The reported symptoms and vital signs need prompt medical evaluation." if is_urgent
+                      else "The symptoms are mild and the vital signs do not indicate an urgent problem.",
+            "emergency_instructions": templates["emergency instructions"] if is_urgent else "",
+            "care_recommendations": templates["home care recommendations"],
+            "follow_up_interval": ("immediate" if is_cardiac else "24 hours") if is_urgent
+                                  else ("24 hours" if is_cardiac else "72 hours")
+        }
+        fields = re.findall(r"^- (\w+) \(", prompt, re.M)
+        return json.dumps({field: values.get(field, "") for field in fields})
+    
+    @staticmethod
+    def _respond_batch(prompt: str) -> str:
+        """Answer a batched Yes/No prompt with a JSON array holding one decision per '### <id>' patient block."""
+        answers = []
+        for patient_id, block in re.findall(r"^### (\S+)\n(.*?)(?=\n\n|\Z)", prompt, re.M | re.S):
+            is_urgent = any(term in block.lower() for term in _URGENT_TERMS)
+            answers.append({
+                "patient_id": patient_id,
+                "answer": "Yes" if is_urgent else "No",
+                "reason": "The reported symptoms and vital signs need prompt medical evaluation." if is_urgent
+                          else "The symptoms are mild and the vital signs do not indicate an urgent problem."
+            })
+        return json.dumps(answers)
+    
+    def _prepare(self, messages: List[BaseMessage]):
+        """Draw the latency and check the simulated limits; returns (latency seconds, response message)."""
+        with self._lock:
+            self.calls += 1
+            latency = self._random.lognormvariate(math.log(max(self.latency_ms, 1e-3) / 1000), self.latency_sigma)
+            fail = self._random.random() < self.error_rate
+        
+        text = self._respond(str(messages[-1].content) if messages else "")
+        input_tokens = estimate_message_tokens(messages)
+        output_tokens = estimate_tokens(text)
+        if fail:
+            raise SimulatedRateLimitError(1.0)
+        if self.quota is not None:
+            self.quota.consume(input_tokens + output_tokens)
+        
+        message = AIMessage(content=text, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens
+        })
+        return latency, message
+    
+    @staticmethod
+    def _timed_out(latency: float, kwargs: Any) -> Optional[float]:
+        """Get the request timeout if the call would take longer, else None."""
+        timeout = kwargs.get("timeout")
+        return timeout if timeout is not None and latency > timeout else None
+    
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        latency, message = self._prepare(messages)
+        timeout = self._timed_out(latency, kwargs)
+        if timeout is not None:
+            time.sleep(timeout)
+            raise SimulatedTimeoutError(timeout)
+        time.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+    
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        latency, message = self._prepare(messages)
+        timeout = self._timed_out(latency, kwargs)
+        if timeout is not None:
+            await asyncio.sleep(timeout)
+            raise SimulatedTimeoutError(timeout)
+        await asyncio.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+    
+    @staticmethod
+    def _chunks(latency: float, message: AIMessage):
+        """Split a response into word chunks, each with the delay before it; usage goes on the last chunk."""
+        words = re.findall(r"\S+\s*|\s+", str(message.content)) or [""]
+        delay = latency * (1 - FIRST_TOKEN_FRACTION) / max(len(words) - 1, 1)
+        for i, word in enumerate(words):
+            usage = message.usage_metadata if i == len(words) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word, usage_metadata=usage))
+            yield (latency * FIRST_TOKEN_FRACTION if i == 0 else delay), chunk
+    
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        latency, message = self._prepare(messages)
+        timeout = self._timed_out(latency, kwargs)
+        if timeout is not None:
+            time.sleep(timeout)
+            raise SimulatedTimeoutError(timeout)
+        for delay, chunk in self._chunks(latency, message):
+            time.sleep(delay)
+            yield chunk
+    
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        latency, message = self._prepare(messages)
+        timeout = self._timed_out(latency, kwargs)
+        if timeout is not None:
+            await asyncio.sleep(timeout)
+            raise SimulatedTimeoutError(timeout)
+        for delay, chunk in self._chunks(latency, message):
+            await asyncio.sleep(delay)
+            yield chunk
\ No newline at end of file
@@ -0,0 +1,66 @@
+from typing import Dict, List, Any, Optional, Tuple
+from concurrent.futures import Future
+import threading
+
+class SingleFlight:
+    """Coalesces identical concurrent LLM calls into one upstream request.
+
+    The first caller for a key becomes the leader and makes the call; callers that
+    join while it is in flight wait for the leader's result instead of calling the
+    model themselves. Flights are plain concurrent futures, so threads and asyncio
+    tasks can share them. A flight is forgotten once it settles, so later calls for
+    the same key go upstream again (or hit the response cache).
+    """
+    
+    def __init__(self):
+        self._flights: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+    
+    def join(self, key: str) -> Tuple[Future, bool]:
+        """Join the flight for a key, starting it if there is none; returns the flight and whether the caller leads it."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = Future()
+            self.leaders += 1
+            return flight, True
+    
+    def settle(self, key: str, flight: Future, result: str):
+        """Hand the leader's result to every caller waiting on the flight."""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.set_result(result)
+    
+    def abandon(self, key: str, flight: Future):
+        """Cancel a flight whose leader failed or was cancelled; its followers then make their own calls."""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.cancel()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of upstream calls made and of identical calls that shared them."""
+        with self._lock:
+            calls = self.leaders + self.coalesced
+            return {
+                "upstream_calls": self.leaders,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights),
+                "coalesced_rate": self.coalesced / calls if calls else 0.0
+            }
+
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+def get_single_flight() -> SingleFlight:
+    """Get the process-wide single-flight table shared by all agents."""
+    global _single_flight
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
\ No newline at end of file
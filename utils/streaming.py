@@ -0,0 +1,207 @@
+from typing import Dict, List, Any, Optional, Callable, Iterator, Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+import itertools
+import os
+import sys
+import threading
+import time
+
+class TokenStream:
+    """One agent response being streamed to the active sinks."""
+    
+    _ids = itertools.count(1)
+    
+    def __init__(self, agent: str, method: str, sinks: Tuple["StreamSink", ...]):
+        self.id = next(self._ids)
+        self.agent = agent
+        self.method = method
+        self.sinks = sinks
+        self.chunks: List[str] = []
+        self.started = time.perf_counter()
+        self.first_token_seconds: Optional[float] = None
+        for sink in sinks:
+            sink.on_start(self)
+    
+    @property
+    def text(self) -> str:
+        """Get the text streamed so far."""
+        return "".join(self.chunks)
+    
+    def write(self, token: str):
+        """Forward a token to every sink."""
+        if not token:
+            return
+        if self.first_token_seconds is None:
+            self.first_token_seconds = time.perf_counter() - self.started
+        self.chunks.append(token)
+        for sink in self.sinks:
+            sink.on_token(self, token)
+    
+    def discard(self):
+        """Drop the partial response of a failed attempt before it is retried."""
+        if not self.chunks:
+            return
+        self.chunks = []
+        for sink in self.sinks:
+            sink.on_discard(self)
+    
+    def finish(self, text: str):
+        """Tell every sink the response is complete; `text` is the final response."""
+        for sink in self.sinks:
+            sink.on_end(self, text)
+
+class StreamSink:
+    """Receives agent responses token by token; override the hooks you need."""
+    
+    def on_start(self, stream: TokenStream):
+        """Called when an agent starts a response."""
+        pass
+    
+    def on_token(self, stream: TokenStream, token: str):
+        """Called for every token as it arrives."""
+        pass
+    
+    def on_discard(self, stream: TokenStream):
+        """Called when the partial response of a failed attempt is dropped before a retry."""
+        pass
+    
+    def on_end(self, stream: TokenStream, text: str):
+        """Called with the final text once the response is complete."""
+        pass
+
+class ConsoleSink(StreamSink):
+    """Prints responses to the console as they are generated.
+
+    Only one response is printed live at a time; responses generated concurrently
+    (parallel stages or patients) are buffered and printed whole once the console
+    is free, so their tokens never interleave.
+    """
+    
+    def __init__(self, file: Any = None):
+        self.file = file or sys.stdout
+        self.owner: Optional[int] = None
+        self.buffers: Dict[int, List[str]] = {}
+        self.finished: List[int] = []
+        self._lock = threading.Lock()
+    
+    def _header(self, stream: TokenStream) -> str:
+        return f"\n[{stream.agent} · {stream.method}] "
+    
+    def on_start(self, stream: TokenStream):
+        with self._lock:
+            self.buffers[stream.id] = [self._header(stream)]
+    
+    def on_token(self, stream: TokenStream, token: str):
+        with self._lock:
+            if self.owner is None:
+                self.owner = stream.id
+            if self.owner == stream.id:
+                self._flush(stream.id)
+                self.file.write(token)
+                self.file.flush()
+            else:
+                self.buffers[stream.id].append(token)
+    
+    def on_discard(self, stream: TokenStream):
+        with self._lock:
+            if self.owner == stream.id:
+                self.file.write(" [retrying]")
+            self.buffers[stream.id] = [self._header(stream)]
+    
+    def on_end(self, stream: TokenStream, text: str):
+        with self._lock:
+            if self.owner != stream.id:
+                # Nothing printed live yet (cache hit or console busy); print it once it is free
+                self.finished.append(stream.id)
+                if self.owner is not None:
+                    return
+            else:
+                self.owner = None
+                self.buffers.pop(stream.id, None)
+                self.file.write("\n")
+            # Print the buffered responses that completed while the console was busy
+            while self.finished:
+                stream_id = self.finished.pop(0)
+                self._flush(stream_id)
+                self.buffers.pop(stream_id, None)
+                self.file.write("\n")
+            self.file.flush()
+    
+    def _flush(self, stream_id: int):
+        """Write out and clear a stream's buffered output."""
+        buffered = self.buffers.get(stream_id)
+        if buffered:
+            self.file.write("".join(buffered))
+            self.buffers[stream_id] = []
+
+class ReportSink(StreamSink):
+    """Writes responses to a file as they are generated, one section per response.
+
+    Used for a report's live file, which shows the progress of a patient while it is
+    processed and is removed once the report is complete.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.sections: Dict[int, List[str]] = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    
+    def on_start(self, stream: TokenStream):
+        with self._lock:
+            self.sections[stream.id] = []
+    
+    def on_token(self, stream: TokenStream, token: str):
+        with self._lock:
+            self.sections[stream.id].append(token)
+            self._write()
+    
+    def on_discard(self, stream: TokenStream):
+        with self._lock:
+            self.sections[stream.id] = []
+            self._write()
+    
+    def on_end(self, stream: TokenStream, text: str):
+        with self._lock:
+            self.sections[stream.id] = [text]
+            self._write()
+    
+    def _write(self):
+        """Rewrite the file with every section streamed so far."""
+        # Sections of concurrent responses grow independently, so the file is rewritten rather than appended to
+        with open(self.path, "w", encoding="utf-8") as f:
+            for chunks in self.sections.values():
+                f.write("".join(chunks) + "\n\n")
+
+class CallbackSink(StreamSink):
+    """Calls `on_token(stream, token)` for every token and `on_end(stream, text)` for every finished response."""
+    
+    def __init__(self, on_token: Callable[[TokenStream, str], None],
+                 on_end: Optional[Callable[[TokenStream, str], None]] = None):
+        self._on_token = on_token
+        self._on_end = on_end
+    
+    def on_token(self, stream: TokenStream, token: str):
+        self._on_token(stream, token)
+    
+    def on_end(self, stream: TokenStream, text: str):
+        if self._on_end is not None:
+            self._on_end(stream, text)
+
+# Sinks are tracked per thread and per asyncio task, like the patient session
+_active_sinks: ContextVar[Tuple[StreamSink, ...]] = ContextVar("stream_sinks", default=())
+
+@contextmanager
+def streaming_to(*sinks: StreamSink) -> Iterator[Tuple[StreamSink, ...]]:
+    """Stream every agent response made inside the block to `sinks`, in addition to any already active."""
+    active = _active_sinks.get() + sinks
+    token = _active_sinks.set(active)
+    try:
+        yield active
+    finally:
+        _active_sinks.reset(token)
+
+def active_sinks() -> Tuple[StreamSink, ...]:
+    """Get the sinks agent responses in the current context stream to."""
+    return _active_sinks.get()
\ No newline at end of file
@@ -0,0 +1,20 @@
+from typing import Any, Iterable
+
+# Llama-family tokenizers average roughly four characters of English per token
+CHARS_PER_TOKEN = 4
+# Fixed per-message overhead (role markers and separators) added by the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a piece of text without a tokenizer."""
+    if not text:
+        return 0
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+def estimate_message_tokens(messages: Iterable[Any]) -> int:
+    """Estimate the prompt tokens of a list of chat messages or memory entries."""
+    total = 0
+    for message in messages:
+        content = message["content"] if isinstance(message, dict) else getattr(message, "content", "")
+        total += estimate_tokens(str(content)) + MESSAGE_OVERHEAD_TOKENS
+    return total
\ No newline at end of file
@@ -0,0 +1,194 @@
+from typing import Dict, List, Any, Optional, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+import atexit
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from utils.config import Config
+
+# OTLP span kinds: agent calls go out to the provider, everything else is internal
+_OTLP_SPAN_KINDS = {"llm": 3}
+_OTLP_INTERNAL = 1
+
+class Span:
+    """A timed unit of work (a patient, a workflow stage or an LLM call) with attributes."""
+    
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "ok"
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self._started = time.perf_counter()
+        self.duration = 0.0
+    
+    def set(self, **attributes: Any):
+        """Add or update attributes."""
+        self.attributes.update(attributes)
+    
+    def end(self):
+        """Stop the clock."""
+        self.duration = time.perf_counter() - self._started
+        self.end_time = self.start_time + self.duration
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the span as a flat JSON-serializable dict."""
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration": self.duration,
+            "status": self.status,
+            "attributes": self.attributes
+        }
+    
+    def to_otlp(self) -> Dict[str, Any]:
+        """Get the span in the OTLP/JSON span format."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": _OTLP_SPAN_KINDS.get(self.kind, _OTLP_INTERNAL),
+            "startTimeUnixNano": str(int(self.start_time * 1e9)),
+            "endTimeUnixNano": str(int((self.end_time or self.start_time) * 1e9)),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2 if self.status == "error" else 1}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+class _NullSpan:
+    """Stand-in yielded when tracing is disabled."""
+    
+    def set(self, **attributes: Any):
+        pass
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    """Encode an attribute value as an OTLP AnyValue."""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+# The open span is tracked per thread and per asyncio task, like the patient session
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+class Tracer:
+    """Collects spans, keeps per-name latency statistics and exports finished spans.
+
+    With format 'jsonl' every span is appended to `path` as it finishes; with 'otlp'
+    spans are buffered and written as one OTLP/JSON trace document by close().
+    """
+    
+    def __init__(self, enabled: Optional[bool] = None, path: Optional[str] = None, export_format: Optional[str] = None):
+        self.enabled = enabled if enabled is not None else Config.is_tracing_enabled()
+        self.path = path if path is not None else Config.get_trace_path()
+        self.export_format = export_format or Config.get_trace_format()
+        self._durations: Dict[str, List[float]] = {}
+        self._keys: Dict[str, Dict[str, float]] = {}
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._file = None
+        if self.enabled and self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            if self.export_format == "jsonl":
+                self._file = open(self.path, "a", encoding="utf-8")
+    
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", **attributes: Any) -> Iterator[Any]:
+        """Time a block as a child of the span open in the current context."""
+        if not self.enabled:
+            yield _NullSpan()
+            return
+        parent = _current_span.get()
+        trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        span = Span(name, kind, trace_id, parent.span_id if parent is not None else None, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.set(error=str(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+            self._record(span)
+    
+    def _record(self, span: Span):
+        """Update the statistics with a finished span and export it."""
+        with self._lock:
+            self._durations.setdefault(span.name, []).append(span.duration)
+            api_key = span.attributes.get("api_key")
+            if span.kind == "llm" and api_key:
+                key = self._keys.setdefault(api_key, {"calls": 0, "rate_limited": 0, "wait_seconds": 0.0})
+                key["calls"] += 1
+                key["rate_limited"] += span.attributes.get("rate_limited", 0)
+                key["wait_seconds"] += span.attributes.get("rate_limit_wait_seconds", 0.0) + \
+                    span.attributes.get("backoff_seconds", 0.0)
+            if self._file is not None:
+                self._file.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+            elif self.path and self.export_format == "otlp":
+                self._buffer.append(span.to_otlp())
+    
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Get count, p50, p95 and max duration (seconds) for every span name."""
+        with self._lock:
+            durations = {name: np.array(values) for name, values in self._durations.items()}
+        return {
+            name: {
+                "count": len(values),
+                "p50": float(np.percentile(values, 50)),
+                "p95": float(np.percentile(values, 95)),
+                "max": float(values.max())
+            }
+            for name, values in sorted(durations.items())
+        }
+    
+    def key_summary(self) -> Dict[str, Dict[str, float]]:
+        """Get LLM calls, 429s and seconds spent waiting per API key."""
+        with self._lock:
+            return {label: dict(stats) for label, stats in self._keys.items()}
+    
+    def close(self):
+        """Flush the exported spans."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._buffer:
+                document = {"resourceSpans": [{
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "agentic-doctor"}}]},
+                    "scopeSpans": [{"scope": {"name": "utils.tracing"}, "spans": self._buffer}]
+                }]}
+                with open(self.path, "w", encoding="utf-8") as f:
+                    json.dump(document, f)
+                self._buffer = []
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+def get_tracer() -> Tracer:
+    """Get the process-wide tracer, creating it on first use."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+            atexit.register(_tracer.close)
+        return _tracer
\ No newline at end of file
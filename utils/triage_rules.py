@@ -0,0 +1,159 @@
+from typing import Dict, List, Any, Optional, NamedTuple
+import json
+import threading
+
+from utils.config import Config
+from utils.data_processor import HEART_RATE_MIN, HEART_RATE_MAX, SYSTOLIC_MAX, DIASTOLIC_MAX
+
+# Normal ranges extend the categorization thresholds in DataProcessor; critical values
+# mark findings that need immediate attention on their own.
+DEFAULT_THRESHOLDS = {
+    "heart_rate_min": HEART_RATE_MIN,
+    "heart_rate_max": HEART_RATE_MAX,
+    "systolic_max": SYSTOLIC_MAX,
+    "diastolic_max": DIASTOLIC_MAX,
+    "oxygen_saturation_min": 95,
+    "temperature_max": 100.4,
+    "respiratory_rate_max": 20,
+    "heart_rate_critical_min": 40,
+    "heart_rate_critical_max": 130,
+    "systolic_critical": 180,
+    "diastolic_critical": 120,
+    "oxygen_saturation_critical": 92,
+    "temperature_critical": 103.0,
+    "respiratory_rate_critical": 30
+}
+
+# Symptoms that, together with a critical vital sign, confirm an emergency
+DEFAULT_RED_FLAG_SYMPTOMS = ['chest pain', 'chest pressure', 'fainting', 'confusion', 'difficulty breathing',
+                             'extreme shortness of breath', 'severe']
+
+class TriageDecision(NamedTuple):
+    """A yes/no triage decision and the path that produced it."""
+    value: bool
+    source: str  # "rules" or "llm"
+    reason: str
+    
+    @classmethod
+    def from_llm(cls, response: str) -> "TriageDecision":
+        """Parse a 'Yes'/'No' LLM answer."""
+        first_line = response.strip().splitlines()[0] if response.strip() else ""
+        return cls(response.lower().startswith('yes'), "llm", first_line[:200])
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the decision as a plain dict for assessments and reports."""
+        return {"value": self.value, "source": self.source, "reason": self.reason}
+
+class TriageRuleEngine:
+    """Deterministic triage rules that settle clear-cut cases without an LLM round-trip.
+
+    Each decision returns a TriageDecision when the vitals and symptoms make the answer
+    obvious, and None when the case is ambiguous and should go to the LLM.
+    """
+    
+    def __init__(self, thresholds: Optional[Dict[str, float]] = None, red_flag_symptoms: Optional[List[str]] = None):
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self.red_flag_symptoms = [symptom.lower() for symptom in (red_flag_symptoms or DEFAULT_RED_FLAG_SYMPTOMS)]
+    
+    @classmethod
+    def from_file(cls, file_path: str) -> "TriageRuleEngine":
+        """Load threshold and red-flag overrides from a JSON file.
+
+        The file may contain {"thresholds": {...}, "red_flag_symptoms": [...]}; anything
+        omitted keeps its default.
+        """
+        with open(file_path, 'r') as f:
+            rules = json.load(f)
+        return cls(rules.get("thresholds"), rules.get("red_flag_symptoms"))
+    
+    def _findings(self, patient_data: Dict[str, Any]):
+        """Get the (critical, abnormal) findings of the patient's vital signs as readable reasons."""
+        t = self.thresholds
+        vital_signs = patient_data.get('vital_signs') or {}
+        critical, abnormal = [], []
+        
+        def check(field: str, label: str, low: Optional[float], high: Optional[float],
+                  critical_low: Optional[float], critical_high: Optional[float]):
+            value = vital_signs.get(field)
+            if value is None:
+                return
+            if critical_low is not None and value <= critical_low:
+                critical.append(f"{label} {value} <= {critical_low}")
+            elif critical_high is not None and value >= critical_high:
+                critical.append(f"{label} {value} >= {critical_high}")
+            elif (low is not None and value < low) or (high is not None and value > high):
+                abnormal.append(f"{label} {value}")
+        
+        check('heart_rate', "HR", t["heart_rate_min"], t["heart_rate_max"],
+              t["heart_rate_critical_min"], t["heart_rate_critical_max"])
+        check('blood_pressure_systolic', "systolic BP", None, t["systolic_max"], None, t["systolic_critical"])
+        check('blood_pressure_diastolic', "diastolic BP", None, t["diastolic_max"], None, t["diastolic_critical"])
+        check('oxygen_saturation', "SpO2", t["oxygen_saturation_min"], None, t["oxygen_saturation_critical"], None)
+        check('temperature', "temperature", None, t["temperature_max"], None, t["temperature_critical"])
+        check('respiratory_rate', "RR", None, t["respiratory_rate_max"], None, t["respiratory_rate_critical"])
+        return critical, abnormal
+    
+    def _red_flags(self, patient_data: Dict[str, Any]) -> List[str]:
+        """Get the red-flag symptoms present in the patient's symptom list."""
+        symptoms = ' '.join(patient_data.get('symptoms') or []).lower()
+        return [flag for flag in self.red_flag_symptoms if flag in symptoms]
+    
+    @staticmethod
+    def _has_symptoms(patient_data: Dict[str, Any]) -> bool:
+        """Check if the patient reported any symptom."""
+        return any(str(symptom).strip() for symptom in patient_data.get('symptoms') or [])
+    
+    @staticmethod
+    def _has_core_vitals(patient_data: Dict[str, Any]) -> bool:
+        """Check that heart rate and blood pressure were recorded; without them nothing is clear-cut."""
+        vital_signs = patient_data.get('vital_signs') or {}
+        return all(vital_signs.get(field) is not None
+                   for field in ('heart_rate', 'blood_pressure_systolic', 'blood_pressure_diastolic'))
+    
+    def cardiac_emergency(self, patient_data: Dict[str, Any]) -> Optional[TriageDecision]:
+        """Decide whether a cardiac patient is an emergency, or return None if it is ambiguous.
+        
+        A local "No" needs normal vitals and no symptoms at all: heart attacks often present
+        with normal vitals and symptoms such as jaw or arm pain, sweating or nausea, so any
+        reported symptom goes to the LLM.
+        """
+        if not self._has_core_vitals(patient_data):
+            return None
+        critical, abnormal = self._findings(patient_data)
+        red_flags = self._red_flags(patient_data)
+        
+        if len(critical) >= 2 or (critical and red_flags):
+            return TriageDecision(True, "rules", "; ".join(critical + red_flags))
+        if not critical and not abnormal and not self._has_symptoms(patient_data):
+            return TriageDecision(False, "rules", "vital signs within normal ranges and no symptoms reported")
+        return None
+    
+    def doctor_attention(self, patient_data: Dict[str, Any]) -> Optional[TriageDecision]:
+        """Decide whether a sick patient needs a doctor, or return None if it is ambiguous.
+        
+        A local "No" needs normal vitals and no symptoms at all: a sick patient with normal
+        vitals was categorized by their symptoms, which a keyword list cannot rule out.
+        """
+        if not self._has_core_vitals(patient_data):
+            return None
+        critical, abnormal = self._findings(patient_data)
+        
+        if critical:
+            return TriageDecision(True, "rules", "; ".join(critical))
+        if not abnormal and not self._has_symptoms(patient_data):
+            return TriageDecision(False, "rules", "vital signs within normal ranges and no symptoms reported")
+        return None
+
+_triage_engine: Optional[TriageRuleEngine] = None
+_triage_engine_lock = threading.Lock()
+
+def get_triage_engine() -> Optional[TriageRuleEngine]:
+    """Get the configured rule engine, or None if rule-based triage is disabled."""
+    global _triage_engine
+    if not Config.triage_rules_enabled():
+        return None
+    with _triage_engine_lock:
+        if _triage_engine is None:
+            rules_path = Config.get_triage_rules_path()
+            _triage_engine = TriageRuleEngine.from_file(rules_path) if rules_path else TriageRuleEngine()
+        return _triage_engine
\ No newline at end of file